@@ -4,7 +4,6 @@ import datetime
 import geojson
 import logging
 import logging.config
-import pickle
 import time
 
 from ConfigParser import ConfigParser
@@ -20,6 +19,7 @@ from smcity.models.aws.aws_data import AwsDataFactory
 from smcity.models.test.mock_result_queue import MockResultQueue
 from smcity.models.test.mock_task_queue import MockTaskQueue
 from smcity.polygons.complex_polygon_strategy import ComplexPolygonStrategyFactory
+from smcity.polygons.polygon_index import PolygonIndex
 from smcity.transformers.geojson_transformer import GeoJsonTransformer
 
 print "Loading the config settings..."
@@ -28,13 +28,13 @@ configFile = open('config/qa_smcity.conf')
 config.readfp(configFile)
 configFile.close()
 
-print "Depickling the congressional districts..."
-districts = pickle.load(open("manual_tests/ohio_districts_low_res.pickled", "rb"))
-district_ids = []
+print "Loading the congressional districts..."
+districts = ComplexPolygonStrategyFactory().from_binary("manual_tests/ohio_districts_low_res.polygons")
+district_ids = [str(uuid4()) for district in districts]
 geojson = None
 
 # Set up the components
-data_factory = AwsDataFactory(config)
+data_factory = AwsDataFactory(config, role='filter')
 result_queue = MockResultQueue()
 task_queue   = MockTaskQueue()
 worker       = Worker(config, result_queue, task_queue, data_factory)
@@ -45,33 +45,28 @@ age_limit    = datetime.datetime.now()
 age_limit   += datetime.timedelta(hours=5) - datetime.timedelta(hours=1)
 age_limit    = age_limit.timetuple()
 
+# Partition the data between the districts using a single scan of the global data
+district_index = PolygonIndex(districts)
+key_words = ['OBAMA', 'POTUS', 'BARACK', 'PRESIDENT', 'PREZ']
+kwargs = {
+    'num_segments' : 10,
+    'polygon_index' : district_index,
+    'out_data_set_ids' : dict(zip(district_index.keys, district_ids)),
+    'min_timestamp' : age_limit
+}
+
+print "Bounding Box:", district_index.get_bounding_box()
+print "Time:", age_limit
+
+print "Partitioning data..."
+start_time = time.time()
+worker.partition_data_parallel(**kwargs)
+run_time = time.time() - start_time
+print "Done partitioning data! Took " + str(run_time) + " seconds!"
+
 for iter in range(len(districts)):
     print "District", (iter+1)
-
-    district_ids.append(uuid4())
-    bounding_box = districts[iter].get_bounding_box()
-    key_words = ['OBAMA', 'POTUS', 'BARACK', 'PRESIDENT', 'PREZ']
-    kwargs = {
-        'num_segments' : 10,
-        'in_data_set_id' : 'global',
-        'out_data_set_id' : str(district_ids[iter]),
-        'min_timestamp' : age_limit,
-        'complex_filters' : [districts[iter]],
-        'min_lat' : bounding_box['min_lat'],
-        'max_lat' : bounding_box['max_lat'],
-        'min_lon' : bounding_box['min_lon'],
-        'max_lon' : bounding_box['max_lon']
-    }
-
     print "Set ID:", district_ids[iter]
-    print "Bounding Box:", bounding_box
-    print "Time:", age_limit
-
-    print "Filtering data..."
-    start_time = time.time()
-    worker.filter_data_parallel(**kwargs)
-    run_time = time.time() - start_time
-    print "Done filtering data! Took " + str(run_time) + " seconds!"
 
     avg_polarity = 0.0
     num_points = 0 
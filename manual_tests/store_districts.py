@@ -1,5 +1,4 @@
 import geojson
-import pickle
 
 from smcity.polygons.complex_polygon_strategy import ComplexPolygonStrategyFactory
 
@@ -12,5 +11,5 @@ for district_geojson in districts_geojson['features']:
     print "Parsing district " + str(len(districts) + 1) + "/" + str(len(districts_geojson['features']))
     districts.append(ComplexPolygonStrategyFactory().from_geojson(district_geojson['geometry']))
 
-print "Pickling districts..."
-pickled_district  = pickle.dump(districts, open("ohio_districts_low_res.pickled", "wb"))
+print "Storing districts..."
+ComplexPolygonStrategyFactory().to_binary(districts, "manual_tests/ohio_districts_low_res.polygons")
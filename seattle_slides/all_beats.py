@@ -16,7 +16,7 @@ from smcity.analytics.worker import Worker
 from smcity.models.aws.aws_data import AwsDataFactory
 from smcity.models.test.mock_result_queue import MockResultQueue
 from smcity.models.test.mock_task_queue import MockTaskQueue
-from smcity.polygons.complex_polygon_strategy import ComplexPolygonStrategyFactory
+from smcity.polygons.polygon_index import PolygonIndexFactory
 from smcity.transformers.geojson_transformer import GeoJsonTransformer
 
 print "Loading the config settings..."
@@ -26,50 +26,42 @@ config.readfp(configFile)
 configFile.close()
 
 # Load the GeoJSON description of the police beats
-police_beats_geojson = geojson.loads(open('seattle_slides/seattle_police_beats.geojson').read())['features']
+police_beats_geojson = geojson.loads(open('seattle_slides/seattle_police_beats.geojson').read())
+police_beats = PolygonIndexFactory().from_geojson(police_beats_geojson)
 
 # Set up the components
-data_factory = AwsDataFactory(config)
+data_factory = AwsDataFactory(config, role='filter')
 result_queue = MockResultQueue()
 task_queue   = MockTaskQueue()
 worker       = Worker(config, result_queue, task_queue, data_factory)
 transformer  = GeoJsonTransformer(data_factory)
 geojson      = None
 
-for iter in range(len(police_beats_geojson)):
-    police_beat = ComplexPolygonStrategyFactory().from_geojson(police_beats_geojson[iter]['geometry'])
+# Generate one data set per police beat from a single scan of the global data
+set_ids   = dict((key, str(uuid4())) for key in police_beats.keys)
+age_limit = datetime.datetime.now()
+age_limit -= datetime.timedelta(hours=1)
+age_limit = age_limit.timetuple()
+keywords = ['Mayday', 'parade']
+print "Bounding Box:", police_beats.get_bounding_box()
+print "Time:", age_limit
+kwargs = {
+    'num_segments' : 4,
+    'polygon_index' : police_beats,
+    'out_data_set_ids' : set_ids,
+    'min_timestamp' : age_limit#,
+#    'keywords' : keywords
+}
+print "Partitioning data..."
+worker.partition_data_parallel(**kwargs)
+print "Done partitioning data..."
 
-    # Generate the data set of interest
-    set_id    = str(uuid4())
-    age_limit = datetime.datetime.now()
-    age_limit -= datetime.timedelta(hours=1)
-    age_limit = age_limit.timetuple()
-    bounding_box = police_beat.get_bounding_box()
-    keywords = ['Mayday', 'parade']
-    print "Bounding Box:", bounding_box
-    print "Set ID:", set_id
-    print "Time:", age_limit
-    kwargs = {
-        'num_segments' : 4,
-        'in_data_set_id' : 'global',
-        'out_data_set_id' : set_id,
-        'min_timestamp' : age_limit,
-        'complex_filters' : [police_beat],
-        'min_lat' : bounding_box['min_lat'],
-        'max_lat' : bounding_box['max_lat'],
-        'min_lon' : bounding_box['min_lon'],
-        'max_lon' : bounding_box['max_lon']#,
-#        'keywords' : keywords
-    }
-    print "Filtering data..."
-    worker.filter_data_parallel(**kwargs)
-    print "Done filtering data..."
-
-    print "Generating GeoJSON display..."
+print "Generating GeoJSON display..."
+for (key, police_beat) in zip(police_beats.keys, police_beats.polygons):
     if geojson is None:
-        geojson = transformer.plot_points(set_id)
+        geojson = transformer.plot_points(set_ids[key])
     else:
-        geojson = transformer.plot_points(set_id, geojson)
+        geojson = transformer.plot_points(set_ids[key], geojson)
     geojson = transformer.plot_polygon(police_beat, geojson)
 
 print "Writing out GeoJSON display..."
@@ -29,7 +29,7 @@ configFile.close()
 police_beats_geojson = geojson.loads(open('seattle_slides/seattle_police_beats.geojson').read())['features']
 
 # Set up the components
-data_factory = AwsDataFactory(config)
+data_factory = AwsDataFactory(config, role='filter')
 result_queue = MockResultQueue()
 task_queue   = MockTaskQueue()
 worker       = Worker(config, result_queue, task_queue, data_factory)
@@ -63,7 +63,7 @@ for iter in range(1): #len(police_beats_geojson)):
         'keywords' : keywords
     }
     print "Filtering data..."
-    worker.filter_data_parallel(**kwargs)
+    set_id = worker.filter_data_parallel(**kwargs)
     print "Done filtering data..."
 
     print "Generating GeoJSON display..."
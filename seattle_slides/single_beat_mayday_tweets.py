@@ -30,7 +30,7 @@ police_beats_geojson = geojson.loads(open('seattle_slides/seattle_police_beats.g
 police_beats = ComplexPolygonStrategyFactory().from_geojson(police_beats_geojson['features'][0]['geometry'])
 
 # Set up the components
-data_factory = AwsDataFactory(config)
+data_factory = AwsDataFactory(config, role='filter')
 result_queue = MockResultQueue()
 task_queue   = MockTaskQueue()
 worker       = Worker(config, result_queue, task_queue, data_factory)
@@ -57,7 +57,7 @@ kwargs = {
     'max_lon' : bounding_box['max_lon']
 }
 print "Filtering data..."
-worker.filter_data_parallel(**kwargs)
+set_id = worker.filter_data_parallel(**kwargs)
 print "Done filtering data..."
 
 #print "Determine the trending topics..."
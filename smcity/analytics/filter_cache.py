@@ -0,0 +1,152 @@
+''' Cache of the data sets produced by recent filter jobs, so repeated filters are answered without a scan. '''
+
+import calendar
+import hashlib
+import time
+
+from collections import OrderedDict
+from threading import Lock
+
+def get_filter_key(in_data_set_id, min_lat, max_lat, min_lon, max_lon,
+                   min_timestamp, max_timestamp, data_type, keywords, complex_filters):
+    '''
+    Builds a canonical key for the filter, equal for any two filters selecting the same data.
+
+    @param keywords Compiled keyword watchlist, or None
+    @paramType KeywordMatcher
+    @param complex_filters Additional complex filtering steps, @see ComplexFilter.get_cache_key
+    @paramType list of ComplexFilters
+    @returns Hash of the filter, or None if one of the complex filters cannot be cached
+    @returnType string
+    '''
+    complex_filter_keys = [complex_filter.get_cache_key() for complex_filter in complex_filters]
+    if None in complex_filter_keys:
+        return None
+
+    spec = (
+        in_data_set_id,
+        tuple(None if value is None else float(value) for value in (min_lat, max_lat, min_lon, max_lon)),
+        tuple(None if value is None else calendar.timegm(value) for value in (min_timestamp, max_timestamp)),
+        data_type,
+        keywords.get_cache_key() if keywords is not None else None,
+        tuple(complex_filter_keys)
+    )
+
+    return hashlib.sha1(repr(spec)).hexdigest()
+
+class FilterCache:
+    '''
+    Maps filter keys, @see get_filter_key, to the data sets their filters produced. Entries expire
+    ttl seconds after being added and the least recently used entries are evicted once the cache
+    is full.
+    '''
+
+    def __init__(self, max_entries=128, ttl=300, resolution=3600):
+        '''
+        Constructor.
+
+        @param max_entries Maximum # of cached data sets
+        @paramType int
+        @param ttl # of seconds a cached data set stays valid
+        @paramType float
+        @param resolution # of seconds time windows are widened out to, @see snap_window
+        @paramType int
+        @returns n/a
+        '''
+        assert max_entries > 0, max_entries
+        assert resolution > 0, resolution
+
+        self.max_entries = max_entries
+        self.ttl         = ttl
+        self.resolution  = resolution
+        self.entries     = OrderedDict() # Key => (set id, stats, min timestamp seconds, expiration), oldest use first
+        self.lock        = Lock()
+
+    def snap_window(self, min_timestamp, max_timestamp):
+        '''
+        Widens the time window out to whole multiples of the resolution, so windows computed a few
+        minutes apart, i.e. "the last 3 days", share a key.
+
+        @param min_timestamp Start of the time window, or None
+        @paramType time.struct_time
+        @param max_timestamp End of the time window, or None
+        @paramType time.struct_time
+        @returns The widened (min_timestamp, max_timestamp)
+        @returnType (time.struct_time, time.struct_time)
+        '''
+        if min_timestamp is not None:
+            min_timestamp = time.gmtime(calendar.timegm(min_timestamp) // self.resolution * self.resolution)
+        if max_timestamp is not None:
+            max_timestamp = time.gmtime(
+                -(-(calendar.timegm(max_timestamp) + 1) // self.resolution) * self.resolution - 1
+            )
+
+        return (min_timestamp, max_timestamp)
+
+    def get(self, key, now=None):
+        '''
+        @param key Filter key
+        @paramType string
+        @param now Current time in seconds since the epoch; If None, the system clock is used
+        @paramType float
+        @returns (set id, stats) of the data set the filter produced, or None if there is no valid entry
+        @returnType (string, dictionary)
+        '''
+        now = time.time() if now is None else now
+
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None or entry[3] <= now: # If it was never cached or has expired
+                return None
+
+            self.entries[key] = entry # Mark it as the most recently used
+            return entry[:2]
+
+    def put(self, key, set_id, stats, min_timestamp, now=None):
+        '''
+        Caches the data set a filter produced.
+
+        @param key Filter key
+        @paramType string
+        @param set_id Tracking id of the produced data set
+        @paramType string
+        @param stats Filtering statistics of the job
+        @paramType dictionary
+        @param min_timestamp Start of the filter's time window, or None
+        @paramType time.struct_time
+        @param now Current time in seconds since the epoch; If None, the system clock is used
+        @paramType float
+        @returns n/a
+        '''
+        now = time.time() if now is None else now
+        min_seconds = calendar.timegm(min_timestamp) if min_timestamp is not None else None
+
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (set_id, stats, min_seconds, now + self.ttl)
+            while len(self.entries) > self.max_entries: # Evict the least recently used
+                self.entries.popitem(last=False)
+
+    def invalidate_before(self, horizon):
+        '''
+        Drops the data sets whose time windows reach back before the horizon, i.e. once the janitor
+        has deleted the data older than it.
+
+        @param horizon Oldest time still fully covered by the data
+        @paramType time.struct_time
+        @returns # of dropped data sets
+        @returnType int
+        '''
+        horizon = calendar.timegm(horizon)
+
+        with self.lock:
+            stale_keys = [
+                key for (key, entry) in self.entries.iteritems() if entry[2] is None or entry[2] < horizon
+            ]
+            for key in stale_keys:
+                del self.entries[key]
+
+        return len(stale_keys)
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,144 @@
+'''
+Generator based stages of the Worker's filtering pipeline. Each stage consumes an iterator of pages
+(lists of Data), drops the data points it filters out, and yields the surviving pages. Every stage
+records how many data points made it through in the shared stats dictionary.
+'''
+
+import numpy
+
+def read_pages(datas, page_size, stats):
+    '''
+    Source stage that groups the data points into pages.
+
+    @param datas Data points to be paged
+    @paramType Iterator of Data
+    @param page_size Maximum # of data points per page
+    @paramType int
+    @param stats Stage counters, the 'read' counter is updated
+    @paramType dictionary
+    @returns Pages of data points
+    @returnType generator of lists of Data
+    '''
+    stats.setdefault('read', 0)
+
+    page = []
+    for data in datas:
+        page.append(data)
+
+        if len(page) >= page_size: # If the page is full
+            stats['read'] += len(page)
+            yield page
+            page = []
+
+    if len(page) > 0: # Pass along the remaining partial page
+        stats['read'] += len(page)
+        yield page
+
+def filter_stage(pages, name, filter_page, stats):
+    '''
+    Generic stage that drops the data points the provided page filter flags.
+
+    @param pages Pages of data points
+    @paramType Iterator of lists of Data
+    @param name Name of the stage's counter in the stats
+    @paramType string
+    @param filter_page Determines whether or not each data point in a page is filtered out
+    @paramType function(list of Data) returning a sequence of booleans
+    @param stats Stage counters
+    @paramType dictionary
+    @returns Pages of the surviving data points, empty pages are not passed along
+    @returnType generator of lists of Data
+    '''
+    stats.setdefault(name, 0)
+
+    for page in pages:
+        is_filtered = filter_page(page)
+        page = [data for (data, filtered) in zip(page, is_filtered) if not filtered]
+
+        if len(page) > 0:
+            stats[name] += len(page)
+            yield page
+
+def bounding_box_stage(pages, min_lat, max_lat, min_lon, max_lon, stats):
+    '''
+    Stage that drops the data points outside of the bounding box. Unbounded sides are not checked.
+
+    @returns Pages of the data points inside the bounding box
+    @returnType generator of lists of Data
+    '''
+    def filter_page(page):
+        locations = numpy.array([data.get_location() for data in page], dtype=numpy.float64)
+        is_inside = numpy.ones(len(page), dtype=bool)
+
+        if min_lon is not None:
+            is_inside &= locations[:, 0] >= min_lon
+        if max_lon is not None:
+            is_inside &= locations[:, 0] <= max_lon
+        if min_lat is not None:
+            is_inside &= locations[:, 1] >= min_lat
+        if max_lat is not None:
+            is_inside &= locations[:, 1] <= max_lat
+
+        return ~is_inside
+
+    return filter_stage(pages, 'bounding_box', filter_page, stats)
+
+def time_stage(pages, min_timestamp, max_timestamp, stats):
+    '''
+    Stage that drops the data points outside of the time window. Unbounded ends are not checked.
+
+    @returns Pages of the data points inside the time window
+    @returnType generator of lists of Data
+    '''
+    def filter_page(page):
+        timestamps = [data.get_timestamp() for data in page]
+
+        return [(min_timestamp is not None and timestamp < min_timestamp) or
+                (max_timestamp is not None and timestamp > max_timestamp) for timestamp in timestamps]
+
+    return filter_stage(pages, 'time', filter_page, stats)
+
+def keyword_stage(pages, keyword_matcher, stats):
+    '''
+    Stage that drops the data points that do not contain any of the keywords.
+
+    @param keyword_matcher Compiled keywords to look for
+    @paramType KeywordMatcher
+    @returns Pages of the data points containing a keyword
+    @returnType generator of lists of Data
+    '''
+    def filter_page(page):
+        return [not keyword_matcher.matches_data(data) for data in page]
+
+    return filter_stage(pages, 'keywords', filter_page, stats)
+
+def complex_filter_stage(pages, complex_filter, name, stats):
+    '''
+    Stage that applies a ComplexFilter to whole pages at a time. @see ComplexFilter.filter_many
+
+    @returns Pages of the data points that pass the complex filter
+    @returnType generator of lists of Data
+    '''
+    return filter_stage(pages, name, complex_filter.filter_many, stats)
+
+def rebatch(pages, batch_size):
+    '''
+    Regroups pages of data points into batches of the provided size, i.e. for the writer stage.
+
+    @param pages Pages of data points
+    @paramType Iterator of lists of Data
+    @param batch_size Maximum # of data points per batch
+    @paramType int
+    @returns Batches of data points
+    @returnType generator of lists of Data
+    '''
+    batch = []
+    for page in pages:
+        batch.extend(page)
+
+        while len(batch) >= batch_size: # Pass along every full batch
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+
+    if len(batch) > 0: # Pass along the remaining partial batch
+        yield batch
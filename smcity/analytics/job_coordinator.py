@@ -0,0 +1,221 @@
+'''
+Splits jobs into segment tasks for the Workers of any number of hosts to perform, @see Worker.run, and
+reduces the results they post into the job's output.
+'''
+
+import calendar
+import time
+
+from threading import Event
+from uuid import uuid4
+
+from smcity.analytics.sketches import SpaceSaving
+from smcity.analytics.worker import _merge_stats
+from smcity.misc.errors import NotReadyError, ReadError
+from smcity.misc.logger import Logger
+
+logger = Logger(__name__)
+
+class JobCoordinator:
+    '''
+    Submits the segment tasks of a job to the task queue and tracks its completion from the result
+    queue. Each result queue should be read by a single coordinator; Results of jobs it didn't submit
+    are left on the queue.
+    '''
+
+    def __init__(self, config, result_queue, task_queue, clock = time.time):
+        '''
+        Constructor.
+
+        @param config Configuration settings. Expected definition:
+
+        Section: coordinator
+        Key:     poll_interval
+        Type:    float
+        Desc:    # of seconds to wait before asking an empty result queue again (Optional, default 1)
+
+        Section: coordinator
+        Key:     job_timeout
+        Type:    float
+        Desc:    # of seconds to wait for the results of a job before giving up on it; If 0, the
+                 coordinator waits for as long as it takes (Optional, default 0)
+        @paramType ConfigParser
+        @param result_queue Queue the Workers post their results to
+        @paramType ResultQueue
+        @param task_queue Queue the Workers take their tasks from
+        @paramType TaskQueue
+        @param clock Returns the current time in seconds
+        @paramType function
+        @returns n/a
+        '''
+        self.poll_interval = 1.0
+        if config.has_option('coordinator', 'poll_interval'):
+            self.poll_interval = config.getfloat('coordinator', 'poll_interval')
+        self.job_timeout = 0.0
+        if config.has_option('coordinator', 'job_timeout'):
+            self.job_timeout = config.getfloat('coordinator', 'job_timeout')
+        self.result_queue = result_queue
+        self.task_queue   = task_queue
+        self.clock        = clock
+        self.jobs         = {} # Job id => (task name, # of segments, segment id => result)
+        self.stopped      = Event()
+
+    def calculate_trending_topics(self, num_segments, data_set_id, k = None):
+        '''
+        Calculates the trending topics in the data set, split into num_segments tasks. @see
+        Worker.calculate_trending_topics_parallel
+
+        @param num_segments # of segment tasks to split the data set scan into
+        @paramType int
+        @param data_set_id Tracking id of the set whose trending topics should be calculated
+        @paramType string
+        @param k # of topics to return; If None, every tracked topic is returned
+        @paramType int
+        @returns List of (topic, # occurrence) tuples sorted from most frequent to least frequent
+        @returnType List of (string, int) tuples
+        '''
+        job_id = self.submit_job(num_segments, {'task' : 'calculate_trending_topics', 'data_set_id' : data_set_id})
+
+        return self.wait_for_job(job_id).top(k)
+
+    def count_data(self, num_segments, data_set_id):
+        '''
+        Counts the data in the data set, split into num_segments tasks.
+
+        @param num_segments # of segment tasks to split the data set scan into
+        @paramType int
+        @param data_set_id Tracking id of the set to count
+        @paramType string
+        @returns # of data in the set
+        @returnType int
+        '''
+        job_id = self.submit_job(num_segments, {'task' : 'count_data', 'data_set_id' : data_set_id})
+
+        return self.wait_for_job(job_id)
+
+    def filter_data(self, num_segments, in_data_set_id, out_data_set_id,
+                    min_lat = None, max_lat = None,
+                    min_lon = None, max_lon = None,
+                    min_timestamp = None, max_timestamp = None,
+                    data_type = None, keywords = None):
+        '''
+        Filters the data set into out_data_set_id, split into num_segments tasks. Each task writes its
+        segment's data into the same set. @see Worker._filter_data; Complex filters can't be sent to
+        other hosts, filter the resulting set locally instead.
+
+        @param num_segments # of segment tasks to split the data set scan into
+        @paramType int
+        @param keywords Restricts data to those containing at least one of the keywords
+        @paramType list of string
+        @returns (Tracking id of the filtered data set, stage counters summed over the segments)
+        @returnType (string, dictionary)
+        '''
+        coordinate_box = None
+        if (min_lat, max_lat, min_lon, max_lon) != (None, None, None, None):
+            coordinate_box = {'min_lat' : min_lat, 'max_lat' : max_lat, 'min_lon' : min_lon, 'max_lon' : max_lon}
+
+        job_id = self.submit_job(num_segments, {
+            'task' : 'filter_data',
+            'coordinate_box' : coordinate_box,
+            'in_data_set_id' : in_data_set_id,
+            'out_data_set_id' : out_data_set_id,
+            'min_timestamp' : calendar.timegm(min_timestamp) if min_timestamp is not None else None,
+            'max_timestamp' : calendar.timegm(max_timestamp) if max_timestamp is not None else None,
+            'data_type' : data_type,
+            'keywords' : list(keywords) if keywords is not None else None
+        })
+
+        return self.wait_for_job(job_id)
+
+    def submit_job(self, num_segments, task):
+        '''
+        Requests one task per segment of the job.
+
+        @param num_segments # of segment tasks to split the job into
+        @paramType int
+        @param task Arguments shared by every segment task, @see Worker.run_task
+        @paramType dictionary
+        @returns Tracking id of the job
+        @returnType string
+        '''
+        assert num_segments > 0, num_segments
+
+        job_id = uuid4().hex
+        self.jobs[job_id] = (task['task'], num_segments, {})
+        for segment_id in range(num_segments):
+            segment_task = dict(task, job_id = job_id, segment_id = segment_id, num_segments = num_segments)
+            self.task_queue.request_task(segment_task)
+
+        logger.info("Submitted the %s job %s as %s tasks", task['task'], job_id, num_segments)
+        return job_id
+
+    def wait_for_job(self, job_id):
+        '''
+        Collects the results of the job's tasks until every segment has reported in, then merges them.
+
+        @param job_id Tracking id of the job, @see submit_job
+        @paramType string
+        @returns The merged output of the job, @see _merge_results
+        @throws ReadError If a task of the job failed
+        @throws NotReadyError If the job didn't finish within coordinator.job_timeout
+        '''
+        deadline = self.clock() + self.job_timeout if self.job_timeout > 0 else None
+        task_name, num_segments, results = self.jobs[job_id]
+
+        while len(results) < num_segments:
+            result = self.result_queue.get_result()
+            if result is not None:
+                self._collect_result(result)
+                continue
+
+            if deadline is not None and self.clock() >= deadline:
+                del self.jobs[job_id]
+                raise NotReadyError("Job %s timed out with %s of %s segments done!" % (job_id, len(results), num_segments))
+            self.stopped.wait(self.poll_interval)
+
+        del self.jobs[job_id]
+        errors = [result['error'] for result in results.values() if 'error' in result]
+        if len(errors) > 0:
+            raise ReadError("Job %s failed: %s" % (job_id, errors[0]))
+
+        logger.info("Done with the %s job %s", task_name, job_id)
+        return _merge_results(task_name, [results[segment_id] for segment_id in sorted(results)])
+
+    def _collect_result(self, result):
+        '''
+        Records the result against its job. A segment's result may be posted twice if its task was
+        retried after timing out; Only the first one counts.
+
+        @param result Result retrieved from the result queue
+        @paramType dictionary
+        @returns n/a
+        '''
+        if result.get('job_id') not in self.jobs:
+            logger.warn("Leaving the result of job %s for its coordinator", result.get('job_id'))
+            return
+
+        results = self.jobs[result['job_id']][2]
+        if result['segment_id'] not in results:
+            results[result['segment_id']] = result
+        self.result_queue.finish_result(result)
+
+def _merge_results(task_name, results):
+    '''
+    @param task_name Task the job's results are for
+    @paramType string
+    @param results Result of each segment of the job
+    @paramType list of dictionaries
+    @returns For filter_data, (tracking id of the filtered data set, summed stage counters); For
+    calculate_trending_topics, the merged SpaceSaving summary; For count_data, the summed count
+    '''
+    if task_name == 'filter_data':
+        return (results[0]['set_id'], _merge_stats([result['stats'] for result in results]))
+    elif task_name == 'calculate_trending_topics':
+        topics = SpaceSaving.from_state(results[0]['topics'])
+        for result in results[1:]: # Merge the summaries of all the segments
+            topics.merge(SpaceSaving.from_state(result['topics']))
+        return topics
+    elif task_name == 'count_data':
+        return sum(result['count'] for result in results)
+
+    raise ValueError("Unknown task %s!" % task_name)
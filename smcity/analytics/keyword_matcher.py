@@ -0,0 +1,115 @@
+''' Content tokenizers and the compiled keyword matcher used to filter data points by their content. '''
+
+import string
+
+# Maps every punctuation character to None for use with unicode.translate()
+PUNCTUATION_MAP = dict((ord(char), None) for char in string.punctuation)
+
+# Maps every punctuation character other than the topic hash to None for use with unicode.translate()
+TOPIC_PUNCTUATION     = string.punctuation.replace('#', '')
+TOPIC_PUNCTUATION_MAP = dict((ord(char), None) for char in TOPIC_PUNCTUATION)
+
+def tokenize(content):
+    '''
+    Splits the content into upper case tokens with all punctuation removed, i.e. "Gun-man, go!"
+    becomes ['GUNMAN', 'GO'].
+
+    @param content Text to be tokenized
+    @paramType string or unicode
+    @returns Tokens of the content
+    @returnType list of string or unicode
+    '''
+    if type(content) is unicode:
+        content = content.translate(PUNCTUATION_MAP)
+    else:
+        content = content.translate(None, string.punctuation)
+
+    return content.upper().split()
+
+def get_topics(content):
+    '''
+    Finds the hash-tagged topics in the content, i.e. "#yoLO! about life #YOLO" has two #YOLO topics.
+
+    @param content Text to be searched
+    @paramType string or unicode
+    @returns Upper case topics in the order they occur
+    @returnType list of string or unicode
+    '''
+    if type(content) is unicode: # Strip out any non-hash punctuation
+        content = content.translate(TOPIC_PUNCTUATION_MAP)
+    else:
+        content = content.translate(None, TOPIC_PUNCTUATION)
+
+    return [token.upper() for token in content.split() if token.startswith('#')]
+
+class KeywordMatcher:
+    '''
+    Keyword watchlist compiled for fast matching. Single token keywords are matched with one set
+    intersection per data point and multi-token phrases are only scanned for when their first
+    token is present, so the cost of a match barely grows with the size of the watchlist.
+    '''
+
+    def __init__(self, keywords):
+        '''
+        Constructor.
+
+        @param keywords Keywords and phrases to look for; They are tokenized just like the content so
+        matching is case-insensitive and ignores punctuation
+        @paramType list of string
+        @returns n/a
+        '''
+        self.tokens  = set()
+        self.phrases = {} # First token of each phrase => remaining tokens of the phrases starting with it
+
+        for keyword in keywords: # For each keyword, compile it as either a token or a phrase
+            keyword_tokens = tokenize(keyword)
+            if len(keyword_tokens) == 1:
+                self.tokens.add(keyword_tokens[0])
+            elif len(keyword_tokens) > 1:
+                self.phrases.setdefault(keyword_tokens[0], []).append(keyword_tokens[1:])
+
+        self.tokens       = frozenset(self.tokens)
+        self.phrase_heads = frozenset(self.phrases.keys())
+
+    def matches(self, content):
+        '''
+        Determines whether or not the provided content contains one of the keywords.
+
+        @param content Text to be checked
+        @paramType string or unicode
+        @returns Whether or not a keyword was found
+        @returnType boolean
+        '''
+        content_tokens = tokenize(content)
+        if not self.tokens.isdisjoint(content_tokens): # If a single token keyword is present
+            return True
+        if self.phrase_heads.isdisjoint(content_tokens): # If no phrase could possibly be present
+            return False
+
+        for iter in range(len(content_tokens)): # Check each phrase starting at each of the tokens
+            for phrase_tail in self.phrases.get(content_tokens[iter], []):
+                if content_tokens[iter + 1:iter + 1 + len(phrase_tail)] == phrase_tail:
+                    return True
+
+        return False
+
+    def matches_data(self, data):
+        '''
+        Determines whether or not the provided data point's content contains one of the keywords.
+
+        @param data Data point to be checked
+        @paramType Data
+        @returns Whether or not a keyword was found
+        @returnType boolean
+        '''
+        return self.matches(data.get_content())
+
+    def get_cache_key(self):
+        '''
+        @returns Canonical form of the watchlist, equal for any two watchlists matching the same content
+        @returnType tuple
+        '''
+        return (
+            tuple(sorted(self.tokens)),
+            tuple(sorted((head, tuple(tail)) for (head, tails) in self.phrases.iteritems() for tail in tails))
+        )
@@ -0,0 +1,144 @@
+''' Bounded memory stream summaries that can be merged across segments and processes. '''
+
+import heapq
+import operator
+
+class SpaceSaving:
+    '''
+    Space-Saving summary of the most frequent items in a stream (Metwally et al.). At most capacity
+    items are tracked; When a new item arrives and the summary is full, it replaces the least
+    frequent tracked item and inherits its count. Every tracked count overestimates the true count
+    by no more than the summary's minimum count, and any item occurring more often than that is
+    guaranteed to be tracked. Until the summary fills up, every count is exact.
+    '''
+
+    def __init__(self, capacity):
+        '''
+        Constructor.
+
+        @param capacity Maximum # of items tracked
+        @paramType int
+        @returns n/a
+        '''
+        assert capacity > 0, capacity
+
+        self.capacity = capacity
+        self.counts   = {} # Item => estimated count
+        self.errors   = {} # Item => maximum overestimation of its count
+        self.heap     = [] # Lazily updated (count, item) min heap used to find the eviction victim
+
+    def add(self, item, count=1):
+        '''
+        Records occurrences of the item.
+
+        @param item Item that occurred
+        @paramType hashable
+        @param count # of occurrences
+        @paramType int
+        @returns n/a
+        '''
+        if item in self.counts: # If the item is already tracked
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity: # If there is still room to track the item exactly
+            self.counts[item] = count
+            self.errors[item] = 0
+        else: # Replace the least frequent item, the new item may have been one of its occurrences
+            min_count, victim = self._pop_min()
+            del self.counts[victim]
+            del self.errors[victim]
+            self.counts[item] = min_count + count
+            self.errors[item] = min_count
+
+        heapq.heappush(self.heap, (self.counts[item], item))
+        if len(self.heap) > 4 * self.capacity: # Drop the stale heap entries once they pile up
+            self._rebuild_heap()
+
+    def _pop_min(self):
+        ''' @returns The (count, item) of the least frequent tracked item, removed from the heap '''
+        while True:
+            count, item = heapq.heappop(self.heap)
+            if self.counts.get(item) == count: # If this heap entry is current
+                return (count, item)
+
+    def _rebuild_heap(self):
+        ''' Rebuilds the heap from the current counts. '''
+        self.heap = [(count, item) for (item, count) in self.counts.iteritems()]
+        heapq.heapify(self.heap)
+
+    def get_min_count(self):
+        '''
+        @returns Upper bound on the count of any item that is not tracked
+        @returnType int
+        '''
+        if len(self.counts) < self.capacity: # If nothing has ever been evicted
+            return 0
+
+        return min(self.counts.itervalues())
+
+    def merge(self, other):
+        '''
+        Merges another summary into this one, as if this summary had also seen the other's stream.
+
+        @param other Summary to be merged in
+        @paramType SpaceSaving
+        @returns n/a
+        '''
+        # An item missing from a full summary may have occurred up to that summary's minimum count
+        min_count       = self.get_min_count()
+        other_min_count = other.get_min_count()
+
+        counts = {}
+        errors = {}
+        for item in set(self.counts.keys()) | set(other.counts.keys()):
+            counts[item] = self.counts.get(item, min_count) + other.counts.get(item, other_min_count)
+            errors[item] = self.errors.get(item, min_count) + other.errors.get(item, other_min_count)
+
+        # Keep only the most frequent items
+        kept = heapq.nlargest(self.capacity, counts.iteritems(), key=operator.itemgetter(1))
+        self.counts = dict(kept)
+        self.errors = dict((item, errors[item]) for (item, count) in kept)
+        self._rebuild_heap()
+
+    def top(self, k=None):
+        '''
+        @param k # of items to return; If None, all of the tracked items are returned
+        @paramType int
+        @returns The most frequent items sorted from most frequent to least frequent, ties by item
+        @returnType list of (item, estimated count) tuples
+        '''
+        items = sorted(self.counts.iteritems(), key=lambda (item, count): (-count, item))
+
+        return items if k is None else items[:k]
+
+    def get_state(self):
+        '''
+        @returns The summary's state, i.e. to be sent to another process, @see from_state
+        @returnType JSON serializable dictionary
+        '''
+        return {
+            'capacity' : self.capacity,
+            'counts' : self.counts.items(),
+            'errors' : self.errors.items()
+        }
+
+    @staticmethod
+    def from_state(state):
+        '''
+        @param state State of a summary, @see get_state
+        @paramType dictionary
+        @returns The summary
+        @returnType SpaceSaving
+        '''
+        summary = SpaceSaving(state['capacity'])
+        summary.counts = dict((item, count) for (item, count) in state['counts'])
+        summary.errors = dict((item, error) for (item, error) in state['errors'])
+        summary._rebuild_heap()
+
+        return summary
+
+    def get_error(self, item):
+        '''
+        @returns Maximum overestimation of the tracked item's count
+        @returnType int
+        '''
+        return self.errors[item]
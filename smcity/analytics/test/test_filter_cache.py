@@ -0,0 +1,80 @@
+''' Unit tests for the FilterCache class. '''
+
+from time import strptime
+
+from smcity.analytics.filter_cache import FilterCache, get_filter_key
+from smcity.analytics.keyword_matcher import KeywordMatcher
+from smcity.analytics.worker import ComplexFilter
+from smcity.polygons.complex_polygon_strategy import ComplexPolygonStrategy
+
+def timestamp(timestamp_str):
+    ''' @returns The parsed timestamp '''
+    return strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
+
+class TestFilterCache:
+    ''' Tests the FilterCache class. '''
+
+    def get_key(self, keywords=None, complex_filters=[], min_lat=1, min_timestamp=None):
+        ''' @returns Key of a filter with the provided criteria '''
+        return get_filter_key('global', min_lat, 2, 3, 4, min_timestamp, None, 'twitter',
+                              KeywordMatcher(keywords) if keywords is not None else None, complex_filters)
+
+    def test_get_filter_key(self):
+        ''' Tests that filters selecting the same data share a key. '''
+        assert self.get_key(['gun', 'Police Car']) == self.get_key(['police car!', 'GUN'])
+        assert self.get_key(min_lat=1) == self.get_key(min_lat=1.0)
+        assert self.get_key(['gun']) != self.get_key(['guns'])
+        assert self.get_key(['gun']) != self.get_key()
+        assert self.get_key(min_timestamp=timestamp('2014-01-02 01:00:00')) != self.get_key()
+
+        square = ComplexPolygonStrategy([[(0, 0), (0, 1), (1, 1), (1, 0)]])
+        same_square = ComplexPolygonStrategy([[[0.0, 0.0], [0.0, 1.0], [1.0, 1.0], [1.0, 0.0], [0.0, 0.0]]])
+        other_square = ComplexPolygonStrategy([[(0, 0), (0, 2), (2, 2), (2, 0)]])
+        assert self.get_key(complex_filters=[square]) == self.get_key(complex_filters=[same_square])
+        assert self.get_key(complex_filters=[square]) != self.get_key(complex_filters=[other_square])
+
+        # Filters that can't describe themselves are never cached
+        assert self.get_key(complex_filters=[square, ComplexFilter()]) is None
+
+    def test_snap_window(self):
+        ''' Tests widening time windows out to the resolution. '''
+        cache = FilterCache(resolution=3600)
+
+        min_timestamp, max_timestamp = cache.snap_window(timestamp('2014-01-02 01:02:03'), timestamp('2014-01-02 03:00:00'))
+        assert min_timestamp[:6] == (2014, 1, 2, 1, 0, 0), min_timestamp
+        assert max_timestamp[:6] == (2014, 1, 2, 3, 59, 59), max_timestamp
+
+        assert cache.snap_window(None, timestamp('2014-01-02 03:59:59'))[1][:6] == (2014, 1, 2, 3, 59, 59)
+        assert cache.snap_window(None, None) == (None, None)
+
+    def test_ttl(self):
+        ''' Tests that entries expire. '''
+        cache = FilterCache(ttl=60)
+        cache.put('key', 'set_id', {'read' : 1}, None, now=1000)
+
+        assert cache.get('key', now=1059) == ('set_id', {'read' : 1}), cache.get('key', now=1059)
+        assert cache.get('key', now=1060) is None
+        assert cache.get('missing') is None
+
+    def test_lru(self):
+        ''' Tests that the least recently used entries are evicted. '''
+        cache = FilterCache(max_entries=2)
+        cache.put('a', 'set_a', {}, None)
+        cache.put('b', 'set_b', {}, None)
+        cache.get('a')
+        cache.put('c', 'set_c', {}, None)
+
+        assert len(cache) == 2, len(cache)
+        assert cache.get('b') is None
+        assert cache.get('a') is not None and cache.get('c') is not None
+
+    def test_invalidate_before(self):
+        ''' Tests dropping the entries that reach back before a horizon. '''
+        cache = FilterCache()
+        cache.put('unbounded', 'set_a', {}, None)
+        cache.put('old', 'set_b', {}, timestamp('2014-01-01 00:00:00'))
+        cache.put('new', 'set_c', {}, timestamp('2014-01-03 00:00:00'))
+
+        assert cache.invalidate_before(timestamp('2014-01-02 00:00:00')) == 2
+        assert cache.get('unbounded') is None and cache.get('old') is None
+        assert cache.get('new') == ('set_c', {}), cache.get('new')
@@ -0,0 +1,59 @@
+''' Unit tests for the filter_pipeline stages. '''
+
+from datetime import datetime
+
+from smcity.analytics import filter_pipeline
+from smcity.analytics.keyword_matcher import KeywordMatcher
+from smcity.analytics.worker import ComplexFilter
+from smcity.models.test.mock_data import MockData
+
+class EvenIdFilter(ComplexFilter):
+    ''' Filters out the data points with even ids. '''
+
+    def is_filtered(self, data):
+        return int(data.get_datum_id()) % 2 == 0
+
+class TestFilterPipeline:
+    ''' Tests the filter_pipeline stages. '''
+
+    def setup(self):
+        ''' Set up before each test. '''
+        self.datas = [
+            MockData({'id' : '1', 'content' : "Gun!", 'location' : (0.5, 0.5), 'timestamp' : datetime(2014, 1, 1)}),
+            MockData({'id' : '2', 'content' : "gun", 'location' : (1.5, 0.5), 'timestamp' : datetime(2014, 1, 2)}),
+            MockData({'id' : '3', 'content' : "Gunman", 'location' : (0.5, 1.5), 'timestamp' : datetime(2014, 1, 3)}),
+            MockData({'id' : '4', 'content' : u"gun.", 'location' : (0.25, 0.75), 'timestamp' : datetime(2014, 1, 4)}),
+            MockData({'id' : '5', 'content' : u"a gun", 'location' : (0.75, 0.25), 'timestamp' : datetime(2014, 1, 5)})
+        ]
+
+    def ids(self, pages):
+        ''' @returns The datum ids of all of the data points in the pages '''
+        return [data.get_datum_id() for page in pages for data in page]
+
+    def test_read_pages(self):
+        ''' Tests the read_pages() function. '''
+        stats = {}
+        pages = list(filter_pipeline.read_pages(self.datas, 2, stats))
+
+        assert [len(page) for page in pages] == [2, 2, 1], pages
+        assert stats == {'read' : 5}, stats
+
+    def test_stages(self):
+        ''' Tests chaining each of the filtering stages. '''
+        stats = {}
+        pages = filter_pipeline.read_pages(self.datas, 2, stats)
+        pages = filter_pipeline.bounding_box_stage(pages, 0, 1, 0, 1, stats)
+        pages = filter_pipeline.time_stage(pages, datetime(2014, 1, 1, 12), None, stats)
+        pages = filter_pipeline.keyword_stage(pages, KeywordMatcher(['gun']), stats)
+        pages = filter_pipeline.complex_filter_stage(pages, EvenIdFilter(), 'even_ids', stats)
+
+        assert self.ids(pages) == ['5'], self.ids(pages)
+        assert stats == {'read' : 5, 'bounding_box' : 3, 'time' : 2, 'keywords' : 2, 'even_ids' : 1}, stats
+
+    def test_rebatch(self):
+        ''' Tests the rebatch() function. '''
+        pages = [self.datas[:1], self.datas[1:4], self.datas[4:]]
+        batches = list(filter_pipeline.rebatch(pages, 2))
+
+        assert [len(batch) for batch in batches] == [2, 2, 1], batches
+        assert self.ids(batches) == ['1', '2', '3', '4', '5'], self.ids(batches)
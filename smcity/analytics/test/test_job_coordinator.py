@@ -0,0 +1,117 @@
+''' Unit tests for the analytics JobCoordinator class. '''
+
+import os
+import shutil
+import tempfile
+
+from ConfigParser import ConfigParser
+from threading import Thread
+from time import strptime
+
+from smcity.analytics.job_coordinator import JobCoordinator
+from smcity.analytics.worker import Worker
+from smcity.misc.errors import NotReadyError, ReadError
+from smcity.models.local.local_queue import LocalResultQueue, LocalTaskQueue
+from smcity.models.test.mock_data import MockData, MockDataFactory
+
+class TestJobCoordinator:
+    ''' Tests the JobCoordinator class. '''
+
+    def setup(self):
+        ''' Set up before each test. '''
+        self.temp_dir = tempfile.mkdtemp()
+
+        config = ConfigParser()
+        config.add_section('local_queue')
+        config.set('local_queue', 'queue_file', os.path.join(self.temp_dir, 'queue.db'))
+        config.add_section('coordinator')
+        config.set('coordinator', 'poll_interval', '0.01')
+        config.add_section('worker')
+        config.set('worker', 'batch_copy_size', '10')
+        config.set('worker', 'poll_interval', '0.01')
+
+        self.data_factory = MockDataFactory()
+        self.data_factory.data = [
+            MockData({'id' : '1', 'content' : "#yolo There's a gun in our school!"}),
+            MockData({'id' : '2', 'content' : "#yolo #guns Nothing to see here"})
+        ]
+        self.result_queue = LocalResultQueue(config)
+        self.task_queue = LocalTaskQueue(config)
+        self.coordinator = JobCoordinator(config, self.result_queue, self.task_queue)
+
+        # Two workers, as if on separate hosts, sharing the queues
+        self.workers = [
+            Worker(config, LocalResultQueue(config), LocalTaskQueue(config), self.data_factory) for iter in range(2)
+        ]
+
+    def teardown(self):
+        ''' Clean up after each test. '''
+        shutil.rmtree(self.temp_dir)
+
+    def _run_workers(self, function, *args, **kwargs):
+        ''' @returns The result of the function, called with the workers running in the background '''
+        threads = [Thread(target=worker.run) for worker in self.workers]
+        for thread in threads:
+            thread.start()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            for worker in self.workers:
+                worker.shutdown()
+            for thread in threads:
+                thread.join()
+
+    def test_filter_data(self):
+        ''' Tests that a filter job's segment stats are merged. '''
+        min_timestamp = strptime('2014-01-02 01:02:03', '%Y-%m-%d %H:%M:%S')
+        set_id, stats = self._run_workers(self.coordinator.filter_data, 3, 'global', 'out_set',
+                                          keywords=['gun'], min_timestamp=min_timestamp)
+
+        # The mock returns the whole data set for every segment
+        assert set_id == 'out_set', set_id
+        assert stats == {'read' : 6, 'keywords' : 3, 'written' : 3}, stats
+        assert len(self.task_queue.queue) == 0 and len(self.result_queue.queue) == 0
+
+    def test_calculate_trending_topics(self):
+        ''' Tests that a trending topics job's segment summaries are merged. '''
+        topics = self._run_workers(self.coordinator.calculate_trending_topics, 4, 'out_set', k=2)
+
+        assert topics == [('#YOLO', 2), ('#GUNS', 1)], topics
+
+    def test_count_data(self):
+        ''' Tests that a count job's segment counts are summed. '''
+        assert self._run_workers(self.coordinator.count_data, 2, 'out_set') == 2
+
+    def test_duplicate_results(self):
+        ''' Tests that a segment's result only counts once, and other jobs' results are left alone. '''
+        job_id = self.coordinator.submit_job(2, {'task' : 'count_data', 'data_set_id' : 'out_set'})
+        self.result_queue.post_result({'job_id' : 'other_job', 'segment_id' : 0, 'count' : 10})
+        for segment_id in [0, 0, 1]:
+            self.result_queue.post_result({'job_id' : job_id, 'segment_id' : segment_id, 'count' : 2})
+
+        assert self.coordinator.wait_for_job(job_id) == 4
+        assert len(self.result_queue.queue) == 1, len(self.result_queue.queue)
+
+    def test_failed_job(self):
+        ''' Tests that a failed segment fails the job. '''
+        job_id = self.coordinator.submit_job(2, {'task' : 'count_data', 'data_set_id' : 'out_set'})
+        self.result_queue.post_result({'job_id' : job_id, 'segment_id' : 0, 'count' : 2})
+        self.result_queue.post_result({'job_id' : job_id, 'segment_id' : 1, 'error' : 'Lost the data set!'})
+
+        try:
+            self.coordinator.wait_for_job(job_id)
+            assert False, 'Expected a ReadError'
+        except ReadError:
+            pass
+
+    def test_job_timeout(self):
+        ''' Tests that a job without workers gives up after the timeout. '''
+        self.coordinator.job_timeout = 0.05
+        job_id = self.coordinator.submit_job(2, {'task' : 'count_data', 'data_set_id' : 'out_set'})
+
+        try:
+            self.coordinator.wait_for_job(job_id)
+            assert False, 'Expected a NotReadyError'
+        except NotReadyError:
+            pass
+        assert job_id not in self.coordinator.jobs
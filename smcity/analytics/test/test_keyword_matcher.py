@@ -0,0 +1,40 @@
+''' Unit tests for the KeywordMatcher class. '''
+
+from smcity.analytics.keyword_matcher import KeywordMatcher, tokenize
+
+class TestKeywordMatcher:
+    ''' Tests the KeywordMatcher class. '''
+
+    def test_tokenize(self):
+        ''' Tests the tokenize() function. '''
+        assert tokenize("There's a gun-man; run!") == ['THERES', 'A', 'GUNMAN', 'RUN'], tokenize("There's a gun-man; run!")
+        assert tokenize(u"'gun, \u00e9t\u00e9.") == [u'GUN', u'\u00c9T\u00c9'], tokenize(u"'gun, \u00e9t\u00e9.")
+
+    def test_tokens(self):
+        ''' Tests matching single token keywords. '''
+        matcher = KeywordMatcher(['GUN', 'shooting'])
+
+        assert matcher.matches("There's a gun in our school!")
+        assert matcher.matches(u"'Gun,")
+        assert matcher.matches("#Shooting downtown")
+        assert not matcher.matches("There's a gunman in our school!")
+        assert not matcher.matches("")
+
+    def test_phrases(self):
+        ''' Tests matching multi-token phrases. '''
+        matcher = KeywordMatcher(['active shooter', 'shots fired downtown', 'police'])
+
+        assert matcher.matches("Reports of an ACTIVE shooter!")
+        assert matcher.matches("shots, fired. downtown")
+        assert matcher.matches("Police everywhere")
+        assert not matcher.matches("Shooter is active")
+        assert not matcher.matches("shots fired uptown")
+        assert not matcher.matches("active")
+
+    def test_large_watchlist(self):
+        ''' Tests matching against thousands of keywords. '''
+        matcher = KeywordMatcher(['keyword%s' % iter for iter in range(5000)] + ['needle in haystack'])
+
+        assert matcher.matches("found KEYWORD4999 here")
+        assert matcher.matches("a needle in haystack")
+        assert not matcher.matches("keyword5000 needle haystack")
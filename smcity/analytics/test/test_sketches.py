@@ -0,0 +1,73 @@
+''' Unit tests for the stream summaries. '''
+
+import json
+import random
+
+from smcity.analytics.sketches import SpaceSaving
+
+class TestSpaceSaving:
+    ''' Tests the SpaceSaving class. '''
+
+    def test_exact_counts(self):
+        ''' Tests that the counts are exact while the summary has room. '''
+        summary = SpaceSaving(10)
+        for item in ['a', 'b', 'a', 'c', 'a', 'b']:
+            summary.add(item)
+
+        assert summary.top() == [('a', 3), ('b', 2), ('c', 1)], summary.top()
+        assert summary.top(2) == [('a', 3), ('b', 2)], summary.top(2)
+        assert summary.get_min_count() == 0, summary.get_min_count()
+        assert summary.get_error('a') == 0, summary.get_error('a')
+
+    def test_bounded_memory(self):
+        ''' Tests that the heavy hitters are found among many rare items. '''
+        generator = random.Random(7)
+        stream = ['heavy%s' % iter for iter in range(5) for repeat in range(200)]
+        stream += ['rare%s' % iter for iter in range(2000)]
+        generator.shuffle(stream)
+
+        summary = SpaceSaving(50)
+        for item in stream:
+            summary.add(item)
+
+        assert len(summary.counts) == 50, len(summary.counts)
+        top = summary.top(5)
+        assert sorted(item for (item, count) in top) == ['heavy%s' % iter for iter in range(5)], top
+        for (item, count) in top: # Each estimate is within its error of the true count
+            assert 200 <= count <= 200 + summary.get_error(item), (item, count, summary.get_error(item))
+
+    def test_merge(self):
+        ''' Tests merging the summaries of two segments. '''
+        left = SpaceSaving(4)
+        right = SpaceSaving(4)
+        for item in ['a', 'a', 'b', 'c']:
+            left.add(item)
+        for item in ['a', 'b', 'b', 'b', 'd']:
+            right.add(item)
+
+        left.merge(right)
+
+        # Neither summary was full, so the merged counts are exact
+        assert left.top() == [('b', 4), ('a', 3), ('c', 1), ('d', 1)], left.top()
+
+        # Each full summary may have missed up to its minimum count of any item it does not track
+        full = SpaceSaving(2)
+        for item in ['e', 'e', 'f']:
+            full.add(item)
+        left.merge(full)
+
+        assert left.top(3) == [('b', 5), ('a', 4), ('e', 3)], left.top(3)
+
+    def test_state(self):
+        ''' Tests that a summary survives a round trip through JSON. '''
+        summary = SpaceSaving(2)
+        for item in ['a', 'a', 'b', 'c']:
+            summary.add(item)
+
+        copy = SpaceSaving.from_state(json.loads(json.dumps(summary.get_state())))
+        assert copy.top() == summary.top(), copy.top()
+        assert copy.get_min_count() == summary.get_min_count(), copy.get_min_count()
+
+        copy.add('d')
+        summary.add('d')
+        assert copy.top() == summary.top(), copy.top()
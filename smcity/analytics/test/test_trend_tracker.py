@@ -0,0 +1,60 @@
+''' Unit tests for the TrendTracker class. '''
+
+import calendar
+
+from time import strptime
+
+from smcity.analytics.trend_tracker import TrendTracker
+
+class TestTrendTracker:
+    ''' Tests the TrendTracker class. '''
+
+    def setup(self):
+        ''' Set up before each test. '''
+        self.tracker = TrendTracker(cell_size=0.1, bucket_seconds=60, num_buckets=60)
+        self.now = 1000 * 60 * 60 # On a bucket boundary
+
+    def test_add_data(self):
+        ''' Tests counting the topics of a data point. '''
+        timestamp = strptime('Mon Jan 01 01:01:01 +0000 2014', '%a %b %d %X +0000 %Y')
+        self.tracker.add_data("#yoLO! about life #YOLO #Columbus", (-83.0, 40.0), timestamp)
+
+        counts = self.tracker.count_topics(39.9, 40.1, -83.1, -82.9, 60, now=calendar.timegm(timestamp))
+        assert counts == {'#YOLO' : 2, '#COLUMBUS' : 1}, counts
+
+    def test_windows(self):
+        ''' Tests counting the topics inside a bounding box and time window. '''
+        self.tracker.add(['#A'], (-83.0, 40.0), self.now - 30)        # In the box, last minute
+        self.tracker.add(['#A', '#B'], (-83.0, 40.0), self.now - 600) # In the box, ten minutes ago
+        self.tracker.add(['#C'], (-90.0, 40.0), self.now - 30)        # Outside of the box
+
+        counts = self.tracker.count_topics(39.9, 40.1, -83.1, -82.9, 60, now=self.now - 1)
+        assert counts == {'#A' : 1}, counts
+        counts = self.tracker.count_topics(39.9, 40.1, -83.1, -82.9, 900, now=self.now - 1)
+        assert counts == {'#A' : 2, '#B' : 1}, counts
+
+        trending = self.tracker.get_trending_topics(39.9, 40.1, -83.1, -82.9, 900, k=1, now=self.now - 1)
+        assert trending == [('#A', 2)], trending
+
+    def test_ring_buffer(self):
+        ''' Tests that buckets older than the ring are forgotten. '''
+        self.tracker.add(['#OLD'], (-83.0, 40.0), self.now - 3600)
+        self.tracker.add(['#NEW'], (-83.0, 40.0), self.now) # Recycles the #OLD bucket's slot
+        self.tracker.add(['#OLD'], (-83.0, 40.0), self.now - 3600) # Too old to track anymore
+
+        counts = self.tracker.count_topics(39.9, 40.1, -83.1, -82.9, 7200, now=self.now)
+        assert counts == {'#NEW' : 1}, counts
+
+    def test_rising_topics(self):
+        ''' Tests finding the topics whose recent rate is well above their baseline rate. '''
+        for minute in range(15, 60): # Steady topic throughout the baseline window
+            self.tracker.add(['#STEADY'], (-83.0, 40.0), self.now - minute * 60)
+        for minute in range(5): # Both topics show up recently
+            self.tracker.add(['#STEADY', '#BREAKING', '#BREAKING'], (-83.0, 40.0), self.now - minute * 60)
+
+        rising = self.tracker.get_rising_topics(
+            39.9, 40.1, -83.1, -82.9, recent_seconds=900, baseline_seconds=2700, now=self.now
+        )
+
+        assert [topic for (topic, count, increase) in rising] == ['#BREAKING', '#STEADY'], rising
+        assert rising[0][1] == 10, rising[0]
@@ -1,11 +1,21 @@
 ''' Unit tests for the analytics Worker class. '''
 
+import os
+import shutil
+import tempfile
+
 from ConfigParser import ConfigParser
+from time import strptime
 
+from smcity.analytics.filter_cache import FilterCache
+from smcity.analytics.sketches import SpaceSaving
 from smcity.analytics.worker import Worker
+from smcity.models.local.local_queue import LocalTaskQueue
 from smcity.models.test.mock_result_queue import MockResultQueue
 from smcity.models.test.mock_task_queue import MockTaskQueue
 from smcity.models.test.mock_data import MockData, MockDataFactory
+from smcity.polygons.complex_polygon_strategy import ComplexPolygonStrategy
+from smcity.polygons.polygon_index import PolygonIndex
 
 class TestWorker:
     ''' Tests the Worker class. '''
@@ -25,6 +35,15 @@ class TestWorker:
         # Set up the Worker instance to be tested
         self.worker = Worker(config, self.result_queue, self.task_queue, self.data_factory)
 
+        self.temp_dir = tempfile.mkdtemp()
+        self.queue_config = ConfigParser()
+        self.queue_config.add_section('local_queue')
+        self.queue_config.set('local_queue', 'queue_file', os.path.join(self.temp_dir, 'queue.db'))
+
+    def teardown(self):
+        ''' Clean up after each test. '''
+        shutil.rmtree(self.temp_dir)
+
     def test_calculate_trending_topics(self):
         ''' Tests the calculate_trending_topics function. '''
         self.data_factory.data = [
@@ -46,6 +65,19 @@ class TestWorker:
         assert trending_topics[2][0] == '#SHESELLSSEASHELLS', trending_topics[2][0]
         assert trending_topics[2][1] == 1, trending_topics[2][1]
 
+    def test_calculate_trending_topics_parallel(self):
+        ''' Tests the calculate_trending_topics_parallel function. '''
+        self.data_factory.data = [
+            MockData({'id' : '1', 'content' : "#yolo something about life!"}),
+            MockData({'id' : '2', 'content' : u"#yoLO! something else about life #YOLO but more exciting!"}),
+            MockData({'id' : '3', 'content' : "#KendrickLamar Money trees, shake em!"}),
+            MockData({'id' : '4', 'content' : "#SHESELLSSEASHELLS!!!! #Kendricklamar Snausages!"})
+        ]
+
+        trending_topics = self.worker.calculate_trending_topics_parallel('mock_data_set', 3, k=2)
+
+        assert trending_topics == [('#YOLO', 3), ('#KENDRICKLAMAR', 2)], trending_topics
+
     def test_filter_data(self):
         ''' Tests the _filter_data() function '''
         # Set up the input data
@@ -67,6 +99,8 @@ class TestWorker:
         assert len(self.result_queue.posted_results) == 1, len(self.result_queue.posted_results)
         assert self.result_queue.posted_results[0]['set_id'] == 'out_data_set_id', \
             self.result_queue.posted_results[0]['set_id']
+        assert self.result_queue.posted_results[0]['stats'] == {'read' : 3, 'keywords' : 1, 'written' : 1}, \
+            self.result_queue.posted_results[0]['stats']
         
         assert len(self.data_factory.copied_data) == 1, len(self.data_factory.copied_data)
         assert self.data_factory.copied_data[0].get_datum_id() == '2', \
@@ -93,3 +127,143 @@ class TestWorker:
 
         # Check the results
         assert len(self.data_factory.copied_data) == 3, len(self.data_factory.copied_data)
+
+    def test_partition_data(self):
+        ''' Tests the _partition_data() function. '''
+        self.data_factory.data = [
+            MockData({'id' : '1', 'content' : "West side", 'location' : (0.5, 0.5)}),
+            MockData({'id' : '2', 'content' : "East side", 'location' : (1.5, 0.5)}),
+            MockData({'id' : '3', 'content' : "Nowhere", 'location' : (5, 5)}),
+            MockData({'id' : '4', 'content' : "West side again", 'location' : (0.25, 0.75)})
+        ]
+        polygon_index = PolygonIndex([
+            ComplexPolygonStrategy([[(0, 0), (0, 1), (1, 1), (1, 0)]]),
+            ComplexPolygonStrategy([[(1, 0), (1, 1), (2, 1), (2, 0)]]),
+            ComplexPolygonStrategy([[(4, 4), (4, 6), (6, 6), (6, 4)]])
+        ], keys=['west', 'east', 'other'])
+        out_data_set_ids = {'west' : 'west_set', 'east' : 'east_set', 'other' : 'other_set'}
+
+        self.worker._partition_data(polygon_index, out_data_set_ids, keywords=['SIDE'])
+
+        # Check the results
+        assert len(self.result_queue.posted_results) == 1, len(self.result_queue.posted_results)
+        assert self.result_queue.posted_results[0]['set_ids'] == out_data_set_ids, \
+            self.result_queue.posted_results[0]
+        assert sorted(self.data_factory.copied_sets.keys()) == ['east_set', 'west_set'], \
+            self.data_factory.copied_sets.keys()
+        assert [data.get_datum_id() for data in self.data_factory.copied_sets['west_set']] == ['1', '4']
+        assert [data.get_datum_id() for data in self.data_factory.copied_sets['east_set']] == ['2']
+
+    def test_filter_data_parallel(self):
+        ''' Tests the filter_data_parallel() function with each segment in its own thread. '''
+        self.data_factory.data = [
+            MockData({'id' : '1', 'content' : "There's a gun in our school!"}),
+            MockData({'id' : '2', 'content' : "Nothing to see here"})
+        ]
+
+        self.worker.filter_data_parallel(3, 'in_data_set_id', 'out_data_set_id', keywords=['GUN'])
+
+        # The mock returns the whole data set for every segment
+        assert len(self.result_queue.posted_results) == 1, len(self.result_queue.posted_results)
+        assert self.result_queue.posted_results[0]['stats'] == {'read' : 6, 'keywords' : 3, 'written' : 3}, \
+            self.result_queue.posted_results[0]['stats']
+        assert [data.get_datum_id() for data in self.data_factory.copied_sets['out_data_set_id']] == ['1'] * 3
+
+    def test_filter_data_processes(self):
+        ''' Tests the filter_data_parallel() function with the segments run in a process pool. '''
+        self.data_factory.data = [
+            MockData({'id' : '1', 'content' : "West side", 'location' : (0.5, 0.5)}),
+            MockData({'id' : '2', 'content' : "East side", 'location' : (1.5, 0.5)})
+        ]
+        self.worker.num_processes = 2
+
+        west_side = ComplexPolygonStrategy([[(0, 0), (0, 1), (1, 1), (1, 0)]])
+        self.worker.filter_data_parallel(4, 'in_data_set_id', 'out_data_set_id', keywords=['SIDE'],
+                                         complex_filters=[west_side])
+
+        # The segments' stats are merged and posted by the parent process
+        assert len(self.result_queue.posted_results) == 1, len(self.result_queue.posted_results)
+        assert self.result_queue.posted_results[0]['stats'] == \
+            {'read' : 8, 'keywords' : 8, 'complex_filter_0' : 4, 'written' : 4}, \
+            self.result_queue.posted_results[0]['stats']
+
+    def test_filter_data_concurrent_writes(self):
+        ''' Tests the filter_data_parallel() function with the writes overlapped with the scans. '''
+        self.data_factory.data = [
+            MockData({'id' : str(iter), 'content' : "gun %s" % iter}) for iter in range(25)
+        ]
+        self.worker.max_concurrent_writes = 2
+        self.worker.max_concurrent_scans  = 2
+
+        self.worker.filter_data_parallel(3, 'in_data_set_id', 'out_data_set_id', keywords=['GUN'])
+
+        assert self.result_queue.posted_results[0]['stats'] == {'read' : 75, 'keywords' : 75, 'written' : 75}, \
+            self.result_queue.posted_results[0]['stats']
+        assert len(self.data_factory.copied_sets['out_data_set_id']) == 75, \
+            len(self.data_factory.copied_sets['out_data_set_id'])
+
+    def test_filter_data_cached(self):
+        ''' Tests that a repeated filter_data_parallel() call reuses the first call's data set. '''
+        timestamp = strptime('2014-01-02 05:00:00', '%Y-%m-%d %H:%M:%S')
+        self.data_factory.data = [
+            MockData({'id' : '1', 'content' : "There's a gun in our school!", 'timestamp' : timestamp}),
+            MockData({'id' : '2', 'content' : "Nothing to see here", 'timestamp' : timestamp})
+        ]
+        self.worker.filter_cache = FilterCache(max_entries=4, ttl=60)
+        min_timestamp = strptime('2014-01-02 01:02:03', '%Y-%m-%d %H:%M:%S')
+
+        set_id = self.worker.filter_data_parallel(2, 'global', 'first_set', keywords=['gun'],
+                                                  min_timestamp=min_timestamp)
+        assert set_id == 'first_set', set_id
+
+        min_timestamp = strptime('2014-01-02 01:32:03', '%Y-%m-%d %H:%M:%S') # Within the same hour
+        set_id = self.worker.filter_data_parallel(2, 'global', 'second_set', keywords=['GUN!'],
+                                                  min_timestamp=min_timestamp)
+        assert set_id == 'first_set', set_id
+        assert self.data_factory.copied_sets.keys() == ['first_set'], self.data_factory.copied_sets.keys()
+        assert self.result_queue.posted_results[1] == self.result_queue.posted_results[0], \
+            self.result_queue.posted_results
+
+        set_id = self.worker.filter_data_parallel(2, 'global', 'third_set', keywords=['school'],
+                                                  min_timestamp=min_timestamp)
+        assert set_id == 'third_set', set_id
+
+    def test_run(self):
+        ''' Tests that run() performs the queued tasks and posts their results. '''
+        self.data_factory.data = [
+            MockData({'id' : '1', 'content' : "#yolo There's a gun in our school!"}),
+            MockData({'id' : '2', 'content' : "#yolo Nothing to see here"})
+        ]
+        self.task_queue = LocalTaskQueue(self.queue_config)
+        self.worker.task_queue = self.task_queue
+        self.task_queue.request_task({
+            'job_id' : 'job', 'task' : 'filter_data', 'coordinate_box' : None, 'segment_id' : 1,
+            'num_segments' : 2, 'in_data_set_id' : 'global', 'out_data_set_id' : 'out_set', 'keywords' : ['gun'],
+            'min_timestamp' : None, 'max_timestamp' : None, 'data_type' : None
+        })
+        self.task_queue.request_task({'job_id' : 'job', 'task' : 'calculate_trending_topics', 'data_set_id' : 'out_set'})
+        self.task_queue.request_task({'job_id' : 'job', 'task' : 'count_data', 'data_set_id' : 'out_set'})
+
+        assert self.worker.run(stop_when_idle=True) == 3
+
+        results = self.result_queue.posted_results
+        assert [result['task'] for result in results] == ['filter_data', 'calculate_trending_topics', 'count_data']
+        assert results[0]['set_id'] == 'out_set' and results[0]['segment_id'] == 1, results[0]
+        assert results[0]['stats'] == {'read' : 2, 'keywords' : 1, 'written' : 1}, results[0]
+        assert SpaceSaving.from_state(results[1]['topics']).top(1) == [('#YOLO', 2)], results[1]
+        assert results[2]['count'] == 2 and results[2]['num_segments'] == 1, results[2]
+        assert len(self.task_queue.queue) == 0
+
+    def test_run_retries(self):
+        ''' Tests that a failing task is retried, then reported as failed. '''
+        self.task_queue = LocalTaskQueue(self.queue_config)
+        times = iter(range(100))
+        self.task_queue.queue.clock = lambda: next(times) * 600.0 # Outlasts the visibility timeout every call
+        self.worker.task_queue = self.task_queue
+        self.task_queue.request_task({'job_id' : 'job', 'task' : 'unknown_task'})
+
+        assert self.worker.run(stop_when_idle=True) == 3, 'Expected max_task_attempts attempts'
+        assert len(self.result_queue.posted_results) == 1, self.result_queue.posted_results
+        assert self.result_queue.posted_results[0]['error'] == 'Unknown task unknown_task!', \
+            self.result_queue.posted_results[0]
+        assert len(self.task_queue.queue) == 0
@@ -0,0 +1,174 @@
+''' Incremental trending topic detection over the live ingest stream. '''
+
+import calendar
+import math
+import time
+
+from threading import Lock
+
+from smcity.analytics.keyword_matcher import get_topics
+
+class TrendTracker:
+    '''
+    Keeps per region, time bucketed counts of the hash-tagged topics seen on the stream so trending
+    questions are answered from memory instead of from a data set. Regions are the cells of a
+    uniform lat/lon grid and the buckets form a ring buffer, i.e. 1440 one minute buckets cover the
+    last 24 hours, whose oldest bucket is recycled as time moves on.
+    '''
+
+    def __init__(self, cell_size=0.1, bucket_seconds=60, num_buckets=1440):
+        '''
+        Constructor.
+
+        @param cell_size Width and height of each region's grid cell in degrees
+        @paramType float
+        @param bucket_seconds # of seconds covered by each time bucket
+        @paramType int
+        @param num_buckets # of time buckets kept, the oldest counts are forgotten after
+        num_buckets * bucket_seconds seconds
+        @paramType int
+        @returns n/a
+        '''
+        assert cell_size > 0, cell_size
+        assert bucket_seconds > 0, bucket_seconds
+        assert num_buckets > 0, num_buckets
+
+        self.cell_size      = float(cell_size)
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets    = num_buckets
+        self.bucket_ids     = [None] * num_buckets # Time bucket currently held by each ring slot
+        self.buckets        = [None] * num_buckets # (row, col) => {topic => count} of each ring slot
+        self.lock           = Lock()
+
+    def _cell_of(self, lon, lat):
+        ''' @returns The (row, col) of the grid cell containing the provided location '''
+        return (int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size)))
+
+    def add(self, topics, location, timestamp):
+        '''
+        Counts the topics seen at the provided location and time.
+
+        @param topics Topics to be counted
+        @paramType list of string
+        @param location Where the topics were seen
+        @paramType (longitude/float, latitude/float)
+        @param timestamp When the topics were seen, in seconds since the epoch
+        @paramType float
+        @returns n/a
+        '''
+        if len(topics) == 0:
+            return
+
+        bucket_id = int(timestamp // self.bucket_seconds)
+        slot      = bucket_id % self.num_buckets
+        cell      = self._cell_of(location[0], location[1])
+
+        with self.lock:
+            if self.bucket_ids[slot] != bucket_id: # If the slot still holds an older bucket, recycle it
+                if self.bucket_ids[slot] is not None and self.bucket_ids[slot] > bucket_id:
+                    return # Too old to be tracked anymore
+                self.bucket_ids[slot] = bucket_id
+                self.buckets[slot]    = {}
+
+            cell_topics = self.buckets[slot].setdefault(cell, {})
+            for topic in topics:
+                cell_topics[topic] = cell_topics.get(topic, 0) + 1
+
+    def add_data(self, content, location, timestamp):
+        '''
+        Counts the hash-tagged topics in a data point's content.
+
+        @param content Content of the data point
+        @paramType string or unicode
+        @param location Location of the data point
+        @paramType (longitude/float, latitude/float)
+        @param timestamp When the data point was created
+        @paramType time.struct_time in UTC
+        @returns n/a
+        '''
+        self.add(get_topics(content), location, calendar.timegm(timestamp))
+
+    def count_topics(self, min_lat, max_lat, min_lon, max_lon, seconds, now=None):
+        '''
+        Counts the topics seen inside the bounding box during the last few seconds. Counts are kept
+        per grid cell and time bucket, so the box and window are rounded out to whole cells and
+        buckets.
+
+        @param seconds Length of the time window
+        @paramType int
+        @param now End of the time window, in seconds since the epoch; If None, the current time
+        @paramType float
+        @returns Occurrences of each topic
+        @returnType dictionary of topic to int
+        '''
+        if now is None:
+            now = time.time()
+
+        last_bucket_id  = int(now // self.bucket_seconds)
+        first_bucket_id = last_bucket_id - int(math.ceil(float(seconds) / self.bucket_seconds)) + 1
+        first_bucket_id = max(first_bucket_id, last_bucket_id - self.num_buckets + 1)
+        min_row, min_col = self._cell_of(min_lon, min_lat)
+        max_row, max_col = self._cell_of(max_lon, max_lat)
+
+        counts = {}
+        with self.lock:
+            for bucket_id in range(first_bucket_id, last_bucket_id + 1):
+                slot = bucket_id % self.num_buckets
+                if self.bucket_ids[slot] != bucket_id: # If nothing was seen during this bucket
+                    continue
+
+                for ((row, col), cell_topics) in self.buckets[slot].iteritems():
+                    if min_row <= row <= max_row and min_col <= col <= max_col:
+                        for (topic, count) in cell_topics.iteritems():
+                            counts[topic] = counts.get(topic, 0) + count
+
+        return counts
+
+    def get_trending_topics(self, min_lat, max_lat, min_lon, max_lon, seconds=900, k=10, now=None):
+        '''
+        @returns The most frequent topics inside the bounding box during the last few seconds
+        @returnType list of (topic, # occurrence) tuples sorted from most frequent to least frequent
+        '''
+        counts = self.count_topics(min_lat, max_lat, min_lon, max_lon, seconds, now)
+
+        return sorted(counts.iteritems(), key=lambda (topic, count): (-count, topic))[:k]
+
+    def get_rising_topics(self, min_lat, max_lat, min_lon, max_lon,
+                                recent_seconds=900, baseline_seconds=86400,
+                                min_count=3, k=10, now=None):
+        '''
+        Finds the topics inside the bounding box whose recent rate of occurrence is furthest above
+        their rate over the baseline window preceding it.
+
+        @param recent_seconds Length of the recent window
+        @paramType int
+        @param baseline_seconds Length of the baseline window, which ends where the recent window begins
+        @paramType int
+        @param min_count Minimum # of recent occurrences for a topic to be considered rising
+        @paramType int
+        @param k Maximum # of topics returned
+        @paramType int
+        @param now End of the recent window, in seconds since the epoch; If None, the current time
+        @paramType float
+        @returns Rising topics sorted from fastest to slowest rising
+        @returnType list of (topic, # recent occurrences, rate increase) tuples
+        '''
+        if now is None:
+            now = time.time()
+
+        recent   = self.count_topics(min_lat, max_lat, min_lon, max_lon, recent_seconds, now)
+        baseline = self.count_topics(min_lat, max_lat, min_lon, max_lon, baseline_seconds, now - recent_seconds)
+
+        rising = []
+        for (topic, count) in recent.iteritems():
+            if count < min_count:
+                continue
+
+            # Smooth the baseline so topics never seen before get a large but finite increase
+            recent_rate   = float(count) / recent_seconds
+            baseline_rate = (baseline.get(topic, 0) + 1.0) / baseline_seconds
+            rising.append((topic, count, recent_rate / baseline_rate))
+
+        rising.sort(key=lambda (topic, count, increase): (-increase, topic))
+
+        return rising[:k]
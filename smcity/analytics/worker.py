@@ -1,17 +1,48 @@
 ''' Contains the backend worker that actually handles performing the analytical tasks. '''
 
-import operator
-import string
-
-from threading import Thread
-
+from multiprocessing import Pool
+from threading import Event, Lock, Thread
+from time import gmtime
+
+from smcity.analytics import filter_pipeline
+from smcity.analytics.filter_cache import FilterCache, get_filter_key
+from smcity.analytics.keyword_matcher import KeywordMatcher, get_topics
+from smcity.analytics.sketches import SpaceSaving
 from smcity.misc.logger import Logger
+from smcity.models.scan_write_driver import ScanWriteDriver
 
 logger = Logger(__name__)
 
+# Task name => name of the Worker method handling it, @see Worker.run_task
+TASK_HANDLERS = {
+    'calculate_trending_topics' : '_run_trending_topics_task',
+    'count_data' : '_run_count_data_task',
+    'filter_data' : '_run_filter_data_task'
+}
+
 class ComplexFilter:
     ''' Interface definition for a post-fetch filter that determines whether or not the data point is kept. '''
 
+    def filter_many(self, datas):
+        '''
+        Determines whether or not each of the provided data points is filtered out. Implementations
+        should override this when they can evaluate a whole page of data faster than point by point.
+
+        @param datas Data points to be checked for filtering
+        @paramType list of Data
+        @returns Whether or not each data point is filtered out
+        @returnType list of boolean
+        '''
+        return [self.is_filtered(data) for data in datas]
+
+    def get_cache_key(self):
+        '''
+        @returns Canonical description of the filter, equal for any two filters keeping the same data
+        points, so filter jobs using it can be cached; None if they can't be
+        @returnType hashable
+        '''
+        return None
+
     def is_filtered(self, data):
         '''
         Determines whether or not the provided data point is filtered out.
@@ -37,6 +68,63 @@ class Worker():
         Type:    int
         Desc:    How many data points to process before committing the intermediate results
 
+        Section: worker
+        Key:     page_size
+        Type:    int
+        Desc:    How many data points each filtering stage handles at once (Optional, default 1000)
+
+        Section: worker
+        Key:     num_processes
+        Type:    int
+        Desc:    Size of the process pool the segments of parallel jobs are run in; If 0, each
+                 segment runs in its own thread instead (Optional, default 0)
+
+        Section: worker
+        Key:     max_concurrent_writes
+        Type:    int
+        Desc:    Maximum # of batch writes a parallel job keeps in flight while it scans; If 0, each
+                 segment writes its own batches in between its scan requests (Optional, default 0)
+
+        Section: worker
+        Key:     max_concurrent_scans
+        Type:    int
+        Desc:    Maximum # of segments scanned at once when writes are run concurrently; If 0,
+                 every segment is scanned at once (Optional, default 0)
+
+        Section: worker
+        Key:     topic_capacity
+        Type:    int
+        Desc:    Maximum # of distinct topics each segment of a trending topics calculation tracks
+                 (Optional, default 10000)
+
+        Section: worker
+        Key:     filter_cache_size
+        Type:    int
+        Desc:    Maximum # of parallel filter results cached so repeated filters skip their scans;
+                 If 0, nothing is cached (Optional, default 0)
+
+        Section: worker
+        Key:     filter_cache_ttl
+        Type:    float
+        Desc:    # of seconds a cached filter result stays valid (Optional, default 300)
+
+        Section: worker
+        Key:     filter_cache_resolution
+        Type:    int
+        Desc:    # of seconds the time windows of cached filters are widened out to, so windows
+                 computed moments apart share a result (Optional, default 3600)
+
+        Section: worker
+        Key:     poll_interval
+        Type:    float
+        Desc:    # of seconds run() waits before asking an empty task queue again (Optional, default 1)
+
+        Section: worker
+        Key:     max_task_attempts
+        Type:    int
+        Desc:    # of times a failing task is tried before a failure result is posted for it, @see
+                 run_task (Optional, default 3)
+
         @paramType ConfigParser
         @param result_queue Interface for posting work results
         @paramType ResultQueue
@@ -52,53 +140,209 @@ class Worker():
 
         self.batch_copy_size  = config.getint('worker', 'batch_copy_size') 
         self.is_shutting_down = False
+        self.page_size        = 1000
+        if config.has_option('worker', 'page_size'):
+            self.page_size = config.getint('worker', 'page_size')
+        self.num_processes    = 0
+        if config.has_option('worker', 'num_processes'):
+            self.num_processes = config.getint('worker', 'num_processes')
+        self.max_concurrent_writes = 0
+        if config.has_option('worker', 'max_concurrent_writes'):
+            self.max_concurrent_writes = config.getint('worker', 'max_concurrent_writes')
+        self.max_concurrent_scans  = 0
+        if config.has_option('worker', 'max_concurrent_scans'):
+            self.max_concurrent_scans = config.getint('worker', 'max_concurrent_scans')
+        self.topic_capacity        = 10000
+        if config.has_option('worker', 'topic_capacity'):
+            self.topic_capacity = config.getint('worker', 'topic_capacity')
+        self.filter_cache          = None
+        if config.has_option('worker', 'filter_cache_size') and config.getint('worker', 'filter_cache_size') > 0:
+            ttl, resolution = 300, 3600
+            if config.has_option('worker', 'filter_cache_ttl'):
+                ttl = config.getfloat('worker', 'filter_cache_ttl')
+            if config.has_option('worker', 'filter_cache_resolution'):
+                resolution = config.getint('worker', 'filter_cache_resolution')
+            self.filter_cache = FilterCache(config.getint('worker', 'filter_cache_size'), ttl, resolution)
+        self.poll_interval         = 1.0
+        if config.has_option('worker', 'poll_interval'):
+            self.poll_interval = config.getfloat('worker', 'poll_interval')
+        self.max_task_attempts     = 3
+        if config.has_option('worker', 'max_task_attempts'):
+            self.max_task_attempts = config.getint('worker', 'max_task_attempts')
         self.result_queue     = result_queue
         self.task_queue       = task_queue
         self.data_factory     = data_factory
+        self.stopped          = Event()
 
-    def calculate_trending_topics(self, data_set_id):
+    def run(self, stop_when_idle = False):
+        '''
+        Handles the tasks of the task queue one after another, until shutdown() is called. @see run_task
+
+        @param stop_when_idle Whether or not to return once the task queue is empty, instead of waiting
+        for more tasks
+        @paramType boolean
+        @returns # of tasks handled
+        @returnType int
+        '''
+        num_tasks = 0
+        while not self.is_shutting_down:
+            task = self.task_queue.get_task()
+            if task is None: # If there is nothing to do right now
+                if stop_when_idle:
+                    break
+                self.stopped.wait(self.poll_interval)
+                continue
+
+            self.run_task(task)
+            num_tasks += 1
+
+        return num_tasks
+
+    def run_task(self, task):
+        '''
+        Performs a task, posts its result and removes it from the task queue. A failing task is left on
+        the queue to be handed out again once its visibility timeout lapses, the same as the task of a
+        crashed worker, until it has been tried worker.max_task_attempts times; Then a result with an
+        'error' is posted for it instead.
+
+        Tasks are dictionaries with the keys:
+
+        job_id         - Tracking id of the job the task is part of
+        task           - 'filter_data', 'calculate_trending_topics' or 'count_data'
+        coordinate_box - Restricts the data to the 'min_lat', 'max_lat', 'min_lon', 'max_lon' of the
+                         dictionary, or None (filter_data only)
+        segment_id     - Segment of the data the task handles (Optional, default 0)
+        num_segments   - # of segments the data is split into (Optional, default 1)
+        attempts       - # of times the task has been retrieved from the queue (Optional, default 1)
+
+        filter_data tasks also take the in_data_set_id, out_data_set_id, min_timestamp, max_timestamp
+        (seconds since the epoch), data_type and keywords (list of string) arguments of _filter_data.
+        calculate_trending_topics and count_data tasks take the data_set_id to read.
+
+        Results carry the job_id, task, coordinate_box, segment_id and num_segments of their task and:
+
+        filter_data               - set_id, the out_data_set_id, and stats, @see _filter_segment
+        calculate_trending_topics - topics, the state of the segment's SpaceSaving summary
+        count_data                - count, the # of data points in the segment
+
+        @param task Task retrieved from the task queue
+        @paramType dictionary
+        @returns The posted result, or None if the task is left to be retried
+        @returnType dictionary
+        '''
+        try:
+            if task['task'] not in TASK_HANDLERS:
+                raise ValueError("Unknown task %s!" % task['task'])
+            result = getattr(self, TASK_HANDLERS[task['task']])(task)
+        except Exception as error:
+            logger.exception()
+            if task.get('attempts', 1) < self.max_task_attempts:
+                return None
+            result = {'error' : str(error)}
+
+        result.update({
+            'job_id' : task['job_id'],
+            'task' : task['task'],
+            'coordinate_box' : task.get('coordinate_box'),
+            'segment_id' : task.get('segment_id', 0),
+            'num_segments' : task.get('num_segments', 1)
+        })
+        self.result_queue.post_result(result)
+        self.task_queue.finish_task(task)
+
+        return result
+
+    def _run_filter_data_task(self, task):
+        ''' @returns The result of the filter_data task, @see run_task '''
+        coordinate_box = task.get('coordinate_box') or {}
+        stats = self._filter_segment(
+            task['in_data_set_id'], task['out_data_set_id'],
+            min_lat = coordinate_box.get('min_lat'), max_lat = coordinate_box.get('max_lat'),
+            min_lon = coordinate_box.get('min_lon'), max_lon = coordinate_box.get('max_lon'),
+            min_timestamp = _get_timestamp(task, 'min_timestamp'), max_timestamp = _get_timestamp(task, 'max_timestamp'),
+            data_type = task.get('data_type'), keywords = task.get('keywords'),
+            segment_id = task.get('segment_id', 0), num_segments = task.get('num_segments', 1)
+        )
+
+        return {'set_id' : task['out_data_set_id'], 'stats' : stats}
+
+    def _run_trending_topics_task(self, task):
+        ''' @returns The result of the calculate_trending_topics task, @see run_task '''
+        topics = self._count_topics_segment(
+            task['data_set_id'], segment_id = task.get('segment_id', 0), num_segments = task.get('num_segments', 1)
+        )
+
+        return {'topics' : topics.get_state()}
+
+    def _run_count_data_task(self, task):
+        ''' @returns The result of the count_data task, @see run_task '''
+        datas = self.data_factory.get_data_set(
+            task['data_set_id'], segment_id = task.get('segment_id', 0), num_segments = task.get('num_segments', 1)
+        )
+
+        return {'count' : sum(1 for data in datas)}
+
+    def shutdown(self):
+        '''
+        Stops run() once the task at hand is done.
+
+        @returns n/a
+        '''
+        self.is_shutting_down = True
+        self.stopped.set()
+
+    def calculate_trending_topics(self, data_set_id, k = None):
         '''
         Calculates the trending topics in the provided data set.
 
         @param data_set_id Tracking id of the set whose trending topics should be calculated.
         @paramType string
+        @param k # of topics to return; If None, every tracked topic is returned
+        @paramType int
         @returns List of (topic, # occurrence) tuples sorted from most frequent to least frequent
         @returnType List of (string, int) tuples
         '''
-        topics = {}
-        
-        punctuation_list = string.punctuation
-        punctuation_list = punctuation_list.replace('#', '') # Keep the topic hash
-        print "Punctuation List:", punctuation_list
+        return self._count_topics_segment(data_set_id).top(k)
 
-        punctuation_map = dict((ord(char), None) for char in string.punctuation)
-        del punctuation_map[35] # Keep the topic hash
-        print "Punctuation Map:", punctuation_map
+    def calculate_trending_topics_parallel(self, data_set_id, num_segments, k = None):
+        '''
+        Performs a parallel trending topics calculation. Each segment of the data set is summarized
+        separately and the summaries are merged. @see calculate_trending_topics
 
-        for datum in self.data_factory.get_data_set(data_set_id): # For all the data in the set
-            # Break the data content into useful tokens
-            content_tokens = datum.get_content()
-  
-            if type(content_tokens) is unicode: # Strip out any non-hash punctuation
-                content_tokens = content_tokens.translate(punctuation_map)
-            else:
-                content_tokens = content_tokens.translate(string.maketrans("",""), punctuation_list)
-            
-            content_tokens = content_tokens.split()
-
-            for content_token in content_tokens: # Check each token to see if it is a hash-tagged topic
-                print content_token
-                if content_token.startswith('#'): # If this is a hash-tagged topic
-                    if content_token.upper() in topics.keys(): # If this is not the first occurrence
-                        topics[content_token.upper()] += 1 # Increase the occurrence count
-                    else: # If this is the first occurrence
-                        topics[content_token.upper()] = 1
-
-        # Sort the hash-tagged topics in order of occurrence frequency
-        results = sorted(topics.iteritems(), key=operator.itemgetter(1))
-        results.reverse()
+        @param num_segments # of segments to split the data set scan into
+        @paramType int
+        @returns List of (topic, # occurrence) tuples sorted from most frequent to least frequent
+        @returnType List of (string, int) tuples
+        '''
+        kwargs = {
+            'data_set_id' : data_set_id,
+            'num_segments' : num_segments
+        }
+        summaries = self._run_segments(self._count_topics_segment, num_segments, kwargs, is_writing = False)
 
-        return results
+        topics = summaries[0]
+        for summary in summaries[1:]: # Merge the summaries of all the segments
+            topics.merge(summary)
+
+        return topics.top(k)
+
+    def _count_topics_segment(self, data_set_id, segment_id = 0, num_segments = 1):
+        '''
+        Counts the hash-tagged topics in one segment of the data set. Memory is bounded by
+        worker.topic_capacity; If a segment has more distinct topics than that, the counts of the
+        frequent topics are estimates. @see SpaceSaving
+
+        @returns Summary of the segment's most frequent topics
+        @returnType SpaceSaving
+        '''
+        topics = SpaceSaving(self.topic_capacity)
+
+        datas = self.data_factory.get_data_set(data_set_id, segment_id = segment_id, num_segments = num_segments)
+        for data in datas: # For all the data in the set
+            for topic in get_topics(data.get_content()):
+                topics.add(topic)
+
+        return topics
 
     def filter_data_parallel(self, num_segments, in_data_set_id, out_data_set_id,
                              min_lat = None, max_lat = None,
@@ -108,35 +352,53 @@ class Worker():
                              complex_filters = []):
         ''' 
         Performs a parallel filtering operation. @see _filter_data
-        
-        @param num_segments # of threads to spin up for the parallel filtering
+
+        If filter results are cached and an identical filter ran recently, its data set is reused
+        instead and nothing is written to out_data_set_id.
+
+        @param num_segments # of segments to split the global data scan into
         @paramType int
-        @returns n/a
+        @returns Tracking id of the filtered data set
+        @returnType string
         '''
-        filterers = []
-
-        for segment_id in range(num_segments): # For each segment, spin up a filtering thread
-            kwargs = {
-                'segment_id' : segment_id,
-                'num_segments' : num_segments,
-                'in_data_set_id' : in_data_set_id,
-                'out_data_set_id' : out_data_set_id,
-                'min_lat' : min_lat,
-                'max_lat' : max_lat,
-                'min_lon' : min_lon,
-                'max_lon' : max_lon,
-                'min_timestamp' : min_timestamp,
-                'max_timestamp' : max_timestamp,
-                'data_type' : data_type,
-                'keywords' : keywords,
-                'complex_filters' : complex_filters
-            }
-            filterer = Thread(target=self._filter_data, kwargs=kwargs)
-            filterer.start()
-            filterers.append(filterer)
-
-        for filterer in filterers:
-            filterer.join() # Wait for the filter threads to finish before returning
+        if keywords is not None: # Compile the keywords once for all of the segments
+            keywords = KeywordMatcher(keywords)
+
+        cache_key = None
+        if self.filter_cache is not None:
+            min_timestamp, max_timestamp = self.filter_cache.snap_window(min_timestamp, max_timestamp)
+            cache_key = get_filter_key(
+                in_data_set_id, min_lat, max_lat, min_lon, max_lon,
+                min_timestamp, max_timestamp, data_type, keywords, complex_filters
+            )
+            cached = self.filter_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None: # If this filter's result is still around
+                logger.info("Reusing data set %s for filter %s", cached[0], cache_key)
+                self.result_queue.post_result({'set_id' : cached[0], 'stats' : cached[1]})
+                return cached[0]
+
+        kwargs = {
+            'num_segments' : num_segments,
+            'in_data_set_id' : in_data_set_id,
+            'out_data_set_id' : out_data_set_id,
+            'min_lat' : min_lat,
+            'max_lat' : max_lat,
+            'min_lon' : min_lon,
+            'max_lon' : max_lon,
+            'min_timestamp' : min_timestamp,
+            'max_timestamp' : max_timestamp,
+            'data_type' : data_type,
+            'keywords' : keywords,
+            'complex_filters' : complex_filters
+        }
+        stats = _merge_stats(self._run_segments(self._filter_segment, num_segments, kwargs))
+        if cache_key is not None:
+            self.filter_cache.put(cache_key, out_data_set_id, stats, min_timestamp)
+
+        # Notify the reducer, nothing complicated to send, just tell it we are done filtering
+        self.result_queue.post_result({'set_id' : out_data_set_id, 'stats' : stats})
+
+        return out_data_set_id
 
     def _filter_data(self, in_data_set_id, out_data_set_id, 
                            min_lat = None, max_lat = None,
@@ -164,13 +426,39 @@ class Worker():
         @param type Restricts data to a particular data type, i.e. twitter data
         @paramType string
         @param keywords Restricts data to those with content containing one or more of the provided keywords
-        @paramType list of string
+        @paramType list of string or KeywordMatcher
         @param complex_filters Additional complex filtering steps to be applied
         @paramType list of ComplexFilters
         @returns n/a
         '''
+        stats = self._filter_segment(
+            in_data_set_id, out_data_set_id, min_lat = min_lat, max_lat = max_lat,
+            min_lon = min_lon, max_lon = max_lon, min_timestamp = min_timestamp,
+            max_timestamp = max_timestamp, data_type = data_type, keywords = keywords,
+            complex_filters = complex_filters, segment_id = segment_id, num_segments = num_segments
+        )
+
+        # Notify the reducer, nothing complicated to send, just tell it we are done filtering
+        self.result_queue.post_result({'set_id' : out_data_set_id, 'stats' : stats})
+
+    def _filter_segment(self, in_data_set_id, out_data_set_id, 
+                              min_lat = None, max_lat = None,
+                              min_lon = None, max_lon = None,
+                              min_timestamp = None, max_timestamp = None,
+                              data_type = None, keywords = None,
+                              complex_filters = [], segment_id = 0,
+                              num_segments = 1, writer = None):
+        '''
+        Filters one segment of the global data into the output data set. @see _filter_data
+
+        @param writer Interface the output batches are written through; If None, the data factory
+        @paramType DataFactory or ScanWriteDriver
+        @returns Counters of how many data points made it through each stage
+        @returnType dictionary of stage name to int
+        '''
         assert in_data_set_id is not None
         assert out_data_set_id is not None
+        writer = writer if writer is not None else self.data_factory
 
         # Retrieve all of the data points that meet all filtering criteria other than keywords
         datas = self.data_factory.filter_global_data(
@@ -179,52 +467,274 @@ class Worker():
             type=data_type, segment_id = segment_id, num_segments = num_segments
         )
 
-        print "Keywords:", keywords
-
-        punctuation_map = dict((ord(char), None) for char in string.punctuation)
-
-        # Filter the data points for those containing the key words of interest
-        batch = []
-        num_points_processed = 0
-        for data in datas:
-            if keywords is not None: # If we are filtering on keyword content
-                content_tokens = data.get_content()
-                if type(content_tokens) is unicode:
-                    content_tokens = content_tokens.translate(punctuation_map)
-                else:
-                    content_tokens = content_tokens.translate(string.maketrans("",""), string.punctuation)
-                content_tokens = content_tokens.split()
-
-                # Check each of the content tokens to see if it is a keyword
-                keyword_found = False
-                for content_token in content_tokens: 
-                    if content_token.upper() in keywords: # If we've found a keyword
-                        keyword_found = True # The data point passes the filter
-                        break
-
-                # If there is not keyword in this data point, filter it
-                if not keyword_found:
-                    continue
-           
-            is_filtered = False 
-            for complex_filter in complex_filters: # Apply any complex filters
-                if complex_filter.is_filtered(data): # If the data point gets filtered out by this filter
-                    print "Filtering out point at ", data.get_location()
-                    is_filtered = True
-                    break
+        # Chain the filtering stages, each one works on whole pages of data points at a time
+        stats = {}
+        pages = self._filter_pages(
+            datas, stats, min_lat = min_lat, max_lat = max_lat, min_lon = min_lon, max_lon = max_lon,
+            min_timestamp = min_timestamp, max_timestamp = max_timestamp, keywords = keywords
+        )
+        for iter in range(len(complex_filters)): # Apply any complex filters
+            pages = filter_pipeline.complex_filter_stage(pages, complex_filters[iter], 'complex_filter_%s' % iter, stats)
 
-            if is_filtered: # If this data point needs to be filtered out
-                continue
+        # Commit the surviving data points
+        stats['written'] = 0
+        for batch in filter_pipeline.rebatch(pages, self.batch_copy_size):
+            writer.copy_data(out_data_set_id, batch)
+            stats['written'] += len(batch)
 
-            print "Keeping data point:", data.get_content()
-            batch.append(data) # Data point has survived all filtering so keep it!
+        logger.debug("Filtered segment %s/%s into %s: %s", segment_id, num_segments, out_data_set_id, stats)
 
-            if len(batch) >= self.batch_copy_size: # If the batch is getting too big
-                self.data_factory.copy_data(out_data_set_id, batch) # Commit the batch
-                batch = []
+        return stats
 
-        if len(batch) > 0: # Commit the remaining partial batch
-            self.data_factory.copy_data(out_data_set_id, batch)
+    def _filter_pages(self, datas, stats,
+                            min_lat = None, max_lat = None,
+                            min_lon = None, max_lon = None,
+                            min_timestamp = None, max_timestamp = None,
+                            keywords = None):
+        '''
+        Builds the simple filtering stages of the pipeline. Stages for unset criteria are skipped.
+
+        @param datas Data points to be filtered
+        @paramType Iterator of Data
+        @param stats Stage counters to be updated
+        @paramType dictionary
+        @returns Pages of the data points that pass the simple filters
+        @returnType generator of lists of Data
+        '''
+        pages = filter_pipeline.read_pages(datas, self.page_size, stats)
+
+        if min_lat is not None or max_lat is not None or min_lon is not None or max_lon is not None:
+            pages = filter_pipeline.bounding_box_stage(pages, min_lat, max_lat, min_lon, max_lon, stats)
+        if min_timestamp is not None or max_timestamp is not None:
+            pages = filter_pipeline.time_stage(pages, min_timestamp, max_timestamp, stats)
+        if keywords is not None:
+            if not isinstance(keywords, KeywordMatcher):
+                keywords = KeywordMatcher(keywords)
+            pages = filter_pipeline.keyword_stage(pages, keywords, stats)
+
+        return pages
+
+    def partition_data_parallel(self, num_segments, polygon_index, out_data_set_ids,
+                                min_timestamp = None, max_timestamp = None,
+                                data_type = None, keywords = None):
+        '''
+        Performs a parallel partitioning operation. @see _partition_data
 
-        # Notify the reducer, nothing complicated to send, just tell it we are done filtering
-        self.result_queue.post_result({'set_id' : out_data_set_id})
+        @param num_segments # of segments to split the global data scan into
+        @paramType int
+        @returns n/a
+        '''
+        if keywords is not None: # Compile the keywords once for all of the segments
+            keywords = KeywordMatcher(keywords)
+
+        kwargs = {
+            'num_segments' : num_segments,
+            'polygon_index' : polygon_index,
+            'out_data_set_ids' : out_data_set_ids,
+            'min_timestamp' : min_timestamp,
+            'max_timestamp' : max_timestamp,
+            'data_type' : data_type,
+            'keywords' : keywords
+        }
+        stats = _merge_stats(self._run_segments(self._partition_segment, num_segments, kwargs))
+
+        # Notify the reducer that all of the partitions have been written
+        self.result_queue.post_result({'set_ids' : out_data_set_ids, 'stats' : stats})
+
+    def _partition_data(self, polygon_index, out_data_set_ids,
+                              min_timestamp = None, max_timestamp = None,
+                              data_type = None, keywords = None,
+                              segment_id = 0, num_segments = 1):
+        '''
+        Splits the global data inside the indexed polygons into one data set per polygon using a
+        single scan of the global data.
+
+        @param polygon_index Index of the polygons to partition the data by
+        @paramType PolygonIndex
+        @param out_data_set_ids Tracking id of the output data set for each polygon key
+        @paramType dictionary of polygon key to string/uuid
+        @param min_timestamp Restricts data to those newer than the provided timestamp
+        @paramType datetime
+        @param max_timestamp Restricts data to those older than the provided timestamp
+        @paramType datetime
+        @param data_type Restricts data to a particular data type, i.e. twitter data
+        @paramType string
+        @param keywords Restricts data to those with content containing one or more of the provided keywords
+        @paramType list of string or KeywordMatcher
+        @returns n/a
+        '''
+        stats = self._partition_segment(
+            polygon_index, out_data_set_ids, min_timestamp = min_timestamp, max_timestamp = max_timestamp,
+            data_type = data_type, keywords = keywords, segment_id = segment_id, num_segments = num_segments
+        )
+
+        # Notify the reducer that all of the partitions have been written
+        self.result_queue.post_result({'set_ids' : out_data_set_ids, 'stats' : stats})
+
+    def _partition_segment(self, polygon_index, out_data_set_ids,
+                                 min_timestamp = None, max_timestamp = None,
+                                 data_type = None, keywords = None,
+                                 segment_id = 0, num_segments = 1, writer = None):
+        '''
+        Partitions one segment of the global data into the polygons' data sets. @see _partition_data
+
+        @param writer Interface the output batches are written through; If None, the data factory
+        @paramType DataFactory or ScanWriteDriver
+        @returns Counters of how many data points made it through each stage
+        @returnType dictionary of stage name to int
+        '''
+        assert polygon_index is not None
+        assert out_data_set_ids is not None
+        writer = writer if writer is not None else self.data_factory
+
+        # Retrieve all of the data points inside the index's bounding box
+        bounding_box = polygon_index.get_bounding_box()
+        datas = self.data_factory.filter_global_data(
+            min_timestamp = min_timestamp, max_timestamp = max_timestamp,
+            min_lat = bounding_box['min_lat'], max_lat = bounding_box['max_lat'],
+            min_lon = bounding_box['min_lon'], max_lon = bounding_box['max_lon'],
+            type=data_type, segment_id = segment_id, num_segments = num_segments
+        )
+
+        stats = {}
+        pages = self._filter_pages(datas, stats, min_timestamp = min_timestamp, max_timestamp = max_timestamp,
+                                   keywords = keywords)
+
+        # Commit each page of data points to the data sets of the polygons containing them
+        stats['written'] = 0
+        for batch in filter_pipeline.rebatch(pages, self.batch_copy_size):
+            partitions = {}
+            for (data, polygon_keys) in zip(batch, polygon_index.assign(batch)):
+                for polygon_key in polygon_keys: # Add the data point to each polygon containing it
+                    partitions.setdefault(polygon_key, []).append(data)
+
+            for (polygon_key, partition) in partitions.iteritems():
+                writer.copy_data(out_data_set_ids[polygon_key], partition)
+                stats['written'] += len(partition)
+
+        logger.debug("Partitioned segment %s/%s: %s", segment_id, num_segments, stats)
+
+        return stats
+
+    def _run_segments(self, segment_function, num_segments, kwargs, is_writing = True):
+        '''
+        Runs each segment of a parallel job, either in its own thread, on a ScanWriteDriver if the
+        job writes and worker.max_concurrent_writes is set so the scans never wait on the writes,
+        or, if worker.num_processes is set, in a pool of forked processes so the CPU bound work is
+        not serialized by the GIL.
+
+        @param segment_function Processes a single segment and returns its result
+        @paramType function(segment_id, **kwargs)
+        @param num_segments # of segments to split the job into
+        @paramType int
+        @param kwargs Arguments shared by every segment
+        @paramType dictionary
+        @param is_writing Whether or not the segment function writes batches through a writer argument
+        @paramType boolean
+        @returns Result of the segment function for each segment
+        @returnType list
+        '''
+        if self.num_processes > 0:
+            results = _run_segments_in_processes(
+                self, segment_function, range(num_segments), kwargs, self.num_processes
+            )
+        elif self.max_concurrent_writes > 0 and is_writing:
+            driver = ScanWriteDriver(
+                self.data_factory, max_scans = self.max_concurrent_scans or num_segments,
+                max_writes = self.max_concurrent_writes
+            )
+            results = driver.run(segment_function, range(num_segments), dict(kwargs, writer = driver))
+        else:
+            results = _run_segments_in_threads(segment_function, range(num_segments), kwargs)
+
+        return results
+
+def _get_timestamp(task, key):
+    '''
+    @returns The task's timestamp, sent as seconds since the epoch, or None if it isn't set
+    @returnType time.struct_time
+    '''
+    return gmtime(task[key]) if task.get(key) is not None else None
+
+def _merge_stats(segment_stats):
+    '''
+    @param segment_stats Stage counters of each segment of a job
+    @paramType list of dictionaries
+    @returns Stage counters summed over all of the segments
+    @returnType dictionary of stage name to int
+    '''
+    stats = {}
+    for segment_stat in segment_stats: # Merge the counters of all the segments
+        for (name, count) in segment_stat.iteritems():
+            stats[name] = stats.get(name, 0) + count
+
+    return stats
+
+def _run_segments_in_threads(segment_function, segment_ids, kwargs):
+    '''
+    Runs each of the segments in its own thread. @see Worker._run_segments
+
+    @returns Result of each segment
+    @returnType list
+    '''
+    results = [None] * len(segment_ids)
+    errors = []
+
+    def run_segment(iter):
+        try:
+            results[iter] = segment_function(segment_id = segment_ids[iter], **kwargs)
+        except Exception as error:
+            logger.exception()
+            errors.append(error)
+
+    threads = []
+    for iter in range(len(segment_ids)): # For each segment, spin up a thread
+        thread = Thread(target=run_segment, args=(iter,))
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join() # Wait for the segment threads to finish before returning
+
+    if len(errors) > 0: # If any of the segments failed, fail the whole job
+        raise errors[0]
+
+    return results
+
+# Job run by the forked segment processes as (worker, segment function, kwargs). It is set before
+# the process pool is forked so the children inherit it, polygons and keyword matchers included,
+# instead of having it pickled to them.
+_process_job      = None
+_process_job_lock = Lock()
+
+def _run_segments_in_processes(worker, segment_function, segment_ids, kwargs, num_processes):
+    '''
+    Runs the segments in a pool of forked processes. @see Worker._run_segments
+
+    @returns Result of each segment
+    @returnType list
+    '''
+    global _process_job
+
+    with _process_job_lock: # Only one process job at a time may be shared through the global
+        _process_job = (worker, segment_function, kwargs)
+        try:
+            pool = Pool(min(num_processes, len(segment_ids)), initializer=_init_segment_process)
+            try:
+                return pool.map(_run_segment_process, segment_ids, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            _process_job = None
+
+def _init_segment_process():
+    ''' Prepares a freshly forked segment process. '''
+    worker = _process_job[0]
+    worker.data_factory.reconnect() # Never share the parent's database connections
+
+def _run_segment_process(segment_id):
+    ''' @returns Result of the provided segment of the current process job '''
+    worker, segment_function, kwargs = _process_job
+
+    return segment_function(segment_id = segment_id, **kwargs)
@@ -1,28 +1,199 @@
 ''' Data model and factory implementations that are backed by Amazon Web Service's DynamoDB2 NoSQL database '''
 
+import calendar
+
+from boto.dynamodb2.items import Item
 from boto.dynamodb2.table import Table
-from time import strftime, strptime
+from boto.dynamodb2.types import Dynamizer, FILTER_OPERATORS
+from threading import Lock
+from time import gmtime, strftime, strptime, struct_time
+from uuid import uuid4
 
 from smcity.misc.errors import CreateError, ReadError
 from smcity.misc.logger import Logger
+from smcity.models.aws import geo_index
+from smcity.models.aws.batch_writer import BatchWriter, encode_put_request, write_batches
+from smcity.models.aws.capacity import get_capacity_governor, governed_call
+from smcity.models.aws.partitions import PartitionedTable
 from smcity.models.data import Data, DataFactory
 
 logger = Logger(__name__)
 
+# Format of the normalized timestamps stored in the tables
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Prefix of the datum ids of virtual set records listing their set's members, sorts after any real datum id
+MEMBERS_PREFIX = '~members '
+
+# Most datum ids listed by a single virtual set record, keeps the records well under DynamoDB's item size limit
+MAX_MEMBERS = 1000
+
+# Decodes the attribute types decode_value() has no shortcut for
+_dynamizer = Dynamizer()
+
+# (year, month, day of month, weekday, day of year) of recently seen days, keyed by their 'YYYY-MM-DD'
+_days = {}
+
+def get_global_partitions(config, connection=None):
+    '''
+    @param config Configuration settings, @see AwsDataFactory
+    @paramType ConfigParser
+    @param connection DynamoDB2 connection; If None, boto's default connection is used
+    @paramType boto.dynamodb2.layer1.DynamoDBConnection
+    @returns The partitions of the global data, or None if the global data isn't partitioned
+    @returnType PartitionedTable
+    '''
+    if not config.has_option('database', 'partition_period'):
+        return None
+
+    throughput = {'read' : 5, 'write' : 5}
+    if config.has_option('database', 'partition_read_capacity'):
+        throughput['read'] = config.getint('database', 'partition_read_capacity')
+    if config.has_option('database', 'partition_write_capacity'):
+        throughput['write'] = config.getint('database', 'partition_write_capacity')
+
+    return PartitionedTable(
+        config.get('database', 'global_data_table'), config.get('database', 'partition_period'),
+        connection=connection, throughput=throughput
+    )
+
+def parse_timestamp(timestamp_norm):
+    '''
+    Parses a normalized timestamp. Equivalent to strptime(timestamp_norm, TIMESTAMP_FORMAT), but the
+    date part is only parsed once per day.
+
+    @param timestamp_norm Normalized timestamp, i.e. '2014-01-02 01:02:03'
+    @paramType string
+    @returns The timestamp
+    @returnType time.struct_time
+    '''
+    if len(timestamp_norm) != 19: # If this isn't the usual format
+        return strptime(timestamp_norm, TIMESTAMP_FORMAT)
+
+    day = _days.get(timestamp_norm[:10])
+    if day is None:
+        if len(_days) > 1000: # Keep the cache from piling up over long scans
+            _days.clear()
+        day_start = strptime(timestamp_norm[:10], '%Y-%m-%d')
+        day = _days[timestamp_norm[:10]] = day_start[:3] + day_start[6:8]
+
+    year, month, day_of_month, weekday, day_of_year = day
+    return struct_time((
+        year, month, day_of_month, int(timestamp_norm[11:13]), int(timestamp_norm[14:16]),
+        int(timestamp_norm[17:19]), weekday, day_of_year, -1 # strptime leaves the DST flag unknown
+    ))
+
+def decode_value(value):
+    '''
+    Decodes a raw DynamoDB attribute, decoding numbers as ints where possible instead of Decimals.
+
+    @param value Attribute as returned by DynamoDB, i.e. {'N' : '123'}
+    @paramType dictionary
+    @returns The attribute's value
+    @returnType string, int, float, etc.
+    '''
+    if 'S' in value:
+        return value['S']
+    if 'N' in value:
+        try:
+            return int(value['N'])
+        except ValueError:
+            return float(value['N'])
+
+    return _dynamizer.decode(value)
+
+class RawRecord(object):
+    '''
+    Read only view of a record straight from a raw DynamoDB response, skipping the construction of a
+    boto Item. Fields are decoded as they are read, @see decode_value, and the raw attributes can be
+    written back out as they are.
+    '''
+    __slots__ = ('raw_item',)
+
+    def __init__(self, raw_item):
+        '''
+        Constructor.
+
+        @param raw_item Attributes of the record as returned by DynamoDB, i.e. {'lat' : {'N' : '123'}}
+        @paramType dictionary
+        @returns n/a
+        '''
+        self.raw_item = raw_item
+
+    def __getitem__(self, key):
+        return decode_value(self.raw_item[key])
+
+    def __contains__(self, key):
+        return key in self.raw_item
+
+    def get(self, key, default=None):
+        if key not in self.raw_item:
+            return default
+        return decode_value(self.raw_item[key])
+
+def scan_pages(table, exclusive_start_key=None, attributes=None, segment=None, total_segments=None,
+               governor=None, **filter_kwargs):
+    '''
+    Scans the table page by page, without decoding the records.
+
+    @param table Table to scan
+    @paramType boto.dynamodb2.table.Table
+    @param exclusive_start_key Raw key of the record to resume the scan after, or None to start from the beginning
+    @paramType dictionary
+    @param attributes Names of the attributes to fetch, or None for all of them
+    @paramType list of string
+    @param governor Governor pacing the page reads, or None to read them right away
+    @paramType CapacityGovernor
+    @param filter_kwargs Scan filters, as taken by Table.scan()
+    @returns (raw records, raw key to resume the scan after or None if it's done) of each page
+    @returnType generator of (list of dictionaries, dictionary)
+    '''
+    kwargs = {
+        'segment' : segment,
+        'total_segments' : total_segments,
+        'attributes_to_get' : attributes,
+        'scan_filter' : table._build_filters(filter_kwargs, using=FILTER_OPERATORS)
+    }
+    if exclusive_start_key is not None:
+        kwargs['exclusive_start_key'] = exclusive_start_key
+
+    while True:
+        page = governed_call(governor, 'read', 1, table.connection.scan, table.table_name, **kwargs)
+        last_key = page.get('LastEvaluatedKey') or None
+        yield (page.get('Items', []), last_key)
+
+        if last_key is None: # If that was the last page
+            return
+        kwargs['exclusive_start_key'] = last_key
+
+def scan_records(table, **kwargs):
+    '''
+    Scans the table page by page, wrapping each page's raw records directly. @see RawRecord, scan_pages
+
+    @returns Matching records
+    @returnType generator of RawRecord
+    '''
+    for (raw_items, last_key) in scan_pages(table, **kwargs):
+        for raw_item in raw_items:
+            yield RawRecord(raw_item)
+
 class AwsData(Data):
-    ''' AWS specific implementation of the Data model. '''
+    ''' AWS specific implementation of the Data model. The location and timestamp are decoded once, on demand. '''
+    __slots__ = ('record', 'location', 'timestamp')
 
     def __init__(self, record):
         '''
         Constructor.
 
         @param record Database record corresponding to this peice of Data.
-        @paramType dictionary(dynamodb2.Item)
+        @paramType dictionary(dynamodb2.Item) or RawRecord
         @returns n/a
         '''
         assert record is not None
 
-        self.record = record
+        self.record    = record
+        self.location  = None
+        self.timestamp = None
 
     def get_content(self):
         ''' {@inheritDocs} '''
@@ -34,10 +205,10 @@ class AwsData(Data):
 
     def get_location(self):
         ''' {@inheritDocs} '''
-        lat = float(self.record['lat']) / 10000000
-        lon = float(self.record['lon']) / 10000000
+        if self.location is None:
+            self.location = (float(self.record['lon']) / 10000000, float(self.record['lat']) / 10000000)
 
-        return (lon, lat)
+        return self.location
 
     def get_set_id(self):
         ''' {@inheritDocs} '''
@@ -45,7 +216,10 @@ class AwsData(Data):
 
     def get_timestamp(self):
         ''' {@inheritDocs} '''
-        return strptime(self.record['timestamp'], '%Y-%m-%d %H:%M:%S')
+        if self.timestamp is None:
+            self.timestamp = parse_timestamp(self.record['timestamp'])
+
+        return self.timestamp
 
     def get_type(self):
         ''' {@inheritDocs} '''
@@ -53,7 +227,7 @@ class AwsData(Data):
 
 class AwsDataFactory(DataFactory):
 
-    def __init__(self, config):
+    def __init__(self, config, role='filter', connection=None):
         '''
         Constructor.
 
@@ -63,11 +237,103 @@ class AwsDataFactory(DataFactory):
         Key:     data_table
         Type:    string
         Desc:    Name of the Data model table
+
+        Section: database
+        Key:     geo_index_table
+        Type:    string
+        Desc:    Name of the geo index table global data is also written to, @see geo_index
+                 (Optional, if not set global data is only ever scanned)
+
+        Section: database
+        Key:     geo_index_precision
+        Type:    int
+        Desc:    # of geohash characters in the geo index partition keys (Optional, default 4)
+
+        Section: database
+        Key:     geo_index_max_queries
+        Type:    int
+        Desc:    Maximum # of geo index partitions a filter queries before it scans the global
+                 data instead (Optional, default 256)
+
+        Section: database
+        Key:     write_batch_size
+        Type:    int
+        Desc:    # of created global data records buffered before they are batch written; If 0,
+                 each record is written as it is created (Optional, default 0, at most 25)
+
+        Section: database
+        Key:     write_flush_interval
+        Type:    float
+        Desc:    Maximum # of seconds a created global data record is buffered (Optional, default 1)
+
+        Section: database
+        Key:     virtual_sets
+        Type:    boolean
+        Desc:    If true, copy_data() stores only the datum ids of the copied global data records,
+                 up to MAX_MEMBERS per set table record, and get_data_set() looks the records up in the
+                 global data (Optional, default false)
+
+        Section: database
+        Key:     copy_writers
+        Type:    int
+        Desc:    Maximum # of batch writes a copy_data() call runs concurrently (Optional, default 4)
+
+        Section: database
+        Key:     partition_period
+        Type:    'day' or 'hour'
+        Desc:    If set, global data is stored in a table per period of time named after the global
+                 data table, @see partitions, instead of in the global data table itself (Optional)
+
+        Section: database
+        Key:     partition_read_capacity
+        Type:    int
+        Desc:    Provisioned read capacity of newly created partitions (Optional, default 5)
+
+        Section: database
+        Key:     partition_write_capacity
+        Type:    int
+        Desc:    Provisioned write capacity of newly created partitions (Optional, default 5)
+
+        The capacity budget of the role is read from the capacity section, @see capacity.
         @paramType ConfigParser
+        @param role Role of the process, its scans, puts and batch writes are paced to the role's
+        capacity budget
+        @paramType string
+        @param connection DynamoDB2 connection; If None, boto's default connection is used
+        @paramType boto.dynamodb2.layer1.DynamoDBConnection
         @returns n/a
         '''
-        self.global_table = Table(config.get('database', 'global_data_table'))
-        self.set_table = Table(config.get('database', 'set_data_table'))
+        self.connection = connection
+        self.global_table = Table(config.get('database', 'global_data_table'), connection=connection)
+        self.set_table = Table(config.get('database', 'set_data_table'), connection=connection)
+        self.global_partitions = get_global_partitions(config, connection)
+        self.governor = get_capacity_governor(config, role)
+
+        self.geo_index_table       = None
+        self.geo_index_precision   = 4
+        self.geo_index_max_queries = 256
+        if config.has_option('database', 'geo_index_table'):
+            self.geo_index_table = Table(config.get('database', 'geo_index_table'), connection=connection)
+        if config.has_option('database', 'geo_index_precision'):
+            self.geo_index_precision = config.getint('database', 'geo_index_precision')
+        if config.has_option('database', 'geo_index_max_queries'):
+            self.geo_index_max_queries = config.getint('database', 'geo_index_max_queries')
+
+        self.write_batch_size     = 0
+        self.write_flush_interval = 1.0
+        if config.has_option('database', 'write_batch_size'):
+            self.write_batch_size = config.getint('database', 'write_batch_size')
+        if config.has_option('database', 'write_flush_interval'):
+            self.write_flush_interval = config.getfloat('database', 'write_flush_interval')
+        self.writers      = {} # Table name => BatchWriter buffering the global data writes
+        self.writers_lock = Lock()
+
+        self.virtual_sets = False
+        self.copy_writers = 4
+        if config.has_option('database', 'virtual_sets'):
+            self.virtual_sets = config.getboolean('database', 'virtual_sets')
+        if config.has_option('database', 'copy_writers'):
+            self.copy_writers = config.getint('database', 'copy_writers')
 
     def create_data(self, content, datum_id, location, set_id, timestamp, type):
         ''' {@inheritDocs} '''
@@ -98,34 +364,137 @@ class AwsDataFactory(DataFactory):
             'type' : type
         }
 
-        result = False 
         if set_id == 'global': # If this is a global data point
-            result = self.global_table.put_item(data=data)
-        else: # If this is a set data point
-            result = self.set_table.put_item(data=data)
+            self._put_global_item(self._get_global_table(timestamp), data)
+        else:
+            self._put_item(self.set_table, data)
+
+        if set_id == 'global' and self.geo_index_table is not None: # Keep the geo index up to date
+            data['cell'] = geo_index.get_partition_key(
+                location[0], location[1], timestamp_norm, self.geo_index_precision
+            )
+            data['time_key'] = geo_index.get_sort_key(timestamp_norm, datum_id)
+            self._put_global_item(self.geo_index_table, data)
+
+    def _get_global_table(self, timestamp):
+        '''
+        @param timestamp When the global data was created
+        @paramType time.struct_time
+        @returns Table holding the global data created at the timestamp
+        @returnType boto.dynamodb2.table.Table
+        '''
+        if self.global_partitions is None:
+            return self.global_table
+
+        return self.global_partitions.get_table(calendar.timegm(timestamp))
 
-        # If we failed to create the database record
-        if result is False:
-            raise CreateError("Failed to create the Data(" + str(data) + ")!")
+    def _put_global_item(self, table, data):
+        '''
+        Writes a global data record, through the table's BatchWriter if writes are buffered.
+
+        @param table Table the record belongs in
+        @paramType boto.dynamodb2.table.Table
+        @param data Fields of the record
+        @paramType dictionary
+        @returns n/a
+        '''
+        if self.write_batch_size == 0: # If every record is written as it is created
+            self._put_item(table, data)
+            return
+
+        with self.writers_lock:
+            if table.table_name not in self.writers:
+                self.writers[table.table_name] = BatchWriter(
+                    table, batch_size=self.write_batch_size, flush_interval=self.write_flush_interval,
+                    governor=self.governor
+                )
+            writer = self.writers[table.table_name]
+
+        writer.put_item(data)
+
+    def _put_item(self, table, data):
+        '''
+        Writes a single record, paced by the governor. Like Table.put_item, an existing record with the
+        same key is never overwritten.
+
+        @param table Table the record belongs in
+        @paramType boto.dynamodb2.table.Table
+        @param data Fields of the record
+        @paramType dictionary
+        @returns n/a
+        '''
+        if self.governor is None:
+            if table.put_item(data=data) is False: # If we failed to create the record
+                raise CreateError("Failed to create the Data(" + str(data) + ")!")
+            return
+
+        item = Item(table, data=data)
+        governed_call(
+            self.governor, 'write', 1, table.connection.put_item,
+            table.table_name, item.prepare_full(), expected=item.build_expects()
+        )
         
     def copy_data(self, set_id, datas):
         ''' {@inheritDocs} '''
         assert set_id is not None
 
-        with self.set_table.batch_write() as batch:
-            for data in datas:
-                batch.put_item(data = {
-                    'content' : data.get_content(), 
-                    'datum_id' : data.get_datum_id(),
-                    'lat' : data.record['lat'],
-                    'lat_copy' : data.record['lat_copy'],
-                    'lon' : data.record['lon'],
-                    'lon_copy' : data.record['lon_copy'],
+        if self.virtual_sets: # Only record which global data records belong to the set
+            self._copy_members(set_id, datas)
+            return
+
+        requests = []
+        for data in datas:
+            if isinstance(data.record, RawRecord): # Write the scanned attributes back out as they are
+                item = dict(data.record.raw_item)
+                item['set_id'] = {'S' : set_id}
+                requests.append({'PutRequest' : {'Item' : item}})
+                continue
+
+            requests.append(encode_put_request({
+                'content' : data.get_content(),
+                'datum_id' : data.get_datum_id(),
+                'lat' : data.record['lat'],
+                'lat_copy' : data.record['lat_copy'],
+                'lon' : data.record['lon'],
+                'lon_copy' : data.record['lon_copy'],
+                'set_id' : set_id,
+                'timestamp' : data.record['timestamp'],
+                'timestamp_copy' : data.record['timestamp_copy'],
+                'type' : data.record['type']
+            }))
+
+        write_batches(self.set_table, requests, self.copy_writers, governor=self.governor)
+
+    def _copy_members(self, set_id, datas):
+        '''
+        Adds the datum ids of the global data records to the virtual set. The ids are grouped by the
+        partition holding their records, if the global data is partitioned.
+
+        @param set_id Tracking id of the set
+        @paramType string/uuid
+        @param datas Global data records to add to the set
+        @paramType list of Data
+        @returns n/a
+        '''
+        partitions = {} # Start of the partition holding the records, or None => datum ids
+        for data in datas:
+            partition = None
+            if self.global_partitions is not None:
+                partition = self.global_partitions.get_start(calendar.timegm(data.get_timestamp()))
+            partitions.setdefault(partition, set()).add(data.get_datum_id())
+
+        requests = []
+        for (partition, datum_ids) in partitions.iteritems():
+            datum_ids = sorted(datum_ids)
+            for start in range(0, len(datum_ids), MAX_MEMBERS):
+                requests.append(encode_put_request({
                     'set_id' : set_id,
-                    'timestamp' : data.record['timestamp'],
-                    'timestamp_copy' : data.record['timestamp_copy'],
-                    'type' : data.record['type']
-                })
+                    'datum_id' : MEMBERS_PREFIX + uuid4().hex,
+                    'members' : set(datum_ids[start:start + MAX_MEMBERS]),
+                    'partition' : partition
+                }))
+
+        write_batches(self.set_table, requests, self.copy_writers, governor=self.governor)
 
     def filter_global_data(self, min_timestamp=None, max_timestamp=None,
                                  min_lat=None, max_lat=None,
@@ -134,6 +503,18 @@ class AwsDataFactory(DataFactory):
                                  type=None
                                  ):
         ''' {@inheritDocs} '''
+        if self.geo_index_table is not None and min_timestamp is not None and \
+                None not in (min_lat, max_lat, min_lon, max_lon): # If the geo index may be queried
+            queries = geo_index.plan_queries(
+                min_lat, max_lat, min_lon, max_lon, min_timestamp,
+                max_timestamp if max_timestamp is not None else gmtime(),
+                self.geo_index_precision, self.geo_index_max_queries
+            )
+            if queries is not None: # If the window is small enough to beat a scan
+                return AwsDataIterator(self._query_geo_index(
+                    queries[segment_id::num_segments], min_lat, max_lat, min_lon, max_lon, type
+                ))
+
         kwargs = {}
         if min_timestamp is not None:
             kwargs['timestamp__gte'] = strftime('%Y-%m-%d %H:%M:%S', min_timestamp)
@@ -155,11 +536,94 @@ class AwsDataFactory(DataFactory):
 
         logger.debug("Scan Args: %s", kwargs)
 
-        return AwsDataIterator(self.global_table.scan(**kwargs))
+        if self.global_partitions is None:
+            return AwsDataIterator(scan_records(self.global_table, governor=self.governor, **kwargs))
 
-    def get_data_set(self, set_id):
+        # Only scan the partitions overlapping the time window
+        tables = self.global_partitions.get_tables(
+            calendar.timegm(min_timestamp) if min_timestamp is not None else None,
+            calendar.timegm(max_timestamp) if max_timestamp is not None else None
+        )
+        return AwsDataIterator(
+            record for table in tables for record in scan_records(table, governor=self.governor, **kwargs)
+        )
+
+    def _query_geo_index(self, queries, min_lat, max_lat, min_lon, max_lon, type):
+        '''
+        Runs the geo index queries one after another. @see geo_index.plan_queries
+
+        @returns Raw records matching the filter
+        @returnType generator of boto.dynamodb2.Item
+        '''
+        query_filter = {
+            'lat__between' : (int(min_lat * 10000000), int(max_lat * 10000000)),
+            'lon__between' : (int(min_lon * 10000000), int(max_lon * 10000000))
+        }
+        if type is not None:
+            query_filter['type__eq'] = type
+
+        for (partition_key, min_sort_key, max_sort_key) in queries:
+            logger.debug("Geo Index Query: %s %s - %s", partition_key, min_sort_key, max_sort_key)
+            for record in self.geo_index_table.query_2(
+                cell__eq=partition_key, time_key__between=(min_sort_key, max_sort_key),
+                query_filter=query_filter
+            ):
+                yield record
+
+    def get_data_set(self, set_id, segment_id=0, num_segments=1):
+        ''' {@inheritDocs} '''
+        if num_segments == 1:
+            return AwsDataIterator(self._resolve_members(self.set_table.query(set_id__eq=set_id)))
+
+        # Queries cannot be split into segments, so fall back on a parallel scan of the set table
+        return AwsDataIterator(self._resolve_members(scan_records(
+            self.set_table, set_id__eq=set_id, segment=segment_id, total_segments=num_segments,
+            governor=self.governor
+        )))
+
+    def _resolve_members(self, records):
+        '''
+        Replaces the member lists of virtual sets with the global data records they list. Members
+        the janitor has since deleted from the global data are skipped.
+
+        @param records Records of a set
+        @paramType iterator of boto.dynamodb2.Item or RawRecord
+        @returns The set's data records
+        @returnType generator of boto.dynamodb2.Item or RawRecord
+        '''
+        for record in records:
+            members = record.get('members')
+            if members is None: # If this is a copied data record
+                yield record
+                continue
+
+            table = self.global_table
+            if record.get('partition') is not None: # If the members are in a partition of the global data
+                table = self.global_partitions.get_table(record['partition'])
+
+            for member in table.batch_get(keys=[{'datum_id' : datum_id} for datum_id in sorted(members)]):
+                yield member
+
+    def reconnect(self):
         ''' {@inheritDocs} '''
-        return AwsDataIterator(self.set_table.query(set_id__eq=set_id))
+        self.writers = {} # The buffers belong to the parent process
+        self.global_table = Table(self.global_table.table_name, connection=self.connection)
+        if self.global_partitions is not None:
+            self.global_partitions = PartitionedTable(
+                self.global_partitions.base_name, self.global_partitions.period,
+                connection=self.connection, throughput=self.global_partitions.throughput
+            )
+        self.set_table = Table(self.set_table.table_name, connection=self.connection)
+        if self.geo_index_table is not None:
+            self.geo_index_table = Table(self.geo_index_table.table_name, connection=self.connection)
+
+    def shutdown(self):
+        ''' {@inheritDocs} '''
+        with self.writers_lock:
+            writers, self.writers = self.writers.values(), {}
+
+        for writer in writers:
+            writer.shutdown()
 
 class AwsDataIterator():
     ''' AWS specific implementation of the Data result set iterator. '''
@@ -168,8 +632,8 @@ class AwsDataIterator():
         '''
         Constructor.
 
-        @param result_set DynamoDB2 ResultSet to wrap.
-        @param boto.dynamodb2.ResultSet
+        @param result_set DynamoDB2 ResultSet, or the records of scan_records(), to wrap.
+        @param boto.dynamodb2.ResultSet or generator of RawRecord
         @returns n/a
         '''
         assert result_set is not None, "result_set must not be None!"
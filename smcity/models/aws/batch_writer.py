@@ -0,0 +1,224 @@
+''' Buffered writer that groups DynamoDB2 puts into batch writes. '''
+
+import time
+
+from boto.dynamodb.types import Dynamizer
+from Queue import Empty, Queue
+from threading import Event, Lock, Thread
+
+from smcity.misc.errors import CreateError
+from smcity.misc.logger import Logger
+from smcity.models.aws.capacity import governed_call
+
+logger = Logger(__name__)
+
+# Most put requests DynamoDB accepts in a single batch write
+MAX_BATCH_SIZE = 25
+
+_dynamizer = Dynamizer()
+
+def encode_put_request(data):
+    '''
+    @param data Fields of the record
+    @paramType dictionary
+    @returns The record's fields encoded as a DynamoDB put request
+    @returnType dictionary
+    '''
+    item = {}
+    for (key, value) in data.iteritems():
+        if value is None or value == '': # DynamoDB does not store empty values
+            continue
+        item[key] = _dynamizer.encode(value)
+
+    return {'PutRequest' : {'Item' : item}}
+
+class BatchWriter:
+    '''
+    Buffers records bound for a table and writes them with batch_write_item once batch_size of them
+    are waiting or the oldest has waited flush_interval seconds. Records DynamoDB leaves unprocessed,
+    i.e. when the table is throttled, are resent with exponential backoff.
+    '''
+
+    def __init__(self, table, batch_size=MAX_BATCH_SIZE, flush_interval=1.0,
+                       max_retries=8, min_backoff=0.05, max_backoff=5.0, governor=None):
+        '''
+        Constructor.
+
+        @param table Table the records are written to
+        @paramType boto.dynamodb2.table.Table
+        @param batch_size # of buffered records that triggers a flush
+        @paramType int
+        @param flush_interval Maximum # of seconds a record is buffered; If None, only batch_size and
+        flush() trigger a flush
+        @paramType float
+        @param max_retries # of times unprocessed records are resent before giving up on them
+        @paramType int
+        @param min_backoff # of seconds to wait before the first resend
+        @paramType float
+        @param max_backoff Maximum # of seconds to wait between resends
+        @paramType float
+        @param governor Governor pacing the batch writes, or None to write them right away
+        @paramType CapacityGovernor
+        @returns n/a
+        '''
+        assert table is not None
+        assert batch_size > 0, batch_size
+
+        self.table          = table
+        self.batch_size     = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries    = max_retries
+        self.min_backoff    = min_backoff
+        self.max_backoff    = max_backoff
+        self.governor       = governor
+
+        self.buffer         = []
+        self.buffered_since = None
+        self.error          = None
+        self.lock           = Lock() # Guards the buffer
+        self.write_lock     = Lock() # Keeps the flushes in order
+        self.stopped        = Event()
+
+        self.flusher = None
+        if flush_interval is not None: # Spin up the thread enforcing the time threshold
+            self.flusher = Thread(target=self._flush_periodically)
+            self.flusher.daemon = True
+            self.flusher.start()
+
+    def put_item(self, data):
+        '''
+        Buffers the record to be written.
+
+        @param data Fields of the record
+        @paramType dictionary
+        @returns n/a
+        '''
+        if self.error is not None: # If a background flush failed, let the producer know
+            error, self.error = self.error, None
+            raise error
+
+        with self.lock:
+            if len(self.buffer) == 0:
+                self.buffered_since = time.time()
+            self.buffer.append(encode_put_request(data))
+            is_full = len(self.buffer) >= self.batch_size
+
+        if is_full:
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes all of the buffered records.
+
+        @returns n/a
+        '''
+        with self.write_lock:
+            with self.lock:
+                requests, self.buffer = self.buffer, []
+                self.buffered_since = None
+
+            for start in range(0, len(requests), MAX_BATCH_SIZE):
+                write_batch(
+                    self.table, requests[start:start + MAX_BATCH_SIZE],
+                    self.max_retries, self.min_backoff, self.max_backoff, self.governor
+                )
+
+    def _flush_periodically(self):
+        ''' Flusher thread loop, flushes the buffer once its oldest record is flush_interval old. '''
+        while not self.stopped.wait(self.flush_interval / 4.0):
+            buffered_since = self.buffered_since
+            if buffered_since is None or time.time() - buffered_since < self.flush_interval:
+                continue
+
+            try:
+                self.flush()
+            except Exception as error:
+                logger.exception()
+                self.error = error
+
+    def shutdown(self):
+        '''
+        Stops the flusher thread and writes any remaining buffered records.
+
+        @returns n/a
+        '''
+        self.stopped.set()
+        if self.flusher is not None:
+            self.flusher.join()
+
+        self.flush()
+
+def write_batch(table, requests, max_retries=8, min_backoff=0.05, max_backoff=5.0, governor=None):
+    '''
+    Writes a single batch, resending any unprocessed records with exponential backoff. Unprocessed
+    records mean the table is throttling, which is reported to the governor.
+
+    @param table Table the records are written to
+    @paramType boto.dynamodb2.table.Table
+    @param requests Put requests of the batch, at most MAX_BATCH_SIZE
+    @paramType list of dictionaries
+    @param max_retries # of times unprocessed records are resent before giving up on them
+    @paramType int
+    @param min_backoff # of seconds to wait before the first resend
+    @paramType float
+    @param max_backoff Maximum # of seconds to wait between resends
+    @paramType float
+    @param governor Governor pacing the writes, or None to write them right away
+    @paramType CapacityGovernor
+    @returns n/a
+    '''
+    backoff = min_backoff
+    for attempt in range(max_retries + 1):
+        response = governed_call( # Each put or delete consumes at least a write capacity unit
+            governor, 'write', len(requests), table.connection.batch_write_item, {table.table_name : requests}
+        )
+        requests = response.get('UnprocessedItems', {}).get(table.table_name, [])
+        if len(requests) == 0:
+            return
+
+        if governor is not None:
+            governor.throttled('write')
+        logger.debug("%s unprocessed items, retrying in %ss", len(requests), backoff)
+        time.sleep(backoff)
+        backoff = min(backoff * 2, max_backoff)
+
+    raise CreateError("Failed to write %s records to %s!" % (len(requests), table.table_name))
+
+def write_batches(table, requests, num_writers=4, **kwargs):
+    '''
+    Packs the put requests into full batches and writes them, num_writers batches at a time.
+
+    @param table Table the records are written to
+    @paramType boto.dynamodb2.table.Table
+    @param requests Put requests to write
+    @paramType list of dictionaries
+    @param num_writers Maximum # of batches written concurrently
+    @paramType int
+    @param kwargs Retry and pacing settings, @see write_batch
+    @returns n/a
+    '''
+    batches = Queue()
+    for start in range(0, len(requests), MAX_BATCH_SIZE):
+        batches.put(requests[start:start + MAX_BATCH_SIZE])
+
+    errors = []
+    def write():
+        while len(errors) == 0: # Stop taking batches once any of them failed
+            try:
+                batch = batches.get_nowait()
+            except Empty:
+                return
+            try:
+                write_batch(table, batch, **kwargs)
+            except Exception as error:
+                errors.append(error)
+
+    writers = [Thread(target=write) for iter in range(min(num_writers, batches.qsize()) - 1)]
+    for writer in writers:
+        writer.start()
+    write() # The calling thread writes too, so a single batch needs no extra threads
+    for writer in writers:
+        writer.join()
+
+    if len(errors) > 0:
+        raise errors[0]
@@ -0,0 +1,258 @@
+'''
+Paces the DynamoDB requests of a process to the capacity budget of its role, so background jobs, i.e. the
+janitor and the filter jobs, cannot starve the live ingest of the tables' provisioned capacity.
+
+The requests ask DynamoDB for the capacity they consumed and pay it out of a token bucket refilled at the
+role's budget. Background roles also back off multiplicatively whenever the tables throttle and recover
+additively after, leaving the ingest whatever capacity it needs and running on what is left over.
+'''
+
+import time
+
+from boto.dynamodb2.exceptions import ProvisionedThroughputExceededException
+from threading import Lock
+
+from smcity.misc.logger import Logger
+
+logger = Logger(__name__)
+
+# Roles whose budgets are never cut back when the tables throttle
+PRIORITY_ROLES = ('ingest',)
+
+# Fraction of the budget a throttled background role is cut back to, at most once per BACKOFF_INTERVAL seconds
+BACKOFF_FACTOR = 0.5
+BACKOFF_INTERVAL = 1.0
+
+# Least fraction of the budget a background role is ever cut back to
+MIN_RATE_FRACTION = 0.05
+
+# # of seconds a background role takes to recover its full budget from the least one
+RECOVERY_SECONDS = 30.0
+
+def get_capacity_governor(config, role):
+    '''
+    @param config Configuration settings. Expected definition:
+
+    Section: capacity
+    Key:     <role>_read_capacity
+    Type:    float
+    Desc:    Read capacity units per second the role's requests may consume, within each process;
+             If 0, its reads are not paced (Optional, default 0)
+
+    Section: capacity
+    Key:     <role>_write_capacity
+    Type:    float
+    Desc:    Write capacity units per second the role's requests may consume, within each process;
+             If 0, its writes are not paced (Optional, default 0)
+    @paramType ConfigParser
+    @param role Role of the process, i.e. 'ingest', 'filter' or 'janitor'
+    @paramType string
+    @returns The role's governor, or None if the role has no capacity budget
+    @returnType CapacityGovernor
+    '''
+    read_capacity  = 0.0
+    write_capacity = 0.0
+    if config.has_option('capacity', role + '_read_capacity'):
+        read_capacity = config.getfloat('capacity', role + '_read_capacity')
+    if config.has_option('capacity', role + '_write_capacity'):
+        write_capacity = config.getfloat('capacity', role + '_write_capacity')
+
+    if read_capacity <= 0 and write_capacity <= 0:
+        return None
+
+    return CapacityGovernor(read_capacity, write_capacity, adaptive=role not in PRIORITY_ROLES)
+
+def get_consumed_capacity(response):
+    '''
+    @param response DynamoDB response of a request made with return_consumed_capacity='TOTAL'
+    @paramType dictionary
+    @returns # of capacity units the request consumed, or None if the response doesn't say
+    @returnType float
+    '''
+    consumed = response.get('ConsumedCapacity')
+    if consumed is None:
+        return None
+    if isinstance(consumed, dict): # Single table requests report a single entry
+        consumed = [consumed]
+
+    return sum(float(entry.get('CapacityUnits', 0)) for entry in consumed)
+
+def governed_call(governor, kind, estimate, method, *args, **kwargs):
+    '''
+    Makes a DynamoDB request, paced by the governor.
+
+    @param governor Governor pacing the request, or None to make it right away
+    @paramType CapacityGovernor
+    @param kind Kind of capacity the request consumes
+    @paramType 'read' or 'write'
+    @param estimate # of capacity units the request is expected to consume
+    @paramType float
+    @param method DynamoDB2 connection method making the request, i.e. connection.scan
+    @paramType function
+    @param args Arguments of the request
+    @param kwargs Keyword arguments of the request
+    @returns The request's response
+    @returnType dictionary
+    '''
+    if governor is None:
+        return method(*args, **kwargs)
+
+    bucket = governor.get_bucket(kind)
+    bucket.take(estimate)
+
+    kwargs['return_consumed_capacity'] = 'TOTAL'
+    try:
+        response = method(*args, **kwargs)
+    except ProvisionedThroughputExceededException:
+        governor.throttled(kind)
+        raise
+
+    consumed = get_consumed_capacity(response)
+    if consumed is not None: # Settle up the difference from the estimate
+        bucket.charge(consumed - estimate)
+
+    return response
+
+class TokenBucket:
+    '''
+    Holds up to burst capacity units, refilled at rate units per second. Requests take their estimated
+    cost up front and are charged the rest once their consumed capacity is known, so the balance may go
+    negative; The next request then waits for it to be paid back.
+    '''
+
+    def __init__(self, rate, burst=None, adaptive=False, clock=time.time, sleep=time.sleep):
+        '''
+        Constructor.
+
+        @param rate Capacity units per second; If 0, requests are never held up
+        @paramType float
+        @param burst Most capacity units saved up while idle; If None, a second's worth
+        @paramType float
+        @param adaptive If true, the rate is cut back when the table throttles, @see throttled
+        @paramType boolean
+        @param clock Returns the current time in seconds
+        @paramType function
+        @param sleep Waits the given # of seconds
+        @paramType function
+        @returns n/a
+        '''
+        assert rate >= 0, rate
+
+        self.budget       = rate
+        self.rate         = rate
+        self.burst        = burst if burst is not None else rate
+        self.adaptive     = adaptive
+        self.clock        = clock
+        self.sleep        = sleep
+        self.tokens       = self.burst
+        self.last_refill  = clock()
+        self.last_backoff = None
+        self.lock         = Lock()
+
+    def _refill(self):
+        ''' Adds the capacity accrued since the last refill, recovering the rate if it was cut back. '''
+        now = self.clock()
+        elapsed, self.last_refill = max(now - self.last_refill, 0), now
+
+        self.tokens = min(self.tokens + elapsed * self.rate, self.burst)
+        if self.rate < self.budget: # Additive increase
+            self.rate = min(self.rate + elapsed * self.budget / RECOVERY_SECONDS, self.budget)
+
+    def take(self, units):
+        '''
+        Waits until the balance is paid back, then takes the units.
+
+        @param units # of capacity units the request is expected to consume
+        @paramType float
+        @returns n/a
+        '''
+        if self.budget <= 0:
+            return
+
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= -1e-9: # Allow for the rounding of the refill
+                    self.tokens -= units
+                    return
+                wait = -self.tokens / self.rate
+
+            self.sleep(wait)
+
+    def charge(self, units):
+        '''
+        Takes the units without waiting, i.e. the capacity a request consumed beyond its estimate.
+
+        @param units # of capacity units; Negative to give back an overestimate
+        @paramType float
+        @returns n/a
+        '''
+        if self.budget <= 0:
+            return
+
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens - units, self.burst)
+
+    def throttled(self):
+        '''
+        Cuts the rate back, if the bucket is adaptive. Throttles reported by concurrent requests within
+        BACKOFF_INTERVAL seconds of each other only count once.
+
+        @returns n/a
+        '''
+        if self.budget <= 0 or not self.adaptive:
+            return
+
+        with self.lock:
+            self._refill()
+            now = self.clock()
+            if self.last_backoff is not None and now - self.last_backoff < BACKOFF_INTERVAL:
+                return
+
+            self.last_backoff = now
+            self.rate = max(self.rate * BACKOFF_FACTOR, self.budget * MIN_RATE_FRACTION)
+            logger.info("Throttled, backing off to %s capacity units per second", self.rate)
+
+class CapacityGovernor:
+    ''' Read and write token buckets pacing the requests of a process role. @see TokenBucket '''
+
+    def __init__(self, read_capacity, write_capacity, adaptive=True, clock=time.time, sleep=time.sleep):
+        '''
+        Constructor.
+
+        @param read_capacity Read capacity units per second; If 0, reads are not paced
+        @paramType float
+        @param write_capacity Write capacity units per second; If 0, writes are not paced
+        @paramType float
+        @param adaptive If true, the budgets are cut back when the tables throttle
+        @paramType boolean
+        @param clock Returns the current time in seconds
+        @paramType function
+        @param sleep Waits the given # of seconds
+        @paramType function
+        @returns n/a
+        '''
+        self.buckets = {
+            'read' : TokenBucket(read_capacity, adaptive=adaptive, clock=clock, sleep=sleep),
+            'write' : TokenBucket(write_capacity, adaptive=adaptive, clock=clock, sleep=sleep)
+        }
+
+    def get_bucket(self, kind):
+        '''
+        @param kind Kind of capacity
+        @paramType 'read' or 'write'
+        @returns The bucket pacing the kind of capacity
+        @returnType TokenBucket
+        '''
+        return self.buckets[kind]
+
+    def throttled(self, kind):
+        '''
+        Reports that a request was throttled, i.e. the table ran out of the kind of capacity.
+
+        @param kind Kind of capacity
+        @paramType 'read' or 'write'
+        @returns n/a
+        '''
+        self.buckets[kind].throttled()
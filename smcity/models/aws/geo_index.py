@@ -0,0 +1,75 @@
+'''
+Key layout of the geo index table, a copy of the global data keyed so spatial-temporal filters can
+be answered with Queries instead of Scans. Each record's partition key is the geohash of its
+location followed by the hour it was created, i.e. 'dph8 2014-01-02 01', and its sort key is its
+timestamp followed by its datum id, i.e. '2014-01-02 01:02:03 1234'.
+'''
+
+import calendar
+
+from time import gmtime, strftime
+
+from smcity.polygons import geohash
+
+# Format of the normalized timestamps stored in the tables
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Sorts after any datum id, closes off the sort key range of a query
+MAX_DATUM_ID = '~'
+
+def get_partition_key(lon, lat, timestamp_norm, precision):
+    '''
+    @param lon Longitude of the record
+    @paramType float
+    @param lat Latitude of the record
+    @paramType float
+    @param timestamp_norm Normalized timestamp of the record
+    @paramType string
+    @param precision # of characters in the geohash
+    @paramType int
+    @returns Partition key of the record
+    @returnType string
+    '''
+    return geohash.encode(lon, lat, precision) + ' ' + timestamp_norm[:13]
+
+def get_sort_key(timestamp_norm, datum_id):
+    '''
+    @returns Sort key of the record, unique within its partition
+    @returnType string
+    '''
+    return timestamp_norm + ' ' + datum_id
+
+def plan_queries(min_lat, max_lat, min_lon, max_lon, min_timestamp, max_timestamp, precision, max_queries):
+    '''
+    Decomposes the bounding box and time window into the partitions that may hold matching records.
+
+    @param min_timestamp Start of the time window
+    @paramType time.struct_time
+    @param max_timestamp End of the time window
+    @paramType time.struct_time
+    @param precision # of characters in the geohashes of the partition keys
+    @paramType int
+    @param max_queries Maximum # of partitions worth querying instead of just scanning the global data
+    @paramType int
+    @returns (partition key, min sort key, max sort key) of each query, or None if more than
+    max_queries would be needed
+    @returnType list of (string, string, string) tuples
+    '''
+    min_hour = calendar.timegm(min_timestamp) // 3600
+    max_hour = calendar.timegm(max_timestamp) // 3600
+    num_hours = max_hour - min_hour + 1
+    if num_hours < 1:
+        return []
+    if num_hours * geohash.count_cover(min_lat, max_lat, min_lon, max_lon, precision) > max_queries:
+        return None
+
+    min_sort_key = strftime(TIMESTAMP_FORMAT, min_timestamp)
+    max_sort_key = strftime(TIMESTAMP_FORMAT, max_timestamp) + ' ' + MAX_DATUM_ID
+
+    queries = []
+    for cell in geohash.cover(min_lat, max_lat, min_lon, max_lon, precision):
+        for hour in range(min_hour, max_hour + 1):
+            partition_key = cell + ' ' + strftime(TIMESTAMP_FORMAT, gmtime(hour * 3600))[:13]
+            queries.append((partition_key, min_sort_key, max_sort_key))
+
+    return queries
@@ -0,0 +1,246 @@
+''' Janitor that purges the global data records which have aged out. '''
+
+import json
+import os
+import time
+
+from boto.dynamodb2.table import Table
+from threading import Event, Lock, Thread
+
+from smcity.misc.logger import Logger
+from smcity.models.aws.aws_data import TIMESTAMP_FORMAT, get_global_partitions, scan_pages
+from smcity.models.aws.batch_writer import MAX_BATCH_SIZE, write_batch
+from smcity.models.aws.capacity import get_capacity_governor
+
+logger = Logger(__name__)
+
+# Checkpoint value of a segment that has been scanned to the end
+DONE = 'done'
+
+class GlobalDataJanitor:
+    '''
+    Deletes the global data records older than the maximum record age. The table is scanned in
+    parallel segments and the old records are deleted in batch writes. The position of each segment
+    is checkpointed after every page, so a janitor that is stopped part way resumes where it left off.
+
+    If the global data is partitioned by time, @see partitions, the expired partitions are dropped
+    whole instead and the upcoming ones are created ahead of the data arriving.
+    '''
+
+    def __init__(self, config, global_table=None, global_partitions=None, role='janitor'):
+        '''
+        Constructor.
+
+        @param config Configuration settings. Expected definition:
+
+        Section: database
+        Key:     global_data_table
+        Type:    string
+        Desc:    Name of the global data table
+
+        Section: janitor
+        Key:     max_record_age
+        Type:    int
+        Desc:    # of days global data records are kept
+
+        Section: janitor
+        Key:     num_segments
+        Type:    int
+        Desc:    # of segments the table is scanned in, each in its own thread (Optional, default 4)
+
+        Section: janitor
+        Key:     checkpoint_file
+        Type:    string
+        Desc:    File the position of each segment is saved to; If not set, every run starts over
+                 (Optional)
+
+        Section: janitor
+        Key:     partition_lookahead
+        Type:    int
+        Desc:    # of partitions past the current one kept created ahead of time; Must cover the
+                 time between janitor runs (Optional, default 2)
+
+        The global data partitioning settings are shared with the AwsDataFactory. The scans and deletes
+        are paced to the capacity budget of the role, i.e. capacity.janitor_write_capacity limits the
+        write capacity the deletes consume, @see capacity.
+        @paramType ConfigParser
+        @param global_table Table to clean up; If None, the configured global data table
+        @paramType boto.dynamodb2.table.Table
+        @param global_partitions Partitions of the global data to roll; If None, the configured ones
+        @paramType PartitionedTable
+        @param role Role of the process, its scans and deletes are paced to the role's capacity budget
+        @paramType string
+        @returns n/a
+        '''
+        self.global_partitions = global_partitions
+        if global_partitions is None:
+            self.global_partitions = get_global_partitions(config)
+
+        self.global_table = global_table
+        if global_table is None and self.global_partitions is None:
+            self.global_table = Table(config.get('database', 'global_data_table'))
+
+        self.max_record_age      = config.getint('janitor', 'max_record_age')
+        self.num_segments        = 4
+        self.checkpoint_file     = None
+        self.partition_lookahead = 2
+        if config.has_option('janitor', 'num_segments'):
+            self.num_segments = config.getint('janitor', 'num_segments')
+        if config.has_option('janitor', 'checkpoint_file'):
+            self.checkpoint_file = config.get('janitor', 'checkpoint_file')
+        if config.has_option('janitor', 'partition_lookahead'):
+            self.partition_lookahead = config.getint('janitor', 'partition_lookahead')
+        assert self.num_segments > 0, self.num_segments
+
+        self.governor = get_capacity_governor(config, role)
+
+        self.stopped     = Event()
+        self.lock        = Lock() # Guards the checkpoint and the count
+        self.checkpoint  = None
+        self.num_deleted = 0
+
+    def get_age_limit(self, now=None):
+        '''
+        @param now Current time in seconds since the epoch; If None, the system clock is used
+        @paramType float
+        @returns Normalized timestamp the records older than are deleted
+        @returnType string
+        '''
+        now = time.time() if now is None else now
+        return time.strftime(TIMESTAMP_FORMAT, time.gmtime(now - self.max_record_age * 86400))
+
+    def run(self, now=None):
+        '''
+        Deletes the old records, returning once every segment has been scanned or shutdown() is called.
+
+        @param now Current time in seconds since the epoch; If None, the system clock is used
+        @paramType float
+        @returns # of deleted records, or # of dropped partitions if the global data is partitioned
+        @returnType int
+        '''
+        if self.global_partitions is not None:
+            return self.roll_partitions(now)
+
+        self.checkpoint = self._load_checkpoint()
+        if self.checkpoint is None: # If this is a fresh run
+            self.checkpoint = {
+                'age_limit' : self.get_age_limit(now), 'num_segments' : self.num_segments, 'segments' : {}
+            }
+        logger.info("Deleting the records older than %s", self.checkpoint['age_limit'])
+
+        threads = []
+        for segment_id in range(self.num_segments):
+            if self.checkpoint['segments'].get(str(segment_id)) == DONE: # If it finished before a restart
+                continue
+            thread = Thread(target=self._clean_segment, args=(segment_id,))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        if not self.stopped.is_set() and self.checkpoint_file is not None and os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file) # The next run starts over
+
+        logger.info("Deleted %s records", self.num_deleted)
+        return self.num_deleted
+
+    def roll_partitions(self, now=None):
+        '''
+        Creates the upcoming partitions of the global data and drops the expired ones.
+
+        @param now Current time in seconds since the epoch; If None, the system clock is used
+        @paramType float
+        @returns # of dropped partitions
+        @returnType int
+        '''
+        now = time.time() if now is None else now
+
+        created = self.global_partitions.create_partitions(
+            now, now + self.partition_lookahead * self.global_partitions.period_length
+        )
+        dropped = self.global_partitions.drop_partitions_before(now - self.max_record_age * 86400)
+        logger.info("Created partitions %s, dropped partitions %s", created, dropped)
+
+        return len(dropped)
+
+    def _clean_segment(self, segment_id):
+        '''
+        Scans the segment, deleting the old records page by page.
+
+        @param segment_id Segment of the table to clean up
+        @paramType int
+        @returns n/a
+        '''
+        try:
+            start_key = self.checkpoint['segments'].get(str(segment_id))
+            pages = scan_pages(
+                self.global_table, exclusive_start_key=start_key, attributes=['datum_id'],
+                segment=segment_id, total_segments=self.num_segments, governor=self.governor,
+                timestamp__lt=self.checkpoint['age_limit']
+            )
+
+            for (raw_items, last_key) in pages:
+                requests = [{'DeleteRequest' : {'Key' : {'datum_id' : raw_item['datum_id']}}} for raw_item in raw_items]
+                for start in range(0, len(requests), MAX_BATCH_SIZE):
+                    if self.stopped.is_set(): # Leave the page to be redone after the restart
+                        return
+                    write_batch(self.global_table, requests[start:start + MAX_BATCH_SIZE], governor=self.governor)
+
+                self._save_checkpoint(segment_id, last_key if last_key is not None else DONE, len(requests))
+                if self.stopped.is_set():
+                    return
+        except Exception:
+            logger.exception()
+            self.stopped.set() # Keep the other segments' checkpoints consistent with this one's
+
+    def _load_checkpoint(self):
+        ''' @returns The saved checkpoint, or None if there isn't a usable one '''
+        if self.checkpoint_file is None or not os.path.exists(self.checkpoint_file):
+            return None
+
+        checkpoint_file = open(self.checkpoint_file, 'r')
+        try:
+            checkpoint = json.load(checkpoint_file)
+        finally:
+            checkpoint_file.close()
+
+        if checkpoint.get('num_segments') != self.num_segments: # If the segments no longer line up
+            logger.warn("Ignoring the checkpoint of a %s segment run", checkpoint.get('num_segments'))
+            return None
+
+        logger.info("Resuming from the checkpoint in %s", self.checkpoint_file)
+        return checkpoint
+
+    def _save_checkpoint(self, segment_id, last_key, num_deleted):
+        '''
+        Records how far the segment has been cleaned.
+
+        @param segment_id Segment of the table
+        @paramType int
+        @param last_key Raw key to resume the segment's scan after, or DONE
+        @paramType dictionary or string
+        @param num_deleted # of records deleted since the last checkpoint
+        @paramType int
+        @returns n/a
+        '''
+        with self.lock:
+            self.num_deleted += num_deleted
+            self.checkpoint['segments'][str(segment_id)] = last_key
+            if self.checkpoint_file is None:
+                return
+
+            temp_file_name = self.checkpoint_file + '.tmp'
+            checkpoint_file = open(temp_file_name, 'w')
+            try:
+                json.dump(self.checkpoint, checkpoint_file)
+            finally:
+                checkpoint_file.close()
+            os.rename(temp_file_name, self.checkpoint_file) # Never leave a partial checkpoint behind
+
+    def shutdown(self):
+        '''
+        Stops the janitor after the batches being written, leaving the checkpoint to resume from.
+
+        @returns n/a
+        '''
+        self.stopped.set()
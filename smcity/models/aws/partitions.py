@@ -0,0 +1,183 @@
+'''
+Rolling time-partitioned tables. Each partition is its own table covering one period of time and
+named after the base table and the start of its period, i.e. 'qa_global_data_20140102' for a day or
+'qa_global_data_2014010201' for an hour, so expiring data is a matter of dropping whole tables.
+'''
+
+import calendar
+import time
+
+from boto.dynamodb2.fields import HashKey
+from boto.dynamodb2.table import Table
+from threading import Lock
+
+from smcity.misc.logger import Logger
+
+logger = Logger(__name__)
+
+# Length in seconds and table name suffix format of each supported partition period
+PERIODS = {
+    'day' : (86400, '%Y%m%d'),
+    'hour' : (3600, '%Y%m%d%H')
+}
+
+class PartitionedTable:
+    ''' Routes records to the partition table covering their timestamp. '''
+
+    def __init__(self, base_name, period, connection=None, throughput=None):
+        '''
+        Constructor.
+
+        @param base_name Name the partition tables are named after
+        @paramType string
+        @param period Length of time each partition covers
+        @paramType 'day' or 'hour'
+        @param connection DynamoDB2 connection; If None, boto's default connection is used
+        @paramType boto.dynamodb2.layer1.DynamoDBConnection
+        @param throughput Provisioned throughput of newly created partitions, i.e. {'read' : 5, 'write' : 5}
+        @paramType dictionary
+        @returns n/a
+        '''
+        assert period in PERIODS, period
+
+        self.base_name     = base_name
+        self.period        = period
+        self.period_length = PERIODS[period][0]
+        self.name_format   = base_name + '_' + PERIODS[period][1]
+        self.connection    = connection
+        self.throughput    = throughput
+        self.tables        = {} # Partition start => Table
+        self.tables_lock   = Lock()
+
+    def get_start(self, timestamp):
+        '''
+        @param timestamp Seconds since the epoch
+        @paramType int
+        @returns Start of the partition covering the timestamp, in seconds since the epoch
+        @returnType int
+        '''
+        return int(timestamp) // self.period_length * self.period_length
+
+    def get_name(self, timestamp):
+        ''' @returns Name of the partition table covering the timestamp (seconds since the epoch) '''
+        return time.strftime(self.name_format, time.gmtime(self.get_start(timestamp)))
+
+    def get_table(self, timestamp):
+        '''
+        @param timestamp Seconds since the epoch
+        @paramType int
+        @returns Partition table covering the timestamp
+        @returnType boto.dynamodb2.table.Table
+        '''
+        start = self.get_start(timestamp)
+
+        with self.tables_lock:
+            if start not in self.tables:
+                self.tables[start] = Table(self.get_name(start), connection=self.connection)
+            return self.tables[start]
+
+    def list_partitions(self):
+        '''
+        @returns Start of each existing partition, in seconds since the epoch, in time order
+        @returnType list of int
+        '''
+        connection = self.connection
+        if connection is None:
+            connection = Table(self.base_name).connection
+
+        starts = []
+        kwargs = {}
+        while True: # Page through all of the account's tables
+            response = connection.list_tables(**kwargs)
+            for table_name in response.get('TableNames', []):
+                start = self._parse_name(table_name)
+                if start is not None:
+                    starts.append(start)
+
+            if not response.get('LastEvaluatedTableName'):
+                return sorted(starts)
+            kwargs['exclusive_start_table_name'] = response['LastEvaluatedTableName']
+
+    def _parse_name(self, table_name):
+        ''' @returns Start of the partition the table holds, or None if it isn't one of the partitions '''
+        prefix = self.base_name + '_'
+        if not table_name.startswith(prefix):
+            return None
+
+        try:
+            start = calendar.timegm(time.strptime(table_name[len(prefix):], PERIODS[self.period][1]))
+        except ValueError:
+            return None
+        if self.get_name(start) != table_name: # If the suffix only partially matched the format
+            return None
+
+        return start
+
+    def get_tables(self, min_timestamp=None, max_timestamp=None):
+        '''
+        @param min_timestamp Start of the time window in seconds since the epoch, or None
+        @paramType int
+        @param max_timestamp End of the time window in seconds since the epoch, or None
+        @paramType int
+        @returns Existing partition tables overlapping the time window, in time order
+        @returnType list of boto.dynamodb2.table.Table
+        '''
+        tables = []
+        for start in self.list_partitions():
+            if (min_timestamp is not None and start + self.period_length <= min_timestamp) or \
+               (max_timestamp is not None and start > max_timestamp):
+                continue
+            tables.append(self.get_table(start))
+
+        return tables
+
+    def create_partitions(self, min_timestamp, max_timestamp):
+        '''
+        Creates the missing partitions covering the time window, i.e. ahead of the data arriving.
+
+        @param min_timestamp Start of the time window in seconds since the epoch
+        @paramType int
+        @param max_timestamp End of the time window in seconds since the epoch
+        @paramType int
+        @returns Names of the created partition tables
+        @returnType list of string
+        '''
+        existing = set(self.list_partitions())
+
+        created = []
+        for start in range(self.get_start(min_timestamp), self.get_start(max_timestamp) + 1, self.period_length):
+            if start in existing:
+                continue
+
+            logger.info("Creating partition %s", self.get_name(start))
+            table = Table.create(
+                self.get_name(start), schema=[HashKey('datum_id')], throughput=self.throughput,
+                connection=self.connection
+            )
+            with self.tables_lock:
+                self.tables[start] = table
+            created.append(table.table_name)
+
+        return created
+
+    def drop_partitions_before(self, timestamp):
+        '''
+        Drops the partitions holding nothing but data older than the timestamp.
+
+        @param timestamp Seconds since the epoch
+        @paramType int
+        @returns Names of the dropped partition tables
+        @returnType list of string
+        '''
+        dropped = []
+        for start in self.list_partitions():
+            if start + self.period_length > timestamp: # If it holds data still worth keeping
+                continue
+
+            logger.info("Dropping partition %s", self.get_name(start))
+            self.get_table(start).delete()
+            with self.tables_lock:
+                self.tables.pop(start, None)
+            dropped.append(self.get_name(start))
+
+        return dropped
@@ -0,0 +1,125 @@
+''' Unit tests for decoding raw AWS records. '''
+
+from boto.dynamodb2.exceptions import ConditionalCheckFailedException
+from boto.dynamodb2.table import Table
+from time import gmtime, strptime
+
+from smcity.models.aws.aws_data import AwsData, AwsDataFactory, AwsDataIterator, RawRecord, parse_timestamp, scan_records
+from smcity.models.test.mock_dynamodb import mock_config, mock_connection
+
+def raw_item(datum_id, lat, timestamp):
+    ''' @returns A raw global data record, as DynamoDB returns it '''
+    return {
+        'content' : {'S' : 'content ' + datum_id}, 'datum_id' : {'S' : datum_id},
+        'lat' : {'N' : str(lat)}, 'lon' : {'N' : '-10000000'}, 'set_id' : {'S' : 'global'},
+        'timestamp' : {'S' : timestamp}, 'type' : {'S' : 'twitter'}
+    }
+
+class TestAwsRecords:
+    ''' Tests decoding raw AWS records. '''
+
+    def test_parse_timestamp(self):
+        ''' Tests that parsed timestamps match strptime's. '''
+        for timestamp_norm in ['2014-01-02 01:02:03', '2014-01-02 23:59:59', '2012-02-29 12:00:00', '2015-12-31 00:00:00']:
+            expected = strptime(timestamp_norm, '%Y-%m-%d %H:%M:%S')
+            assert parse_timestamp(timestamp_norm) == expected, (timestamp_norm, parse_timestamp(timestamp_norm))
+
+    def test_raw_record(self):
+        ''' Tests reading the fields of a raw record. '''
+        record = RawRecord(raw_item('1', 55000000, '2014-01-02 01:02:03'))
+
+        assert record['datum_id'] == '1', record['datum_id']
+        assert record['lat'] == 55000000 and isinstance(record['lat'], int), record['lat']
+        assert 'lat' in record and 'missing' not in record
+        assert record.get('missing') is None
+
+        record = RawRecord({'score' : {'N' : '0.5'}, 'tags' : {'SS' : ['a']}})
+        assert record['score'] == 0.5, record['score']
+        assert record['tags'] == set(['a']), record['tags']
+
+    def test_aws_data(self):
+        ''' Tests that AwsData decodes its location and timestamp once, and carries no __dict__. '''
+        data = AwsData(RawRecord(raw_item('1', 55000000, '2014-01-02 01:02:03')))
+
+        assert not hasattr(data, '__dict__')
+        assert data.get_location() == (-1.0, 5.5), data.get_location()
+        assert data.get_location() is data.get_location()
+        assert data.get_timestamp() == strptime('2014-01-02 01:02:03', '%Y-%m-%d %H:%M:%S'), data.get_timestamp()
+        assert data.get_timestamp() is data.get_timestamp()
+
+    def test_scan_records(self):
+        ''' Tests that every page of a scan is decoded. '''
+        connection = mock_connection()
+        connection.pages[('global_data', 1)] = [
+            [raw_item('1', 1, '2014-01-02 01:02:03')],
+            [raw_item('2', 2, '2014-01-02 01:02:03'), raw_item('3', 3, '2014-01-02 01:02:03')]
+        ]
+
+        datas = list(AwsDataIterator(scan_records(
+            Table('global_data', connection=connection), segment=1, total_segments=2, set_id__eq='global'
+        )))
+
+        assert [data.get_datum_id() for data in datas] == ['1', '2', '3'], datas
+        requests = connection.get_requests('global_data', 'scan')
+        assert len(requests) == 2, requests
+        assert requests[0]['scan_filter'] == {
+            'set_id' : {'AttributeValueList' : [{'S' : 'global'}], 'ComparisonOperator' : 'EQ'}
+        }, requests
+        assert requests[0]['segment'] == 1, requests
+        assert requests[0]['exclusive_start_key'] is None, requests
+        assert requests[1]['exclusive_start_key'] == {'page' : {'N' : '0'}}, requests
+
+    def test_copy_data(self):
+        ''' Tests that scanned records are copied with their raw attributes, in full batches. '''
+        raw_items = [raw_item(str(iter), iter, '2014-01-02 01:02:03') for iter in range(60)]
+        connection = mock_connection(raw_items)
+        data_factory = AwsDataFactory(mock_config(), connection=connection)
+
+        data_factory.copy_data('set', list(AwsDataIterator(scan_records(data_factory.global_table))))
+
+        batches = [batch for (table_name, batch) in connection.batches if table_name == 'set_data']
+        assert sorted(len(batch) for batch in batches) == [10, 25, 25], batches
+        items = [request['PutRequest']['Item'] for batch in batches for request in batch]
+        assert sorted(int(item['datum_id']['S']) for item in items) == range(60), items
+        assert items[0]['set_id'] == {'S' : 'set'}, items[0]
+        assert items[0]['lat'] is raw_items[int(items[0]['datum_id']['S'])]['lat'], items[0]
+        assert raw_items[0]['set_id'] == {'S' : 'global'}, raw_items[0] # The scanned record is left alone
+
+    def test_virtual_sets(self):
+        ''' Tests that a virtual set stores the datum ids of its members and reads back their global data records. '''
+        raw_items = [raw_item(str(iter), iter, '2014-01-02 01:02:03') for iter in range(1500)]
+        connection = mock_connection(raw_items)
+        data_factory = AwsDataFactory(mock_config(virtual_sets='true'), connection=connection)
+
+        data_factory.copy_data('set', [AwsData(RawRecord(item)) for item in raw_items[:1200]])
+
+        items = list(connection.items['set_data'])
+        assert len(items) == 2, items # Only the member lists are written
+        assert sorted(len(item['members']['SS']) for item in items) == [200, 1000], items
+
+        for (set_id, datum_id) in [('set', 'copied'), ('other', 'other')]: # Along with a record that was copied in full
+            connection.put_item('set_data', {'set_id' : {'S' : set_id}, 'datum_id' : {'S' : datum_id}})
+
+        datum_ids = [data.get_datum_id() for data in data_factory.get_data_set('set')]
+        assert sorted(datum_ids) == sorted([str(iter) for iter in range(1200)] + ['copied']), datum_ids
+
+    def test_create_duplicate(self):
+        ''' Tests that a duplicate record is rejected, whether or not its writes are paced. '''
+        for write_capacity in [0, 100]:
+            config = mock_config()
+            config.add_section('capacity')
+            config.set('capacity', 'filter_write_capacity', str(write_capacity))
+            connection = mock_connection()
+            data_factory = AwsDataFactory(config, connection=connection)
+            assert (data_factory.governor is None) == (write_capacity == 0)
+
+            data_factory.create_data('content', '1', (-1.0, 5.5), 'set', gmtime(0), 'twitter')
+            try:
+                data_factory.create_data('other content', '1', (-1.0, 5.5), 'set', gmtime(0), 'twitter')
+                assert False, "create_data() should have raised a ConditionalCheckFailedException!"
+            except ConditionalCheckFailedException:
+                pass
+
+            assert [item['content'] for item in connection.items['set_data']] == [{'S' : 'content'}]
+            put = connection.get_requests('set_data', 'put_item')[0]
+            assert put['expected']['datum_id'] == {'Exists' : False}, put
@@ -0,0 +1,100 @@
+''' Unit tests for the BatchWriter class. '''
+
+import time
+
+from boto.dynamodb2.table import Table
+
+from smcity.misc.errors import CreateError
+from smcity.models.aws.batch_writer import BatchWriter, encode_put_request, write_batches
+from smcity.models.test.mock_dynamodb import MockConnection
+
+def mock_table(num_unprocessed=0):
+    ''' @returns A table backed by a MockConnection, leaving its first num_unprocessed write requests unprocessed '''
+    connection = MockConnection(['fake_table'])
+    connection.num_unprocessed = num_unprocessed
+    return Table('fake_table', connection=connection)
+
+class TestBatchWriter:
+    ''' Tests the BatchWriter class. '''
+
+    def written_ids(self, connection):
+        ''' @returns The datum ids of all of the written records '''
+        return [request['PutRequest']['Item']['datum_id']['S'] for (table_name, batch) in connection.batches
+                for request in batch]
+
+    def test_size_threshold(self):
+        ''' Tests that a full buffer is written as a batch. '''
+        table = mock_table()
+        connection = table.connection
+        writer = BatchWriter(table, batch_size=3, flush_interval=None)
+
+        for iter in range(7):
+            writer.put_item({'datum_id' : str(iter), 'lat' : iter, 'content' : ''})
+
+        assert [len(batch) for (table_name, batch) in connection.batches] == [3, 3], connection.batches
+        assert connection.batches[0][1][1]['PutRequest']['Item'] == {'datum_id' : {'S' : '1'}, 'lat' : {'N' : '1'}}, \
+            connection.batches[0][1][1]
+
+        writer.shutdown() # Writes out the remaining record
+        assert self.written_ids(connection) == [str(iter) for iter in range(7)], self.written_ids(connection)
+
+    def test_time_threshold(self):
+        ''' Tests that records are not buffered for longer than the flush interval. '''
+        table = mock_table()
+        connection = table.connection
+        writer = BatchWriter(table, batch_size=25, flush_interval=0.05)
+
+        writer.put_item({'datum_id' : '1'})
+        time.sleep(0.2)
+
+        assert self.written_ids(connection) == ['1'], connection.batches
+        writer.shutdown()
+
+    def test_unprocessed_items(self):
+        ''' Tests that unprocessed records are resent. '''
+        table = mock_table(2)
+        connection = table.connection
+        writer = BatchWriter(table, batch_size=3, flush_interval=None, min_backoff=0.001)
+
+        for iter in range(3):
+            writer.put_item({'datum_id' : str(iter)})
+
+        assert sorted(self.written_ids(connection)) == ['0', '1', '2'], connection.batches
+
+    def test_retries_exhausted(self):
+        ''' Tests that records still unprocessed after all of the retries raise a CreateError. '''
+        table = mock_table(100)
+        connection = table.connection
+        writer = BatchWriter(table, batch_size=2, flush_interval=None,
+                             max_retries=2, min_backoff=0.001)
+
+        writer.put_item({'datum_id' : '1'})
+        try:
+            writer.put_item({'datum_id' : '2'})
+            assert False, "put_item() should have raised a CreateError!"
+        except CreateError:
+            pass
+        assert len(connection.batches) == 3, connection.batches
+
+    def test_write_batches(self):
+        ''' Tests that write_batches() packs full batches and resends unprocessed records. '''
+        table = mock_table(3)
+        connection = table.connection
+        requests = [encode_put_request({'datum_id' : str(iter)}) for iter in range(60)]
+
+        write_batches(table, requests, num_writers=3, min_backoff=0.001)
+
+        assert sorted(self.written_ids(connection), key=int) == [str(iter) for iter in range(60)], connection.batches
+        assert len(connection.batches) == 4, connection.batches
+
+    def test_write_batches_failure(self):
+        ''' Tests that a batch failing in any of the writers raises a CreateError. '''
+        table = mock_table(1000)
+        connection = table.connection
+        requests = [encode_put_request({'datum_id' : str(iter)}) for iter in range(60)]
+
+        try:
+            write_batches(table, requests, num_writers=3, max_retries=1, min_backoff=0.001)
+            assert False, "write_batches() should have raised a CreateError!"
+        except CreateError:
+            pass
@@ -0,0 +1,143 @@
+''' Unit tests for the capacity governor. '''
+
+from boto.dynamodb2.exceptions import ProvisionedThroughputExceededException
+from boto.dynamodb2.table import Table
+from ConfigParser import ConfigParser
+
+from smcity.models.aws.batch_writer import write_batch
+from smcity.models.aws.capacity import CapacityGovernor, TokenBucket, get_capacity_governor, governed_call
+from smcity.models.test.mock_dynamodb import MockConnection
+
+class FakeClock:
+    ''' Clock that only moves forward when slept on. '''
+
+    def __init__(self):
+        self.now    = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class TestCapacity:
+    ''' Tests the TokenBucket and CapacityGovernor classes. '''
+
+    def setup(self):
+        ''' Set up before each test. '''
+        self.clock = FakeClock()
+
+    def test_pacing(self):
+        ''' Tests that requests wait for the consumed capacity to be paid back. '''
+        bucket = TokenBucket(10, clock=self.clock.time, sleep=self.clock.sleep)
+
+        bucket.take(1)
+        bucket.charge(14) # Consumed 15 units, 5 more than a second's worth
+        assert self.clock.sleeps == []
+
+        bucket.take(1)
+        assert self.clock.sleeps == [0.5], self.clock.sleeps
+
+        bucket.charge(-1) # Overestimated
+        bucket.take(1)
+        assert self.clock.sleeps == [0.5], self.clock.sleeps
+
+    def test_unlimited(self):
+        ''' Tests that a bucket without a budget never waits. '''
+        bucket = TokenBucket(0, clock=self.clock.time, sleep=self.clock.sleep)
+        bucket.take(100)
+        bucket.charge(100)
+        bucket.take(100)
+        bucket.throttled()
+
+        assert self.clock.sleeps == []
+
+    def test_backoff(self):
+        ''' Tests that background buckets back off multiplicatively and recover additively. '''
+        bucket = TokenBucket(10, adaptive=True, clock=self.clock.time, sleep=self.clock.sleep)
+
+        bucket.throttled()
+        bucket.throttled() # Reported by a concurrent request, only counts once
+        assert bucket.rate == 5, bucket.rate
+
+        self.clock.now += 1.5
+        bucket.throttled()
+        assert bucket.rate == 2.75, bucket.rate
+
+        for iter in range(10):
+            self.clock.now += 1.0
+            bucket.throttled()
+        assert bucket.rate == 0.5, bucket.rate # Never below MIN_RATE_FRACTION of the budget
+
+        self.clock.now += 15.0
+        bucket.charge(0)
+        assert bucket.rate == 5.5, bucket.rate
+        self.clock.now += 60.0
+        bucket.charge(0)
+        assert bucket.rate == 10, bucket.rate
+
+        priority = TokenBucket(10, adaptive=False, clock=self.clock.time, sleep=self.clock.sleep)
+        priority.throttled()
+        assert priority.rate == 10, priority.rate
+
+    def test_get_capacity_governor(self):
+        ''' Tests that each role reads its own budget and only background roles adapt. '''
+        config = ConfigParser()
+        config.add_section('capacity')
+        config.set('capacity', 'ingest_write_capacity', '40')
+        config.set('capacity', 'janitor_read_capacity', '5')
+        config.set('capacity', 'janitor_write_capacity', '10')
+
+        assert get_capacity_governor(config, 'filter') is None
+
+        ingest = get_capacity_governor(config, 'ingest')
+        assert ingest.get_bucket('read').budget == 0 and ingest.get_bucket('write').budget == 40
+        assert not ingest.get_bucket('write').adaptive
+
+        janitor = get_capacity_governor(config, 'janitor')
+        assert janitor.get_bucket('read').budget == 5 and janitor.get_bucket('write').budget == 10
+        assert janitor.get_bucket('write').adaptive
+
+    def test_governed_call(self):
+        ''' Tests that requests are charged their consumed capacity and throttles are reported. '''
+        governor = CapacityGovernor(10, 10, clock=self.clock.time, sleep=self.clock.sleep)
+
+        calls = []
+        def scan(table_name, **kwargs):
+            calls.append((table_name, kwargs))
+            return {'ConsumedCapacity' : {'TableName' : table_name, 'CapacityUnits' : 20.0}}
+
+        governed_call(governor, 'read', 1, scan, 'fake_table', segment=0)
+        assert calls == [('fake_table', {'segment' : 0, 'return_consumed_capacity' : 'TOTAL'})], calls
+        assert governor.get_bucket('read').tokens == -10, governor.get_bucket('read').tokens
+        assert governor.get_bucket('write').tokens == 10
+
+        governed_call(None, 'read', 1, scan, 'fake_table')
+        assert calls[-1] == ('fake_table', {}), calls
+
+        def throttled_scan(table_name, **kwargs):
+            raise ProvisionedThroughputExceededException(400, 'Bad Request')
+        try:
+            governed_call(governor, 'read', 1, throttled_scan, 'fake_table')
+            assert False, 'Expected a ProvisionedThroughputExceededException'
+        except ProvisionedThroughputExceededException:
+            pass
+        assert governor.get_bucket('read').rate == 5, governor.get_bucket('read').rate
+
+    def test_write_batch(self):
+        ''' Tests that batch writes are paced and unprocessed records count as throttles. '''
+        governor = CapacityGovernor(0, 100, clock=self.clock.time, sleep=self.clock.sleep)
+        connection = MockConnection(['fake_table'])
+        connection.num_unprocessed   = 1
+        connection.capacity_per_item = 2.0
+        requests = [{'PutRequest' : {'Item' : {'datum_id' : {'S' : str(iter)}}}} for iter in range(25)]
+
+        write_batch(Table('fake_table', connection=connection), requests, min_backoff=0, governor=governor)
+
+        batches = connection.get_requests('fake_table', 'batch_write_item')
+        assert [len(batch['requests']) for batch in batches] == [25, 1], batches
+        assert len(connection.items['fake_table']) == 25, connection.items
+        assert governor.get_bucket('write').rate == 50, governor.get_bucket('write').rate
+        assert governor.get_bucket('write').tokens == 48, governor.get_bucket('write').tokens
@@ -0,0 +1,40 @@
+''' Unit tests for the geo index key layout. '''
+
+from time import strptime
+
+from smcity.models.aws import geo_index
+
+class TestGeoIndex:
+    ''' Tests the geo index key layout functions. '''
+
+    def test_keys(self):
+        ''' Tests building a record's partition and sort keys. '''
+        partition_key = geo_index.get_partition_key(-5.6, 42.6, '2014-01-02 01:02:03', 4)
+        assert partition_key == 'ezs4 2014-01-02 01', partition_key
+
+        sort_key = geo_index.get_sort_key('2014-01-02 01:02:03', '1234')
+        assert sort_key == '2014-01-02 01:02:03 1234', sort_key
+
+    def test_plan_queries(self):
+        ''' Tests decomposing a bounding box and time window into partition queries. '''
+        min_timestamp = strptime('2014-01-02 01:45:00', '%Y-%m-%d %H:%M:%S')
+        max_timestamp = strptime('2014-01-02 02:00:00', '%Y-%m-%d %H:%M:%S')
+
+        queries = geo_index.plan_queries(42.59, 42.61, -5.61, -5.59, min_timestamp, max_timestamp, 3, 10)
+
+        assert queries == [
+            ('ezs 2014-01-02 01', '2014-01-02 01:45:00', '2014-01-02 02:00:00 ~'),
+            ('ezs 2014-01-02 02', '2014-01-02 01:45:00', '2014-01-02 02:00:00 ~')
+        ], queries
+
+        # A record's sort key falls inside the range only if its timestamp is inside the window
+        assert queries[0][1] <= geo_index.get_sort_key('2014-01-02 01:45:00', '99') <= queries[0][2]
+        assert not geo_index.get_sort_key('2014-01-02 01:44:59', '99') >= queries[0][1]
+        assert geo_index.get_sort_key('2014-01-02 02:00:00', 'zz') <= queries[1][2]
+
+    def test_plan_too_many_queries(self):
+        ''' Tests that windows needing too many queries are left to a scan. '''
+        min_timestamp = strptime('2014-01-01 00:00:00', '%Y-%m-%d %H:%M:%S')
+        max_timestamp = strptime('2014-01-03 00:00:00', '%Y-%m-%d %H:%M:%S')
+
+        assert geo_index.plan_queries(39.8, 40.2, -83.2, -82.8, min_timestamp, max_timestamp, 4, 100) is None
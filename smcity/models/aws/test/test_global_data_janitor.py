@@ -0,0 +1,117 @@
+''' Unit tests for the GlobalDataJanitor class. '''
+
+import os
+import shutil
+import tempfile
+
+from boto.dynamodb2.table import Table
+from ConfigParser import ConfigParser
+
+from smcity.models.aws.global_data_janitor import GlobalDataJanitor
+from smcity.models.test.mock_dynamodb import MockConnection
+
+def mock_table(segment_pages, on_write=None):
+    '''
+    @param segment_pages Segment => pages of the datum ids its scan serves
+    @paramType dictionary
+    @param on_write Called after each batch delete
+    @paramType function
+    @returns A global data table backed by a MockConnection
+    @returnType boto.dynamodb2.table.Table
+    '''
+    connection = MockConnection(['global_data'])
+    connection.on_write = on_write
+    for (segment, pages) in segment_pages.items():
+        connection.pages[('global_data', segment)] = [
+            [{'datum_id' : {'S' : datum_id}} for datum_id in page] for page in pages
+        ]
+
+    return Table('global_data', connection=connection)
+
+def deleted_ids(connection):
+    ''' @returns The datum ids of all of the deleted records '''
+    return [
+        request['DeleteRequest']['Key']['datum_id']['S'] for (table_name, batch) in connection.batches
+        for request in batch
+    ]
+
+class TestGlobalDataJanitor:
+    ''' Tests the GlobalDataJanitor class. '''
+
+    def setup(self):
+        ''' Set up before each test. '''
+        self.temp_dir = tempfile.mkdtemp()
+
+        self.config = ConfigParser()
+        self.config.add_section('janitor')
+        self.config.set('janitor', 'max_record_age', '2')
+        self.config.set('janitor', 'num_segments', '2')
+        self.config.set('janitor', 'checkpoint_file', os.path.join(self.temp_dir, 'checkpoint.json'))
+
+        self.segment_pages = {
+            0 : [['0-%s' % iter for iter in range(30)], ['0-a', '0-b']],
+            1 : [['1-a'], [], ['1-b', '1-c']]
+        }
+        self.datum_ids = sorted(datum_id for pages in self.segment_pages.values() for page in pages for datum_id in page)
+
+    def teardown(self):
+        ''' Clean up after each test. '''
+        shutil.rmtree(self.temp_dir)
+
+    def test_run(self):
+        ''' Tests that every old record in every segment is deleted. '''
+        global_table = mock_table(self.segment_pages)
+        connection = global_table.connection
+        janitor = GlobalDataJanitor(self.config, global_table)
+
+        assert janitor.run(now=2 * 86400 + 3661) == len(self.datum_ids)
+
+        assert sorted(deleted_ids(connection)) == self.datum_ids, deleted_ids(connection)
+        assert all(len(batch) <= 25 for (table_name, batch) in connection.batches), connection.batches
+        scans = connection.get_requests('global_data', 'scan')
+        assert len(scans) == 5, scans
+        for scan in scans:
+            assert scan['scan_filter'] == {
+                'timestamp' : {'AttributeValueList' : [{'S' : '1970-01-01 01:01:01'}], 'ComparisonOperator' : 'LT'}
+            }, scan
+            assert scan['total_segments'] == 2 and scan['attributes_to_get'] == ['datum_id'], scan
+        assert not os.path.exists(self.config.get('janitor', 'checkpoint_file'))
+
+    def test_resume(self):
+        ''' Tests that a janitor shut down part way resumes from its checkpoint. '''
+        janitors = []
+        def shutdown_after_three_batches():
+            if len(deleted_ids(connection)) >= 27:
+                janitors[0].shutdown()
+        self.config.set('janitor', 'num_segments', '1')
+        global_table = mock_table(
+            {0 : [['a'], ['b%s' % iter for iter in range(25)], ['c'], ['d'], ['e']]}, shutdown_after_three_batches
+        )
+        connection = global_table.connection
+        janitors.append(GlobalDataJanitor(self.config, global_table))
+
+        assert janitors[0].run() == 27
+        assert os.path.exists(self.config.get('janitor', 'checkpoint_file'))
+
+        connection.on_write = None
+        connection.requests = []
+        assert GlobalDataJanitor(self.config, global_table).run() == 2
+
+        assert deleted_ids(connection) == ['a'] + ['b%s' % iter for iter in range(25)] + ['c', 'd', 'e'], \
+            deleted_ids(connection)
+        scans = connection.get_requests('global_data', 'scan')
+        assert scans[0]['exclusive_start_key'] == {'page' : {'N' : '2'}}, scans[0]
+        assert not os.path.exists(self.config.get('janitor', 'checkpoint_file'))
+
+    def test_capacity(self):
+        ''' Tests that the deletes are paced by the janitor role's write capacity budget. '''
+        self.config.add_section('capacity')
+        self.config.set('capacity', 'janitor_write_capacity', '1000')
+        global_table = mock_table(self.segment_pages)
+        janitor = GlobalDataJanitor(self.config, global_table)
+
+        assert janitor.run(now=2 * 86400 + 3661) == len(self.datum_ids)
+
+        batches = global_table.connection.get_requests('global_data', 'batch_write_item')
+        assert all(batch['return_consumed_capacity'] == 'TOTAL' for batch in batches), batches
+        assert janitor.governor.get_bucket('write').budget == 1000
@@ -0,0 +1,87 @@
+''' Unit tests for the PartitionedTable class. '''
+
+import calendar
+
+from ConfigParser import ConfigParser
+from time import strptime
+
+from smcity.models.aws.aws_data import AwsDataFactory
+from smcity.models.aws.global_data_janitor import GlobalDataJanitor
+from smcity.models.aws.partitions import PartitionedTable
+from smcity.models.test.mock_dynamodb import MockConnection, mock_config
+
+def seconds(timestamp_str):
+    ''' @returns The timestamp in seconds since the epoch '''
+    return calendar.timegm(strptime(timestamp_str, '%Y-%m-%d %H:%M:%S'))
+
+class TestPartitionedTable:
+    ''' Tests the PartitionedTable class. '''
+
+    def setup(self):
+        ''' Set up before each test. '''
+        self.connection = MockConnection(list_page_size=2)
+        for table_name in ['global_20140101', 'global_20140102', 'global_20140104',
+                           'global_data', 'global_2014', 'set_20140103']:
+            self.connection.add_table(table_name, items=[{'datum_id' : {'S' : table_name + ' record'}}])
+        self.partitions = PartitionedTable('global', 'day', connection=self.connection)
+
+    def test_routing(self):
+        ''' Tests that timestamps are routed to the partition covering them. '''
+        assert self.partitions.get_name(seconds('2014-01-02 23:59:59')) == 'global_20140102'
+        assert self.partitions.get_table(seconds('2014-01-02 00:00:00')).table_name == 'global_20140102'
+        assert self.partitions.get_table(seconds('2014-01-02 12:00:00')) is \
+            self.partitions.get_table(seconds('2014-01-02 00:00:00'))
+
+        hours = PartitionedTable('global', 'hour', connection=self.connection)
+        assert hours.get_name(seconds('2014-01-02 05:59:59')) == 'global_2014010205'
+
+    def test_get_tables(self):
+        ''' Tests that only the existing partitions overlapping the window are returned. '''
+        assert self.partitions.list_partitions() == [
+            seconds('2014-01-01 00:00:00'), seconds('2014-01-02 00:00:00'), seconds('2014-01-04 00:00:00')
+        ], self.partitions.list_partitions()
+
+        tables = self.partitions.get_tables(seconds('2014-01-02 12:00:00'), seconds('2014-01-05 00:00:00'))
+        assert [table.table_name for table in tables] == ['global_20140102', 'global_20140104'], tables
+
+        tables = self.partitions.get_tables(max_timestamp=seconds('2014-01-01 23:59:59'))
+        assert [table.table_name for table in tables] == ['global_20140101'], tables
+
+    def test_create_and_drop(self):
+        ''' Tests creating the missing partitions of a window and dropping the expired ones. '''
+        created = self.partitions.create_partitions(seconds('2014-01-02 12:00:00'), seconds('2014-01-05 00:00:00'))
+        assert created == ['global_20140103', 'global_20140105'], created
+
+        dropped = self.partitions.drop_partitions_before(seconds('2014-01-03 00:00:00'))
+        assert dropped == ['global_20140101', 'global_20140102'], dropped
+        assert sorted(self.connection.items) == [
+            'global_2014', 'global_20140103', 'global_20140104', 'global_20140105', 'global_data', 'set_20140103'
+        ], self.connection.items.keys()
+
+    def test_filter_global_data(self):
+        ''' Tests that a filter only scans the partitions overlapping its time window. '''
+        data_factory = AwsDataFactory(
+            mock_config(global_data_table='global', partition_period='day'), connection=self.connection
+        )
+
+        datas = data_factory.filter_global_data(
+            min_timestamp=strptime('2014-01-02 12:00:00', '%Y-%m-%d %H:%M:%S'), segment_id=0, num_segments=2
+        )
+        assert [data.get_datum_id() for data in datas] == ['global_20140102 record', 'global_20140104 record']
+        scanned = [table_name for (operation, table_name, arguments) in self.connection.requests if operation == 'scan']
+        assert scanned == ['global_20140102', 'global_20140104'], scanned
+
+    def test_janitor(self):
+        ''' Tests that the janitor rolls the partitions instead of deleting records. '''
+        config = ConfigParser()
+        config.add_section('janitor')
+        config.set('janitor', 'max_record_age', '2')
+        config.set('janitor', 'partition_lookahead', '1')
+
+        janitor = GlobalDataJanitor(config, global_partitions=self.partitions)
+        assert janitor.run(now=seconds('2014-01-04 12:00:00')) == 1
+
+        # The 2014-01-02 partition still holds records younger than two days
+        assert sorted(self.connection.items) == [
+            'global_2014', 'global_20140102', 'global_20140104', 'global_20140105', 'global_data', 'set_20140103'
+        ], self.connection.items.keys()
@@ -1,7 +1,8 @@
 ''' Description of a piece of generic data. '''
 
-class Data:
-  
+class Data(object):
+    __slots__ = () # Holds no state, so implementations may use __slots__
+
     def get_content(self):
         '''
         @returns Content of the data, i.e. for twitter data this would be the tweeted message
@@ -106,13 +107,34 @@ class DataFactory:
         '''
         raise NotImplementedError()
 
-    def get_data_set(self, set_id):
+    def get_data_set(self, set_id, segment_id=0, num_segments=1):
         '''
         Retrieves all data in the provided set.
 
         @param set_id Unique tracking id of the set
         @paramType string/uuid
+        @param segment_id Segment of the set to retrieve, for reading a set in parallel
+        @paramType int
+        @param num_segments # of segments the set is split into
+        @paramType int
         @returns Data contained in the specified set
         @returnType Iterator
         '''
         raise NotImplementedError()
+
+    def reconnect(self):
+        '''
+        Replaces any open database connections with new ones, i.e. in a freshly forked process
+        that must not share its parent's connections.
+
+        @returns n/a
+        '''
+        raise NotImplementedError()
+
+    def shutdown(self):
+        '''
+        Writes out any buffered data records and releases the factory's resources.
+
+        @returns n/a
+        '''
+        raise NotImplementedError()
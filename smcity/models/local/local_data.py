@@ -0,0 +1,313 @@
+'''
+Data model and factory implementations backed by append-only columnar segment files on the local
+disk, an offline engine for backfills and benchmarks. Each set's records are partitioned by time
+into directories of immutable segments, @see segment, laid out as:
+
+    <data_dir>/<set id>/<partition start, seconds since the epoch>/<segment>.seg
+'''
+
+import calendar
+import os
+import shutil
+
+from threading import Lock
+from time import gmtime, struct_time
+
+from smcity.misc.logger import Logger
+from smcity.models.data import Data, DataFactory
+from smcity.models.local.segment import SEGMENT_EXTENSION, Segment, new_segment_name, write_segment
+
+logger = Logger(__name__)
+
+class LocalData(Data):
+    ''' Local segment store specific implementation of the Data model. Fields are decoded on demand. '''
+    __slots__ = ('segment', 'index', 'set_id')
+
+    def __init__(self, segment, index, set_id):
+        '''
+        Constructor.
+
+        @param segment Segment holding the record
+        @paramType Segment
+        @param index Index of the record within the segment
+        @paramType int
+        @param set_id Tracking id of the set the segment belongs to
+        @paramType string
+        @returns n/a
+        '''
+        assert segment is not None
+
+        self.segment = segment
+        self.index   = index
+        self.set_id  = set_id
+
+    def get_content(self):
+        ''' {@inheritDocs} '''
+        return self.segment.get_content(self.index).decode('utf-8')
+
+    def get_datum_id(self):
+        ''' {@inheritDocs} '''
+        return self.segment.get_datum_id(self.index)
+
+    def get_location(self):
+        ''' {@inheritDocs} '''
+        lat = float(self.segment.lats[self.index]) / 10000000
+        lon = float(self.segment.lons[self.index]) / 10000000
+
+        return (lon, lat)
+
+    def get_set_id(self):
+        ''' {@inheritDocs} '''
+        return self.set_id
+
+    def get_timestamp(self):
+        ''' {@inheritDocs} '''
+        timestamp = gmtime(int(self.segment.timestamps[self.index]))
+        return struct_time(timestamp[:8] + (-1,)) # Same as parsing the normalized timestamp
+
+    def get_type(self):
+        ''' {@inheritDocs} '''
+        return self.segment.get_type(self.index)
+
+class LocalDataFactory(DataFactory):
+
+    def __init__(self, config):
+        '''
+        Constructor.
+
+        @param config Configuration settings. Expected definition:
+
+        Section: database
+        Key:     local_data_dir
+        Type:    string
+        Desc:    Directory holding the segment files
+
+        Section: database
+        Key:     local_partition_seconds
+        Type:    int
+        Desc:    # of seconds of data covered by each time partition (Optional, default 86400)
+
+        Section: database
+        Key:     local_flush_size
+        Type:    int
+        Desc:    # of created records buffered per partition before they are written out as a
+                 segment (Optional, default 10000)
+        @paramType ConfigParser
+        @returns n/a
+        '''
+        self.data_dir          = config.get('database', 'local_data_dir')
+        self.partition_seconds = 86400
+        self.flush_size        = 10000
+        if config.has_option('database', 'local_partition_seconds'):
+            self.partition_seconds = config.getint('database', 'local_partition_seconds')
+        if config.has_option('database', 'local_flush_size'):
+            self.flush_size = config.getint('database', 'local_flush_size')
+        assert self.partition_seconds > 0, self.partition_seconds
+        assert self.flush_size > 0, self.flush_size
+
+        self.buffers      = {} # (set id, partition start) => records waiting to be written as a segment
+        self.buffers_lock = Lock()
+        self.segments     = {} # File name => Segment, segments never change once written
+
+    def create_data(self, content, datum_id, location, set_id, timestamp, type):
+        ''' {@inheritDocs} '''
+        assert content is not None
+        assert datum_id is not None
+        assert -180 <= location[0] and location[0] < 180, location[0]
+        assert -90 <= location[1] and location[1] < 90, location[1]
+        assert set_id is not None
+        assert timestamp is not None
+        assert type is not None
+
+        if isinstance(content, unicode):
+            content = content.encode('utf-8')
+        record = (
+            str(datum_id), int(location[1] * 10000000), int(location[0] * 10000000),
+            calendar.timegm(timestamp), content, str(type)
+        )
+        key = (set_id, self._get_partition(record[3]))
+
+        with self.buffers_lock:
+            records = self.buffers.setdefault(key, [])
+            records.append(record)
+            if len(records) < self.flush_size:
+                return
+            del self.buffers[key]
+
+        self._write_records(key[0], key[1], records)
+
+    def copy_data(self, set_id, datas):
+        ''' {@inheritDocs} '''
+        assert set_id is not None
+
+        partitions = {} # Partition start => records
+        for data in datas:
+            if isinstance(data, LocalData): # Copy the raw fields, skipping the decoding
+                record = data.segment.get_record(data.index)
+            else:
+                content = data.get_content()
+                if isinstance(content, unicode):
+                    content = content.encode('utf-8')
+                location = data.get_location()
+                record = (
+                    str(data.get_datum_id()), int(location[1] * 10000000), int(location[0] * 10000000),
+                    calendar.timegm(data.get_timestamp()), content, str(data.get_type())
+                )
+            partitions.setdefault(self._get_partition(record[3]), []).append(record)
+
+        for (partition, records) in partitions.iteritems(): # Each copied batch becomes its own segments
+            self._write_records(set_id, partition, records)
+
+    def _get_partition(self, timestamp):
+        ''' @returns Start of the time partition holding the provided timestamp, in seconds since the epoch '''
+        return timestamp // self.partition_seconds * self.partition_seconds
+
+    def _write_records(self, set_id, partition, records):
+        '''
+        Writes the records out as a new segment of the partition.
+
+        @param set_id Tracking id of the set the records belong to
+        @paramType string
+        @param partition Start of the partition, in seconds since the epoch
+        @paramType int
+        @param records Records of the segment, @see segment.write_segment
+        @paramType list of tuples
+        @returns n/a
+        '''
+        partition_dir = os.path.join(self.data_dir, set_id, str(partition))
+        if not os.path.isdir(partition_dir):
+            try:
+                os.makedirs(partition_dir)
+            except OSError: # Another writer may have just created it
+                if not os.path.isdir(partition_dir):
+                    raise
+
+        file_name = os.path.join(partition_dir, new_segment_name())
+        logger.debug("Writing %s records to %s", len(records), file_name)
+        write_segment(file_name, records)
+
+    def flush(self):
+        '''
+        Writes out all of the buffered records.
+
+        @returns n/a
+        '''
+        with self.buffers_lock:
+            buffers, self.buffers = self.buffers, {}
+
+        for ((set_id, partition), records) in buffers.iteritems():
+            self._write_records(set_id, partition, records)
+
+    def filter_global_data(self, min_timestamp=None, max_timestamp=None,
+                                 min_lat=None, max_lat=None,
+                                 min_lon=None, max_lon=None,
+                                 segment_id=0, num_segments=1,
+                                 type=None
+                                 ):
+        ''' {@inheritDocs} '''
+        criteria = {
+            'min_timestamp' : calendar.timegm(min_timestamp) if min_timestamp is not None else None,
+            'max_timestamp' : calendar.timegm(max_timestamp) if max_timestamp is not None else None,
+            'min_lat' : int(min_lat * 10000000) if min_lat is not None else None,
+            'max_lat' : int(max_lat * 10000000) if max_lat is not None else None,
+            'min_lon' : int(min_lon * 10000000) if min_lon is not None else None,
+            'max_lon' : int(max_lon * 10000000) if max_lon is not None else None
+        }
+
+        return self._read_set('global', criteria, type, segment_id, num_segments)
+
+    def get_data_set(self, set_id, segment_id=0, num_segments=1):
+        ''' {@inheritDocs} '''
+        return self._read_set(set_id, {}, None, segment_id, num_segments)
+
+    def _read_set(self, set_id, criteria, type, segment_id, num_segments):
+        '''
+        Reads the set's records that satisfy the criteria, @see Segment.select. Every segment is split
+        into num_segments contiguous slices, of which only the segment_id'th is read.
+
+        @returns Matching records
+        @returnType generator of LocalData
+        '''
+        assert 0 <= segment_id and segment_id < num_segments, (segment_id, num_segments)
+
+        self.flush() # Make sure the reads see every record created so far
+
+        min_partition, max_partition = None, None
+        if criteria.get('min_timestamp') is not None:
+            min_partition = self._get_partition(criteria['min_timestamp'])
+        if criteria.get('max_timestamp') is not None:
+            max_partition = self._get_partition(criteria['max_timestamp'])
+
+        for partition in self._get_partitions(set_id):
+            if (min_partition is not None and partition < min_partition) or \
+               (max_partition is not None and partition > max_partition): # Skip partitions outside the window
+                continue
+
+            for segment in self._get_segments(set_id, partition):
+                start = len(segment) * segment_id // num_segments
+                stop  = len(segment) * (segment_id + 1) // num_segments
+                for index in segment.select(start, stop, **criteria):
+                    if type is not None and segment.get_type(index) != type:
+                        continue
+                    yield LocalData(segment, int(index), set_id)
+
+    def _get_partitions(self, set_id):
+        ''' @returns Starts of the set's partitions, in time order '''
+        set_dir = os.path.join(self.data_dir, set_id)
+        if not os.path.isdir(set_dir):
+            return []
+
+        return sorted(int(partition) for partition in os.listdir(set_dir))
+
+    def _get_segments(self, set_id, partition):
+        ''' @returns Segments of the partition, in the order they were written '''
+        partition_dir = os.path.join(self.data_dir, set_id, str(partition))
+
+        segments = []
+        for file_name in sorted(os.listdir(partition_dir)):
+            if not file_name.endswith(SEGMENT_EXTENSION): # If the segment is still being written
+                continue
+
+            file_name = os.path.join(partition_dir, file_name)
+            if file_name not in self.segments:
+                self.segments[file_name] = Segment(file_name)
+            segments.append(self.segments[file_name])
+
+        return segments
+
+    def drop_partitions_before(self, timestamp, set_id='global'):
+        '''
+        Deletes the set's partitions holding nothing but data older than the timestamp.
+
+        @param timestamp Oldest time worth keeping data from
+        @paramType time.struct_time
+        @param set_id Tracking id of the set
+        @paramType string
+        @returns Starts of the dropped partitions, in seconds since the epoch
+        @returnType list of int
+        '''
+        horizon = calendar.timegm(timestamp)
+        self.flush() # Buffered records of the expired partitions are dropped with them
+
+        dropped = []
+        for partition in self._get_partitions(set_id):
+            if partition + self.partition_seconds > horizon: # If it holds data still worth keeping
+                break
+
+            partition_dir = os.path.join(self.data_dir, set_id, str(partition))
+            for file_name in self.segments.keys():
+                if os.path.dirname(file_name) == partition_dir:
+                    del self.segments[file_name]
+            shutil.rmtree(partition_dir)
+            dropped.append(partition)
+
+        return dropped
+
+    def reconnect(self):
+        ''' {@inheritDocs} '''
+        with self.buffers_lock:
+            self.buffers = {} # The buffers belong to the parent process
+
+    def shutdown(self):
+        ''' {@inheritDocs} '''
+        self.flush()
@@ -0,0 +1,205 @@
+'''
+Task and result queue implementations backed by a SQLite database on the local disk, so several
+worker processes on one box can share the work of a job. Like SQS, a retrieved message is only
+hidden for the visibility timeout; If it isn't finished by then, i.e. its worker crashed, it is
+handed out again.
+'''
+
+import json
+import sqlite3
+import time
+
+from contextlib import closing
+
+from smcity.misc.logger import Logger
+from smcity.models.result_queue import ResultQueue
+from smcity.models.task_queue import TaskQueue
+
+logger = Logger(__name__)
+
+class LocalQueue:
+    '''
+    First in, first out queue of JSON messages stored in a table of the SQLite database. Every
+    operation opens its own connection, so a queue may be shared between threads and forked processes.
+    Retrieved messages carry two extra keys, 'message_id' and 'attempts', the # of times the message
+    has been retrieved; Both must be left unaltered for finish() to recognize the message.
+    '''
+
+    def __init__(self, file_name, table_name, visibility_timeout=300.0, clock=time.time):
+        '''
+        Constructor.
+
+        @param file_name SQLite database file the queue is stored in
+        @paramType string
+        @param table_name Table of the database holding the queue's messages
+        @paramType string
+        @param visibility_timeout # of seconds a retrieved message is hidden before it is handed out again
+        @paramType float
+        @param clock Returns the current time in seconds
+        @paramType function
+        @returns n/a
+        '''
+        assert visibility_timeout > 0, visibility_timeout
+
+        self.file_name          = file_name
+        self.table_name         = table_name
+        self.visibility_timeout = visibility_timeout
+        self.clock              = clock
+
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS %s (message_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "body TEXT NOT NULL, visible_at REAL NOT NULL, attempts INTEGER NOT NULL)" % table_name
+            )
+
+    def _connect(self):
+        ''' @returns A new connection to the queue's database, in autocommit mode '''
+        return sqlite3.connect(self.file_name, timeout=60.0, isolation_level=None)
+
+    def put(self, message):
+        '''
+        Appends the message to the queue.
+
+        @param message Message to be sent
+        @paramType JSON serializable dictionary
+        @returns n/a
+        '''
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO %s (body, visible_at, attempts) VALUES (?, 0, 0)" % self.table_name,
+                (json.dumps(message),)
+            )
+
+    def get(self):
+        '''
+        Retrieves the oldest visible message, hiding it for the visibility timeout.
+
+        @returns The message, or None if no message is visible
+        @returnType dictionary
+        '''
+        now = self.clock()
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE") # Keep the other processes from retrieving the same message
+            try:
+                row = connection.execute(
+                    "SELECT message_id, body, attempts FROM %s WHERE visible_at <= ? "
+                    "ORDER BY message_id LIMIT 1" % self.table_name, (now,)
+                ).fetchone()
+                if row is not None:
+                    connection.execute(
+                        "UPDATE %s SET visible_at = ?, attempts = attempts + 1 WHERE message_id = ?" % self.table_name,
+                        (now + self.visibility_timeout, row[0])
+                    )
+                connection.execute("COMMIT")
+            except:
+                connection.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+
+        message = json.loads(row[1])
+        message['message_id'] = row[0]
+        message['attempts']   = row[2] + 1
+        return message
+
+    def finish(self, message):
+        '''
+        Removes a retrieved message from the queue. If the message has timed out and been retrieved
+        again since, it is left for its new holder to finish.
+
+        @param message Message retrieved by get()
+        @paramType dictionary
+        @returns Whether or not the message was removed
+        @returnType boolean
+        '''
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                "DELETE FROM %s WHERE message_id = ? AND attempts = ?" % self.table_name,
+                (message['message_id'], message['attempts'])
+            )
+            if cursor.rowcount == 0:
+                logger.warn("Message %s was handed out again before it was finished", message['message_id'])
+
+            return cursor.rowcount > 0
+
+    def __len__(self):
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT COUNT(*) FROM %s" % self.table_name).fetchone()[0]
+
+def _get_queue_settings(config):
+    '''
+    @param config Configuration settings, @see LocalTaskQueue
+    @paramType ConfigParser
+    @returns (queue file, visibility timeout)
+    @returnType (string, float)
+    '''
+    visibility_timeout = 300.0
+    if config.has_option('local_queue', 'visibility_timeout'):
+        visibility_timeout = config.getfloat('local_queue', 'visibility_timeout')
+
+    return (config.get('local_queue', 'queue_file'), visibility_timeout)
+
+class LocalTaskQueue(TaskQueue):
+    ''' SQLite backed implementation of the TaskQueue. @see LocalQueue '''
+
+    def __init__(self, config):
+        '''
+        Constructor.
+
+        @param config Configuration settings. Expected definition:
+
+        Section: local_queue
+        Key:     queue_file
+        Type:    string
+        Desc:    SQLite database file the tasks and results are stored in, shared by every process
+                 using the queues
+
+        Section: local_queue
+        Key:     visibility_timeout
+        Type:    float
+        Desc:    # of seconds a retrieved task or result is hidden before it is handed out again, must
+                 outlast the longest task (Optional, default 300)
+        @paramType ConfigParser
+        @returns n/a
+        '''
+        file_name, visibility_timeout = _get_queue_settings(config)
+        self.queue = LocalQueue(file_name, 'tasks', visibility_timeout)
+
+    def finish_task(self, task):
+        ''' {@inheritDocs} '''
+        self.queue.finish(task)
+
+    def get_task(self):
+        ''' {@inheritDocs} '''
+        return self.queue.get()
+
+    def request_task(self, task):
+        ''' {@inheritDocs} '''
+        self.queue.put(task)
+
+class LocalResultQueue(ResultQueue):
+    ''' SQLite backed implementation of the ResultQueue. @see LocalQueue, LocalTaskQueue '''
+
+    def __init__(self, config):
+        '''
+        Constructor.
+
+        @param config Configuration settings, @see LocalTaskQueue
+        @paramType ConfigParser
+        @returns n/a
+        '''
+        file_name, visibility_timeout = _get_queue_settings(config)
+        self.queue = LocalQueue(file_name, 'results', visibility_timeout)
+
+    def finish_result(self, result):
+        ''' {@inheritDocs} '''
+        self.queue.finish(result)
+
+    def get_result(self):
+        ''' {@inheritDocs} '''
+        return self.queue.get()
+
+    def post_result(self, result):
+        ''' {@inheritDocs} '''
+        self.queue.put(result)
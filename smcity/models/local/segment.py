@@ -0,0 +1,167 @@
+'''
+Immutable columnar segment files of the local data store. A segment holds a batch of records as
+flat arrays: latitudes and longitudes (int32, degrees * 10^7), timestamps (int64, seconds since the
+epoch), and the utf-8 contents, datum ids and types as blobs indexed by offset arrays.
+'''
+
+import numpy
+import os
+import struct
+import time
+import uuid
+
+SEGMENT_MAGIC   = 'SMCSEG01'
+SEGMENT_VERSION = 1
+SEGMENT_HEADER  = struct.Struct('<8s5Q') # magic, version, # records, content bytes, datum id bytes, type bytes
+
+# Extension of complete segment files; Files being written use a different one until they are renamed
+SEGMENT_EXTENSION = '.seg'
+
+def new_segment_name():
+    '''
+    @returns File name for a new segment, sorting after the names of the segments written before it
+    @returnType string
+    '''
+    return '%020d-%s%s' % (int(time.time() * 1000000), uuid.uuid4().hex, SEGMENT_EXTENSION)
+
+def write_segment(file_name, records):
+    '''
+    Writes the records to a new segment file. The file is written under a temporary name and then
+    renamed, so readers never see a partial segment.
+
+    @param file_name Path of the segment file to write
+    @paramType string
+    @param records (datum id, lat * 10^7, lon * 10^7, timestamp seconds, utf-8 content, type) of each record
+    @paramType list of tuples
+    @returns n/a
+    '''
+    assert len(records) > 0
+
+    datum_ids, lats, lons, timestamps, contents, types = zip(*records)
+
+    sections = [
+        numpy.array(lats, dtype=numpy.int32),
+        numpy.array(lons, dtype=numpy.int32),
+        numpy.array(timestamps, dtype=numpy.int64),
+        _get_offsets(contents),
+        _get_offsets(datum_ids),
+        _get_offsets(types)
+    ]
+    blobs = [''.join(contents), ''.join(datum_ids), ''.join(types)]
+
+    temp_file_name = file_name + '.tmp'
+    segment = open(temp_file_name, 'wb')
+    try:
+        segment.write(SEGMENT_HEADER.pack(
+            SEGMENT_MAGIC, SEGMENT_VERSION, len(records), len(blobs[0]), len(blobs[1]), len(blobs[2])
+        ))
+        for section in [array.tobytes() for array in sections] + blobs: # Pad each section to an 8 byte boundary
+            segment.write(section)
+            segment.write('\0' * ((8 - len(section) % 8) % 8))
+    finally:
+        segment.close()
+
+    os.rename(temp_file_name, file_name)
+
+def _get_offsets(values):
+    ''' @returns Offsets of each of the values within their concatenation, plus its total length '''
+    offsets = numpy.zeros(len(values) + 1, dtype=numpy.uint64)
+    numpy.cumsum([len(value) for value in values], out=offsets[1:])
+
+    return offsets
+
+class Segment:
+    ''' Memory mapped, read only view of a segment file. @see write_segment '''
+
+    def __init__(self, file_name):
+        '''
+        Constructor.
+
+        @param file_name Path of the segment file
+        @paramType string
+        @returns n/a
+        '''
+        self.file_name = file_name
+        store = numpy.memmap(file_name, dtype=numpy.uint8, mode='r')
+
+        magic, version, num_records, content_size, datum_id_size, type_size = \
+            SEGMENT_HEADER.unpack(store[:SEGMENT_HEADER.size].tobytes())
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            raise Exception("'%s' is not a version %s segment!" % (file_name, SEGMENT_VERSION))
+
+        # Map each of the segment's sections onto an array, in the order write_segment() wrote them
+        offset = [SEGMENT_HEADER.size]
+        def section(dtype, count):
+            array = numpy.frombuffer(store, dtype=dtype, count=count, offset=offset[0])
+            offset[0] += (array.nbytes + 7) // 8 * 8
+            return array
+        self.lats             = section(numpy.int32, num_records)
+        self.lons             = section(numpy.int32, num_records)
+        self.timestamps       = section(numpy.int64, num_records)
+        self.content_offsets  = section(numpy.uint64, num_records + 1)
+        self.datum_id_offsets = section(numpy.uint64, num_records + 1)
+        self.type_offsets     = section(numpy.uint64, num_records + 1)
+        self.contents         = section(numpy.uint8, content_size)
+        self.datum_ids        = section(numpy.uint8, datum_id_size)
+        self.types            = section(numpy.uint8, type_size)
+
+    def __len__(self):
+        return len(self.lats)
+
+    def select(self, start, stop, min_timestamp=None, max_timestamp=None,
+                     min_lat=None, max_lat=None, min_lon=None, max_lon=None):
+        '''
+        Finds the records within [start, stop) that satisfy the provided criteria; Every bound is inclusive.
+
+        @param start Index of the first record to consider
+        @paramType int
+        @param stop Index after the last record to consider
+        @paramType int
+        @param min_timestamp Earliest timestamp, in seconds since the epoch
+        @paramType int
+        @param max_timestamp Latest timestamp, in seconds since the epoch
+        @paramType int
+        @param min_lat Smallest latitude * 10^7
+        @paramType int
+        @param max_lat Largest latitude * 10^7
+        @paramType int
+        @param min_lon Smallest longitude * 10^7
+        @paramType int
+        @param max_lon Largest longitude * 10^7
+        @paramType int
+        @returns Indices of the matching records, in order
+        @returnType numpy.array
+        '''
+        mask = numpy.ones(max(stop - start, 0), dtype=bool)
+        for (column, minimum, maximum) in [
+            (self.timestamps, min_timestamp, max_timestamp), (self.lats, min_lat, max_lat), (self.lons, min_lon, max_lon)
+        ]:
+            if minimum is not None:
+                mask &= column[start:stop] >= minimum
+            if maximum is not None:
+                mask &= column[start:stop] <= maximum
+
+        return numpy.flatnonzero(mask) + start
+
+    def get_content(self, index):
+        ''' @returns The utf-8 encoded content of the record '''
+        return self._get_blob(self.contents, self.content_offsets, index)
+
+    def get_datum_id(self, index):
+        ''' @returns The datum id of the record '''
+        return self._get_blob(self.datum_ids, self.datum_id_offsets, index)
+
+    def get_type(self, index):
+        ''' @returns The type of the record '''
+        return self._get_blob(self.types, self.type_offsets, index)
+
+    def get_record(self, index):
+        ''' @returns The record in the form write_segment() takes it '''
+        return (
+            self.get_datum_id(index), int(self.lats[index]), int(self.lons[index]),
+            int(self.timestamps[index]), self.get_content(index), self.get_type(index)
+        )
+
+    def _get_blob(self, blob, offsets, index):
+        ''' @returns The index'th value packed into the blob '''
+        return blob[int(offsets[index]):int(offsets[index + 1])].tobytes()
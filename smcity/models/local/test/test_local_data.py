@@ -0,0 +1,137 @@
+''' Unit tests for the LocalDataFactory class. '''
+
+import os
+import shutil
+import tempfile
+
+from ConfigParser import ConfigParser
+from time import strptime
+
+from smcity.models.local.local_data import LocalData, LocalDataFactory
+from smcity.models.test.mock_data import MockData
+
+class TestLocalDataFactory:
+    ''' Unit tests for the LocalDataFactory class. '''
+
+    def setup(self):
+        ''' Set up before each test. '''
+        self.temp_dir = tempfile.mkdtemp()
+
+        config = ConfigParser()
+        config.add_section('database')
+        config.set('database', 'local_data_dir', self.temp_dir)
+        config.set('database', 'local_partition_seconds', '3600')
+        config.set('database', 'local_flush_size', '3')
+        self.data_factory = LocalDataFactory(config)
+
+    def teardown(self):
+        ''' Clean up after each test. '''
+        shutil.rmtree(self.temp_dir)
+
+    def timestamp(self, hour, minute=0):
+        ''' @returns A timestamp on 2014-01-02 '''
+        return strptime('2014-01-02 %02d:%02d:00' % (hour, minute), '%Y-%m-%d %H:%M:%S')
+
+    def create_global_data(self):
+        ''' Creates ten global records, one every half hour from midnight at (i, -i). '''
+        for iter in range(10):
+            self.data_factory.create_data(
+                u'content \u00e9 %s' % iter, str(iter), (float(iter), float(-iter)), 'global',
+                self.timestamp(iter // 2, 30 * (iter % 2)), 'twitter' if iter != 9 else 'facebook'
+            )
+
+    def test_create_data(self):
+        ''' Tests that created records read back unchanged. '''
+        self.create_global_data()
+
+        datas = list(self.data_factory.filter_global_data())
+        assert [data.get_datum_id() for data in datas] == [str(iter) for iter in range(10)], datas
+
+        data = datas[3]
+        assert isinstance(data, LocalData)
+        assert data.get_content() == u'content \u00e9 3', data.get_content()
+        assert data.get_location() == (3.0, -3.0), data.get_location()
+        assert data.get_set_id() == 'global', data.get_set_id()
+        assert data.get_timestamp() == self.timestamp(1, 30), data.get_timestamp()
+        assert data.get_type() == 'twitter', data.get_type()
+
+    def test_time_partitions(self):
+        ''' Tests that records are written into hourly partitions of segments. '''
+        self.create_global_data()
+        self.data_factory.shutdown()
+
+        partitions = sorted(os.listdir(os.path.join(self.temp_dir, 'global')), key=int)
+        assert len(partitions) == 5, partitions
+        for partition in partitions:
+            segments = os.listdir(os.path.join(self.temp_dir, 'global', partition))
+            assert len(segments) == 1, segments
+            assert segments[0].endswith('.seg'), segments
+
+    def test_filter_global_data(self):
+        ''' Tests filtering the global data. '''
+        self.create_global_data()
+
+        datas = self.data_factory.filter_global_data(
+            min_timestamp=self.timestamp(1), max_timestamp=self.timestamp(3, 30),
+            min_lat=-8.0, max_lat=-3.0, min_lon=3.0, max_lon=9.0, type='twitter'
+        )
+        assert [data.get_datum_id() for data in datas] == ['3', '4', '5', '6', '7'], datas
+
+        datas = self.data_factory.filter_global_data(min_lat=-1.5, max_lat=0.0)
+        assert [data.get_datum_id() for data in datas] == ['0', '1'], datas
+
+    def test_filter_global_data_segments(self):
+        ''' Tests that the segments of a filter cover its results exactly once. '''
+        self.create_global_data()
+
+        datum_ids = []
+        for segment_id in range(3):
+            datas = self.data_factory.filter_global_data(
+                min_timestamp=self.timestamp(1), segment_id=segment_id, num_segments=3
+            )
+            datum_ids.extend(data.get_datum_id() for data in datas)
+
+        assert sorted(datum_ids, key=int) == [str(iter) for iter in range(2, 10)], datum_ids
+
+    def test_copy_data(self):
+        ''' Tests copying records into a set. '''
+        self.create_global_data()
+
+        self.data_factory.copy_data('set', list(self.data_factory.filter_global_data(max_lat=-7.0)))
+        self.data_factory.copy_data('set', [MockData({
+            'content' : u'mock \u00e9', 'id' : 'mock', 'location' : (1.5, 2.5),
+            'timestamp' : self.timestamp(12), 'type' : 'twitter'
+        })])
+
+        datas = list(self.data_factory.get_data_set('set'))
+        assert [data.get_datum_id() for data in datas] == ['7', '8', '9', 'mock'], datas
+        assert datas[2].get_content() == u'content \u00e9 9', datas[2].get_content()
+        assert datas[2].get_type() == 'facebook', datas[2].get_type()
+        assert datas[3].get_content() == u'mock \u00e9', datas[3].get_content()
+        assert datas[3].get_location() == (1.5, 2.5), datas[3].get_location()
+        assert datas[3].get_set_id() == 'set', datas[3].get_set_id()
+
+        datum_ids = []
+        for segment_id in range(2):
+            datum_ids.extend(data.get_datum_id() for data in self.data_factory.get_data_set('set', segment_id, 2))
+        assert sorted(datum_ids) == ['7', '8', '9', 'mock'], datum_ids
+
+        assert list(self.data_factory.get_data_set('missing')) == []
+
+    def test_reconnect(self):
+        ''' Tests that a reconnected factory drops the records buffered by its parent. '''
+        self.data_factory.create_data('content', 'id', (1.0, 1.0), 'global', self.timestamp(0), 'twitter')
+        self.data_factory.reconnect()
+
+        assert list(self.data_factory.filter_global_data()) == []
+
+    def test_drop_partitions_before(self):
+        ''' Tests that only the partitions holding nothing but expired data are dropped. '''
+        self.create_global_data()
+
+        dropped = self.data_factory.drop_partitions_before(self.timestamp(2, 30))
+        assert len(dropped) == 2, dropped
+
+        datas = self.data_factory.filter_global_data()
+        assert [data.get_datum_id() for data in datas] == [str(iter) for iter in range(4, 10)], datas
+        assert len(os.listdir(os.path.join(self.temp_dir, 'global'))) == 3
@@ -0,0 +1,94 @@
+''' Unit tests for the LocalQueue, LocalTaskQueue and LocalResultQueue classes. '''
+
+import os
+import shutil
+import tempfile
+
+from ConfigParser import ConfigParser
+
+from smcity.models.local.local_queue import LocalQueue, LocalResultQueue, LocalTaskQueue
+
+class FakeClock:
+    ''' Clock that only moves when told to. '''
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+class TestLocalQueue:
+    ''' Unit tests for the LocalQueue class. '''
+
+    def setup(self):
+        ''' Set up before each test. '''
+        self.temp_dir  = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.temp_dir, 'queue.db')
+        self.clock     = FakeClock()
+        self.queue     = LocalQueue(self.file_name, 'tasks', visibility_timeout=60, clock=self.clock.time)
+
+    def teardown(self):
+        ''' Clean up after each test. '''
+        shutil.rmtree(self.temp_dir)
+
+    def test_first_in_first_out(self):
+        ''' Tests that messages are handed out once each, oldest first. '''
+        self.queue.put({'task' : 'first'})
+        self.queue.put({'task' : 'second'})
+
+        first  = self.queue.get()
+        second = self.queue.get()
+        assert first['task'] == 'first' and first['attempts'] == 1, first
+        assert second['task'] == 'second', second
+        assert self.queue.get() is None
+
+        assert self.queue.finish(first)
+        assert self.queue.finish(second)
+        assert len(self.queue) == 0, len(self.queue)
+
+    def test_visibility_timeout(self):
+        ''' Tests that a message which isn't finished in time is handed out again. '''
+        self.queue.put({'task' : 'first'})
+        message = self.queue.get()
+
+        self.clock.now += 59
+        assert self.queue.get() is None
+
+        self.clock.now += 1
+        retry = self.queue.get()
+        assert retry['task'] == 'first' and retry['attempts'] == 2, retry
+
+        # Only the latest holder may finish the message
+        assert not self.queue.finish(message)
+        assert len(self.queue) == 1, len(self.queue)
+        assert self.queue.finish(retry)
+        assert len(self.queue) == 0, len(self.queue)
+
+    def test_shared_file(self):
+        ''' Tests that queues opened on the same file share their messages. '''
+        other_queue = LocalQueue(self.file_name, 'tasks', visibility_timeout=60, clock=self.clock.time)
+        self.queue.put({'task' : 'first'})
+
+        assert other_queue.get()['task'] == 'first'
+        assert self.queue.get() is None
+
+    def test_task_and_result_queues(self):
+        ''' Tests that the task and result queues keep their messages apart. '''
+        config = ConfigParser()
+        config.add_section('local_queue')
+        config.set('local_queue', 'queue_file', self.file_name)
+        task_queue   = LocalTaskQueue(config)
+        result_queue = LocalResultQueue(config)
+
+        task_queue.request_task({'task' : 'count_data', 'data_set_id' : 'set'})
+        result_queue.post_result({'count' : 3})
+
+        task = task_queue.get_task()
+        assert task['task'] == 'count_data', task
+        assert task_queue.get_task() is None
+        task_queue.finish_task(task)
+
+        result = result_queue.get_result()
+        assert result['count'] == 3, result
+        result_queue.finish_result(result)
+        assert len(task_queue.queue) == 0 and len(result_queue.queue) == 0
@@ -25,14 +25,12 @@ class ResultQueue:
         '''
         raise NotImplementedError()
 
-    def post_result(self, set_id, results={}):
+    def post_result(self, result):
         '''
-        Submits the results of a count tweet task.
+        Submits the results of a task.
 
-        @param set_id Tracking id of the produced data set
-        @paramType string/uuid
-        @param results Features of the resuls
-        @paramType dictionary
+        @param result Features of the results, i.e. the tracking id of the produced data set
+        @paramType JSON serializable dictionary
         @returns n/a
         '''
         raise NotImplementedError()
@@ -0,0 +1,139 @@
+''' Driver that overlaps a job's global data scans with its data set writes. '''
+
+from Queue import Empty, Queue
+from threading import Lock, Thread
+
+from smcity.misc.logger import Logger
+
+logger = Logger(__name__)
+
+class ScanWriteDriver:
+    '''
+    Runs the scan segments of a job on a bounded number of scanning threads while their batch writes
+    are handed off to a bounded pool of writer threads. Scanning never waits on a write unless
+    max_pending_writes batches are already queued, so reads and writes stay in flight together.
+    '''
+
+    def __init__(self, data_factory, max_scans=4, max_writes=4, max_pending_writes=None):
+        '''
+        Constructor.
+
+        @param data_factory Interface the batches are written through
+        @paramType DataFactory
+        @param max_scans Maximum # of segments scanned at once
+        @paramType int
+        @param max_writes Maximum # of batch writes in flight at once
+        @paramType int
+        @param max_pending_writes Maximum # of batches queued for the writers before scanning blocks;
+        If None, twice max_writes
+        @paramType int
+        @returns n/a
+        '''
+        assert data_factory is not None
+        assert max_scans > 0, max_scans
+        assert max_writes > 0, max_writes
+
+        self.data_factory       = data_factory
+        self.max_scans          = max_scans
+        self.max_writes         = max_writes
+        self.max_pending_writes = max_pending_writes if max_pending_writes is not None else 2 * max_writes
+        self.write_queue        = None
+        self.errors             = []
+        self.errors_lock        = Lock()
+
+    def copy_data(self, set_id, datas):
+        '''
+        Queues the batch of data points to be copied into the set. @see DataFactory.copy_data
+
+        @param set_id Tracking id of the set to which the data copy should belong
+        @paramType string/uuid
+        @param datas Data records to copy to the new data set
+        @paramType list of Data
+        @returns n/a
+        '''
+        assert self.write_queue is not None, "copy_data() may only be used while run() is running!"
+
+        if len(self.errors) > 0: # If a write already failed, stop scanning
+            raise self.errors[0]
+
+        self.write_queue.put((set_id, datas))
+
+    def run(self, scan_function, segment_ids, kwargs):
+        '''
+        Runs the scan function over each of the segments and waits for all of the queued writes.
+
+        @param scan_function Scans a single segment, writing through this driver's copy_data()
+        @paramType function(segment_id, **kwargs)
+        @param segment_ids Segments to be scanned
+        @paramType list of int
+        @param kwargs Arguments shared by every segment
+        @paramType dictionary
+        @returns Result of the scan function for each segment
+        @returnType list
+        '''
+        self.write_queue = Queue(self.max_pending_writes)
+        self.errors      = []
+        results          = [None] * len(segment_ids)
+
+        writers = [Thread(target=self._write) for iter in range(self.max_writes)]
+        for writer in writers:
+            writer.start()
+
+        # Hand the segments out to a bounded number of scanning threads
+        segment_queue = Queue()
+        for iter in range(len(segment_ids)):
+            segment_queue.put(iter)
+
+        def scan():
+            while True:
+                try:
+                    iter = segment_queue.get_nowait()
+                except Empty: # If every segment has been handed out
+                    return
+
+                try:
+                    results[iter] = scan_function(segment_id = segment_ids[iter], **kwargs)
+                except Exception as error:
+                    logger.exception()
+                    self._record_error(error)
+                    return
+
+        scanners = [Thread(target=scan) for iter in range(min(self.max_scans, len(segment_ids)))]
+        for scanner in scanners:
+            scanner.start()
+        for scanner in scanners:
+            scanner.join()
+
+        # Let the writers drain the queue before shutting them down
+        for writer in writers:
+            self.write_queue.put(None)
+        for writer in writers:
+            writer.join()
+        self.write_queue = None
+
+        if len(self.errors) > 0: # If any scan or write failed, fail the whole job
+            raise self.errors[0]
+
+        return results
+
+    def _record_error(self, error):
+        ''' Records a failed scan or write. '''
+        with self.errors_lock:
+            self.errors.append(error)
+
+    def _write(self):
+        ''' Writer thread loop, commits queued batches until it receives the None sentinel. '''
+        while True:
+            batch = self.write_queue.get()
+            if batch is None: # If the job is finished
+                return
+
+            if len(self.errors) > 0: # If the job already failed, just drain the queue
+                continue
+
+            set_id, datas = batch
+            try:
+                self.data_factory.copy_data(set_id, datas)
+            except Exception as error:
+                logger.exception()
+                self._record_error(error)
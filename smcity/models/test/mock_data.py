@@ -29,6 +29,9 @@ class MockData:
 class MockDataFactory:
     ''' Mock implementation of the DataFactory class. '''
 
+    def __init__(self):
+        self.copied_sets = {}
+
     def create_data(self, content, id, location, set_id, timestamp, type):
         ''' {@inheritDocs} '''
         self.created_data = {
@@ -44,6 +47,7 @@ class MockDataFactory:
         ''' {@inheritDocs} '''
         self.copied_data        = data
         self.copied_data_set_id = set_id
+        self.copied_sets.setdefault(set_id, []).extend(data)
 
     def filter_global_data(self, min_timestamp=None, max_timestamp=None,
                                  min_lat=None, max_lat=None,
@@ -53,6 +57,14 @@ class MockDataFactory:
         ''' {@inheritDocs} '''
         return self.data
 
-    def get_data_set(self, set_id):
+    def get_data_set(self, set_id, segment_id=0, num_segments=1):
         ''' {@inheritDocs} '''
-        return self.data
+        return self.data[segment_id::num_segments]
+
+    def reconnect(self):
+        ''' {@inheritDocs} '''
+        self.reconnected = True
+
+    def shutdown(self):
+        ''' {@inheritDocs} '''
+        self.is_shut_down = True
@@ -0,0 +1,236 @@
+''' Mock implementation of the DynamoDB2 connection the AWS models are built on. '''
+
+from boto.dynamodb2.exceptions import ConditionalCheckFailedException, ResourceNotFoundException, ValidationException
+from ConfigParser import ConfigParser
+
+class MockConnection:
+    '''
+    In memory stand-in for a boto.dynamodb2.layer1.DynamoDBConnection. Tables hold raw records, as
+    DynamoDB returns them, and every request is recorded. Scan filters are recorded, not applied.
+    '''
+
+    def __init__(self, table_names=(), key_fields=('datum_id',), list_page_size=100):
+        '''
+        Constructor.
+
+        @param table_names Names of the tables that exist to begin with
+        @paramType list of string
+        @param key_fields Names of the key attributes of those tables
+        @paramType tuple of string
+        @param list_page_size # of table names list_tables() returns per page
+        @paramType int
+        @returns n/a
+        '''
+        self.items              = {} # Table name => raw records, in write order
+        self.key_fields         = {} # Table name => names of the key attributes
+        self.pages              = {} # (table name, segment) => pages of raw records scan() serves instead
+        self.requests           = [] # (operation, table name, arguments) of each request
+        self.batches            = [] # (table name, processed write requests) of each batch write
+        self.list_page_size     = list_page_size
+        self.num_unprocessed    = 0 # # of upcoming batch write requests to leave unprocessed
+        self.capacity_per_item  = 1.0 # Capacity units each record read or written consumes
+        self.on_write           = None # Called after each batch write
+
+        for table_name in table_names:
+            self.add_table(table_name, key_fields)
+
+    def add_table(self, table_name, key_fields=('datum_id',), items=None):
+        '''
+        Creates a table.
+
+        @param table_name Name of the table
+        @paramType string
+        @param key_fields Names of the key attributes
+        @paramType tuple of string
+        @param items Raw records the table holds
+        @paramType list of dictionaries
+        @returns n/a
+        '''
+        self.items[table_name]      = list(items) if items is not None else []
+        self.key_fields[table_name] = tuple(key_fields)
+
+    def get_requests(self, table_name, operation=None):
+        '''
+        @param table_name Name of a table
+        @paramType string
+        @param operation If set, only the requests of the operation are returned
+        @paramType string
+        @returns Arguments of each request made against the table
+        @returnType list of dictionaries
+        '''
+        return [
+            arguments for (request_operation, request_table_name, arguments) in self.requests
+            if request_table_name == table_name and operation in (None, request_operation)
+        ]
+
+    def _get_items(self, table_name):
+        if table_name not in self.items:
+            raise ResourceNotFoundException(400, 'Bad Request', {'message' : 'Requested resource not found'})
+        return self.items[table_name]
+
+    def _get_key(self, table_name, raw_item):
+        return tuple(tuple(raw_item[field].items()) for field in self.key_fields[table_name] if field in raw_item)
+
+    def _find(self, table_name, raw_key):
+        key = self._get_key(table_name, raw_key)
+        for (index, raw_item) in enumerate(self._get_items(table_name)):
+            if self._get_key(table_name, raw_item) == key:
+                return index
+        return None
+
+    def _store(self, table_name, raw_item):
+        index = self._find(table_name, raw_item)
+        if index is None:
+            self.items[table_name].append(raw_item)
+        else:
+            self.items[table_name][index] = raw_item
+
+    def _consumed(self, response, table_name, num_items, return_consumed_capacity):
+        if return_consumed_capacity is not None:
+            response['ConsumedCapacity'] = {
+                'TableName' : table_name, 'CapacityUnits' : self.capacity_per_item * max(num_items, 1)
+            }
+        return response
+
+    def list_tables(self, exclusive_start_table_name=None, limit=None):
+        names = sorted(
+            name for name in self.items if exclusive_start_table_name is None or name > exclusive_start_table_name
+        )
+        response = {'TableNames' : names[:self.list_page_size]}
+        if len(names) > self.list_page_size:
+            response['LastEvaluatedTableName'] = names[self.list_page_size - 1]
+        return response
+
+    def create_table(self, table_name, key_schema=None, **kwargs):
+        self.requests.append(('create_table', table_name, kwargs))
+        self.add_table(table_name, [field['AttributeName'] for field in key_schema or []] or ('datum_id',))
+        return {'TableDescription' : {'TableName' : table_name}}
+
+    def delete_table(self, table_name):
+        self.requests.append(('delete_table', table_name, {}))
+        self._get_items(table_name)
+        del self.items[table_name]
+        del self.key_fields[table_name]
+
+    def scan(self, table_name, exclusive_start_key=None, segment=None, total_segments=None,
+                   return_consumed_capacity=None, **kwargs):
+        self.requests.append(('scan', table_name, dict(
+            kwargs, segment=segment, total_segments=total_segments, exclusive_start_key=exclusive_start_key
+        )))
+
+        pages = self.pages.get((table_name, segment))
+        if pages is None: # Serve the stored records, split between the segments
+            items = self._get_items(table_name)[(segment or 0)::(total_segments or 1)]
+            pages = [items[start:start + 100] for start in range(0, len(items), 100)] or [[]]
+
+        page_id = 0 if exclusive_start_key is None else int(exclusive_start_key['page']['N']) + 1
+        response = {'Items' : pages[page_id], 'Count' : len(pages[page_id])}
+        if page_id + 1 < len(pages):
+            response['LastEvaluatedKey'] = {'page' : {'N' : str(page_id)}}
+
+        return self._consumed(response, table_name, len(pages[page_id]), return_consumed_capacity)
+
+    def query(self, table_name, key_conditions=None, return_consumed_capacity=None, **kwargs):
+        self.requests.append(('query', table_name, dict(kwargs, key_conditions=key_conditions)))
+
+        items = [
+            raw_item for raw_item in self._get_items(table_name)
+            if all(
+                raw_item.get(field) == condition['AttributeValueList'][0]
+                for (field, condition) in (key_conditions or {}).items()
+            )
+        ]
+        return self._consumed({'Items' : items, 'Count' : len(items)}, table_name, len(items), return_consumed_capacity)
+
+    def batch_get_item(self, request_items, return_consumed_capacity=None):
+        responses = {}
+        for (table_name, request) in request_items.items():
+            self.requests.append(('batch_get_item', table_name, request))
+            responses[table_name] = [
+                self.items[table_name][index] for index in
+                [self._find(table_name, raw_key) for raw_key in request['Keys']] if index is not None
+            ]
+
+        return {'Responses' : responses, 'UnprocessedKeys' : {}}
+
+    def batch_write_item(self, request_items, return_consumed_capacity=None):
+        response = {'UnprocessedItems' : {}}
+        consumed = []
+        for (table_name, requests) in request_items.items():
+            self.requests.append(('batch_write_item', table_name, {
+                'requests' : requests, 'return_consumed_capacity' : return_consumed_capacity
+            }))
+            self._get_items(table_name)
+
+            keys = [
+                self._get_key(table_name, request['PutRequest']['Item'] if 'PutRequest' in request else
+                                          request['DeleteRequest']['Key'])
+                for request in requests
+            ]
+            if len(requests) > 25:
+                raise ValidationException(400, 'Bad Request', {'message' : 'Too many items requested'})
+            if len(set(keys)) < len(keys): # DynamoDB rejects the whole batch
+                raise ValidationException(400, 'Bad Request', {'message' : 'Provided list of item keys contains duplicates'})
+
+            unprocessed = requests[:self.num_unprocessed]
+            self.num_unprocessed -= len(unprocessed)
+            processed = requests[len(unprocessed):]
+            self.batches.append((table_name, processed))
+
+            for request in processed:
+                if 'PutRequest' in request:
+                    self._store(table_name, request['PutRequest']['Item'])
+                else:
+                    index = self._find(table_name, request['DeleteRequest']['Key'])
+                    if index is not None:
+                        del self.items[table_name][index]
+
+            if len(unprocessed) > 0:
+                response['UnprocessedItems'][table_name] = unprocessed
+            consumed.append({'TableName' : table_name, 'CapacityUnits' : self.capacity_per_item * len(requests)})
+
+        if return_consumed_capacity is not None:
+            response['ConsumedCapacity'] = consumed
+        if self.on_write is not None:
+            self.on_write()
+
+        return response
+
+    def put_item(self, table_name, item, expected=None, return_consumed_capacity=None, **kwargs):
+        self.requests.append(('put_item', table_name, dict(kwargs, item=item, expected=expected)))
+
+        index = self._find(table_name, item)
+        for (field, expectation) in (expected or {}).items():
+            if index is not None and expectation.get('Exists') is False and field in self.items[table_name][index]:
+                raise ConditionalCheckFailedException(400, 'Bad Request', {'message' : 'The conditional request failed'})
+
+        self._store(table_name, item)
+        return self._consumed({}, table_name, 1, return_consumed_capacity)
+
+def mock_config(**options):
+    '''
+    @param options Additional database settings
+    @returns Configuration settings of an AwsDataFactory over the tables of mock_connection()
+    @returnType ConfigParser
+    '''
+    config = ConfigParser()
+    config.add_section('database')
+    config.set('database', 'global_data_table', 'global_data')
+    config.set('database', 'set_data_table', 'set_data')
+    for (key, value) in options.items():
+        config.set('database', key, str(value))
+
+    return config
+
+def mock_connection(global_items=None):
+    '''
+    @param global_items Raw records the global data table holds
+    @paramType list of dictionaries
+    @returns A MockConnection with the global and set data tables of mock_config()
+    @returnType MockConnection
+    '''
+    connection = MockConnection()
+    connection.add_table('global_data', items=global_items)
+    connection.add_table('set_data', key_fields=('set_id', 'datum_id'))
+
+    return connection
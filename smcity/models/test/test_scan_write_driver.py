@@ -0,0 +1,62 @@
+''' Unit tests for the ScanWriteDriver class. '''
+
+import time
+
+from threading import Lock
+
+from smcity.models.scan_write_driver import ScanWriteDriver
+from smcity.models.test.mock_data import MockData, MockDataFactory
+
+class SlowDataFactory(MockDataFactory):
+    ''' Data factory whose writes take a while and track how many are in flight at once. '''
+
+    def __init__(self, fail_set_id=None):
+        MockDataFactory.__init__(self)
+        self.fail_set_id    = fail_set_id
+        self.in_flight      = 0
+        self.max_in_flight  = 0
+        self.in_flight_lock = Lock()
+
+    def copy_data(self, set_id, datas):
+        if set_id == self.fail_set_id:
+            raise IOError("Write failed!")
+
+        with self.in_flight_lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.in_flight_lock:
+            self.in_flight -= 1
+            MockDataFactory.copy_data(self, set_id, datas)
+
+class TestScanWriteDriver:
+    ''' Tests the ScanWriteDriver class. '''
+
+    def scan(self, segment_id, writer, num_batches, set_id='out_set'):
+        ''' Mock scan function that writes num_batches single data point batches. '''
+        for iter in range(num_batches):
+            writer.copy_data(set_id, [MockData({'id' : '%s-%s' % (segment_id, iter)})])
+
+        return segment_id * 10
+
+    def test_run(self):
+        ''' Tests that all of the segments are scanned and all of their batches written. '''
+        data_factory = SlowDataFactory()
+        driver = ScanWriteDriver(data_factory, max_scans=2, max_writes=3)
+
+        results = driver.run(self.scan, range(5), {'num_batches' : 4, 'writer' : driver})
+
+        assert results == [0, 10, 20, 30, 40], results
+        assert len(data_factory.copied_sets['out_set']) == 20, len(data_factory.copied_sets['out_set'])
+        assert 1 < data_factory.max_in_flight <= 3, data_factory.max_in_flight
+
+    def test_write_error(self):
+        ''' Tests that a failed write fails the whole run. '''
+        data_factory = SlowDataFactory(fail_set_id='bad_set')
+        driver = ScanWriteDriver(data_factory, max_scans=2, max_writes=2)
+
+        try:
+            driver.run(self.scan, range(3), {'num_batches' : 4, 'set_id' : 'bad_set', 'writer' : driver})
+            assert False, "run() should have raised the write error!"
+        except IOError:
+            pass
@@ -1,33 +1,177 @@
 ''' Polygon strategy that facilitates performing analytics on complex polygons. '''
 
-from sympy.geometry.point import Point
-from sympy.geometry.polygon import Polygon
+import hashlib
+import numpy
+import struct
 
+from smcity.polygons.point_in_polygon import EdgeTable
+from smcity.polygons.polygon_raster import BOUNDARY, INSIDE, PolygonRaster
 from smcity.polygons.polygon_strategy import PolygonStrategy
+from smcity.polygons.simplification import douglas_peucker, max_deviation
+
+# Polygon store file layout: a header of counts followed by 8 byte aligned arrays
+BINARY_MAGIC   = 'SMCPOLY1'
+BINARY_VERSION = 1
+BINARY_HEADER  = struct.Struct('<8s6Q') # magic, version, # polygons, # sub-polygons, # rings, # points, # cells
 
 class ComplexPolygonStrategy(PolygonStrategy):
     ''' Polygon strategy that facilitates performing analytics on complex polygons. '''
 
-    def __init__(self, sub_polygons):
+    def __init__(self, sub_polygons, sub_polygon_holes=None, raster_resolution=64, raster_cells=None):
         '''
         Constructor.
 
-        @param Ordered sequence of points describing the polygon.
-        @paramType List of (x, y) tuples
+        @param sub_polygons Ordered sequences of points describing the polygon's exterior rings.
+        @paramType List of lists of (x, y) tuples
+        @param sub_polygon_holes Interior rings cut out of each sub-polygon; If None, there are no holes
+        @paramType List (one entry per sub-polygon) of lists of lists of (x, y) tuples
+        @param raster_resolution # of raster cells along the longer side of each sub-polygon
+        @paramType int
+        @param raster_cells Precomputed raster cell classifications of each sub-polygon; If None, they
+        are computed from the rings
+        @paramType List (one entry per sub-polygon) of numpy.ndarray of int8
         @returns n/a
         '''
         assert len(sub_polygons) > 0, len(sub_polygons)
+        assert sub_polygon_holes is None or len(sub_polygon_holes) == len(sub_polygons), sub_polygon_holes
+        assert raster_cells is None or len(raster_cells) == len(sub_polygons), raster_cells
 
         self.bounding_box       = None # Lazily calculate bounding box
+        self.raster_resolution  = raster_resolution
         self.sub_polygon_points = []
-        self.sympy_sub_polygons = []
+        self.sub_polygon_holes  = []
+
+        for iter in range(len(sub_polygons)): # For each raw sub-polygon
+            holes = []
+            if sub_polygon_holes is not None:
+                holes = sub_polygon_holes[iter]
+
+            for ring in [sub_polygons[iter]] + holes:
+                if ring[0] != ring[-1]: # If the ring is not a closed loop
+                    ring.append(ring[0]) # Close the loop
+
+            self.sub_polygon_points.append(sub_polygons[iter])
+            self.sub_polygon_holes.append(holes)
+
+        self._build_point_tests(raster_cells)
+
+    def __setstate__(self, state):
+        ''' Rebuilds the point tests when loading polygons pickled before they existed. '''
+        self.__dict__.update(state)
+
+        if 'sub_polygon_rasters' not in state:
+            self.__dict__.pop('sympy_polygon', None)
+            self.__dict__.pop('sympy_sub_polygons', None)
+            if 'points' in state: # If this predates multi-part polygons
+                self.sub_polygon_points = [self.__dict__.pop('points')]
+            self.raster_resolution = state.get('raster_resolution', 64)
+            self.sub_polygon_holes = state.get('sub_polygon_holes', [[] for points in self.sub_polygon_points])
+            self._build_point_tests()
+
+    def _build_point_tests(self, raster_cells=None):
+        '''
+        Precomputes the exact edge tables and the coarse rasters of each sub-polygon.
+
+        @param raster_cells Precomputed raster cell classifications of each sub-polygon
+        @paramType List of numpy.ndarray of int8
+        @returns n/a
+        '''
+        self.sub_polygon_edges   = []
+        self.sub_polygon_hulls   = [None] * len(self.sub_polygon_points) # @see simplify
+        self.sub_polygon_rasters = []
+
+        for iter in range(len(self.sub_polygon_points)):
+            # Holes are honored by the even-odd rule as long as they share the exterior ring's edge table
+            rings = [self.sub_polygon_points[iter]] + self.sub_polygon_holes[iter]
+            cells = raster_cells[iter] if raster_cells is not None else None
+
+            edge_table = EdgeTable(rings)
+            self.sub_polygon_edges.append(edge_table)
+            self.sub_polygon_rasters.append(PolygonRaster(rings, edge_table, self.raster_resolution, cells))
+
+    def contains_points(self, lons, lats):
+        '''
+        Determines which of the provided points are inside the polygon.
+
+        @param lons Longitudes of the points
+        @paramType numpy.ndarray of float
+        @param lats Latitudes of the points
+        @paramType numpy.ndarray of float
+        @returns Whether or not each point is inside the polygon
+        @returnType numpy.ndarray of bool
+        '''
+        lons = numpy.asarray(lons, dtype=numpy.float64)
+        lats = numpy.asarray(lats, dtype=numpy.float64)
+
+        # Only run the sub-polygon tests on the points inside the bounding box
+        bounding_box = self.get_bounding_box()
+        is_inside = (lons >= bounding_box['min_lon']) & (lons <= bounding_box['max_lon']) & \
+                    (lats >= bounding_box['min_lat']) & (lats <= bounding_box['max_lat'])
+        candidates = numpy.flatnonzero(is_inside)
+        is_inside[:] = False
 
-        for sub_polygon in sub_polygons: # For each raw sub-polygon
-            if sub_polygon[0] != sub_polygon[-1]: # If the sub-polygon is not a closed loop
-                sub_polygon.append(sub_polygon[0]) # Close the loop
+        for iter in range(len(self.sub_polygon_points)):
+            if len(candidates) == 0: # If every candidate has been placed
+                break
 
-            self.sub_polygon_points.append(sub_polygon)
-            self.sympy_sub_polygons.append(Polygon(*(sub_polygon[:-1])))
+            # Settle the points in fully inside/outside cells, only boundary cells need the exact test
+            classes = self.sub_polygon_rasters[iter].classify_many(lons[candidates], lats[candidates])
+            is_in_sub_polygon = classes == INSIDE
+            on_boundary = numpy.flatnonzero(classes == BOUNDARY)
+            if len(on_boundary) > 0:
+                boundary_candidates = candidates[on_boundary]
+                is_in_sub_polygon[on_boundary] = self._contains_boundary_points(
+                    iter, lons[boundary_candidates], lats[boundary_candidates]
+                )
+
+            is_inside[candidates[is_in_sub_polygon]] = True
+            candidates = candidates[~is_in_sub_polygon]
+
+        return is_inside
+
+    def _contains_boundary_points(self, sub_polygon, lons, lats):
+        '''
+        Determines which of the provided points, all near the sub-polygon's boundary, are inside it.
+
+        @param sub_polygon Position of the sub-polygon to test against
+        @paramType int
+        @param lons Longitudes of the points
+        @paramType numpy.ndarray of float
+        @param lats Latitudes of the points
+        @paramType numpy.ndarray of float
+        @returns Whether or not each point is inside the sub-polygon
+        @returnType numpy.ndarray of bool
+        '''
+        edge_table = self.sub_polygon_edges[sub_polygon]
+        hull       = self.sub_polygon_hulls[sub_polygon]
+        if hull is None: # If there is no simplified hull to pre-test against
+            return edge_table.contains_many(lons, lats)
+
+        # Points farther from the simplified rings than they stray from the exact rings get the same answer
+        hull_edge_table, margin = hull
+        is_inside    = hull_edge_table.contains_many(lons, lats)
+        is_undecided = numpy.flatnonzero(hull_edge_table.distance_many(lons, lats) <= margin)
+        if len(is_undecided) > 0:
+            is_inside[is_undecided] = edge_table.contains_many(lons[is_undecided], lats[is_undecided])
+
+        return is_inside
+
+    def _simplify_rings(self, rings, tolerance, simplifier):
+        '''
+        Simplifies each of the provided rings.
+
+        @returns The simplified rings and the largest distance a dropped point lies from them
+        @returnType (list of lists of (x, y) tuples, float)
+        '''
+        simplified_rings = []
+        deviation = 0.0
+
+        for ring in rings:
+            kept = simplifier(ring, tolerance)
+            simplified_rings.append([ring[iter] for iter in kept])
+            deviation = max(deviation, max_deviation(ring, kept))
+
+        return (simplified_rings, deviation)
 
     def get_bounding_box(self):
         ''' {@inheritDocs} '''
@@ -62,24 +206,73 @@ class ComplexPolygonStrategy(PolygonStrategy):
         ''' {@inheritDocs} '''
         return self.sub_polygon_points
 
+    def get_simplified_outline(self, tolerance, simplifier=douglas_peucker):
+        '''
+        Generates a lower resolution outline of the polygon for display purposes.
+
+        @param tolerance Simplification tolerance in degrees, @see smcity.polygons.simplification
+        @paramType float
+        @param simplifier Ring simplification algorithm to apply
+        @paramType function(ring, tolerance) returning the positions of the points to keep
+        @returns Simplified outline of each sub-polygon
+        @returnType list of lists of (lon/float, lat/float)
+        '''
+        return self._simplify_rings(self.sub_polygon_points, tolerance, simplifier)[0]
+
+    def simplify(self, tolerance, simplifier=douglas_peucker):
+        '''
+        Builds a simplified hull of each sub-polygon that is used to settle points near the boundary
+        before falling back to the exact polygon. The hull is conservative: only points within the
+        measured simplification error of the hull's edges take the exact test.
+
+        @param tolerance Simplification tolerance in degrees, @see smcity.polygons.simplification
+        @paramType float
+        @param simplifier Ring simplification algorithm to apply
+        @paramType function(ring, tolerance) returning the positions of the points to keep
+        @returns n/a
+        '''
+        for iter in range(len(self.sub_polygon_points)):
+            rings = [self.sub_polygon_points[iter]] + self.sub_polygon_holes[iter]
+            simplified_rings, deviation = self._simplify_rings(rings, tolerance, simplifier)
+
+            # Pad the margin so floating point error in the distance test can't flip a decision
+            self.sub_polygon_hulls[iter] = (EdgeTable(simplified_rings), deviation * (1 + 1e-9) + 1e-12)
+
+    def filter_many(self, datas):
+        ''' {@inheritDocs} '''
+        if len(datas) == 0:
+            return []
+
+        locations = numpy.array([data.get_location() for data in datas], dtype=numpy.float64)
+
+        return (~self.contains_points(locations[:, 0], locations[:, 1])).tolist()
+
+    def get_cache_key(self):
+        ''' {@inheritDocs} '''
+        geometry = hashlib.sha1()
+        for iter in range(len(self.sub_polygon_points)): # Hash the coordinates of every ring
+            for ring in [self.sub_polygon_points[iter]] + self.sub_polygon_holes[iter]:
+                points = numpy.asarray(ring, dtype=numpy.float64)
+                geometry.update(struct.pack('<2Q', iter, len(points)))
+                geometry.update(points.tobytes())
+
+        return geometry.hexdigest()
+
     def is_filtered(self, data):
         ''' {@inheritDocs} '''
         lon, lat = data.get_location()
 
-        # Calculate how many times our test ray passes through the polygons
-        for sub_polygon in self.sympy_sub_polygons:
-            intersect_ray = Polygon((lon, lat), (lon + 999999, lat))
-            intersections = intersect_ray.intersection(sub_polygon)
-            is_inside_polygon = False
- 
-            for intersection in intersections: # Inspect the intersection geometry
-                if type(intersection) is Point:
-                    print "Point!"
-                    is_inside_polygon = not is_inside_polygon
-                else:
-                    print "Line!"
-
-            if is_inside_polygon: # If the point is inside this sub-polygon
+        bounding_box = self.get_bounding_box()
+        if lon < bounding_box['min_lon'] or lon > bounding_box['max_lon'] or \
+           lat < bounding_box['min_lat'] or lat > bounding_box['max_lat']: # If outside the bounding box
+            return True
+
+        for iter in range(len(self.sub_polygon_points)):
+            cell_class = self.sub_polygon_rasters[iter].classify(lon, lat)
+            if cell_class == BOUNDARY: # If the point needs a closer look
+                cell_class = INSIDE if self._contains_boundary_points(iter, [lon], [lat])[0] else None
+
+            if cell_class == INSIDE: # If the point is inside this sub-polygon
                 return False # Do not filter the point
 
         return True # Not in any of the sub-polygons so filter it
@@ -99,28 +292,138 @@ class ComplexPolygonStrategyFactory:
         coordinates = geojson_polygon['coordinates']
         
         if geojson_polygon['type'] == "Polygon":
-            if len(coordinates): # If there are holes in this polygon, ignore them
-                coordinates = coordinates[0]
+            coordinates = [coordinates] # Treat the polygon as a multi-polygon with a single member
+        elif geojson_polygon['type'] != "MultiPolygon":
+            raise Exception("Unknown feature type '%s'!" % geojson_polygon['type'])
+
+        sub_polygons      = []
+        sub_polygon_holes = []
+        for sub_polygon in coordinates:
+            # Convert the coordinates from lists to tuples, the first ring is the exterior the rest are holes
+            rings = [[tuple(coordinate) for coordinate in ring] for ring in sub_polygon]
+
+            sub_polygons.append(rings[0])
+            sub_polygon_holes.append(rings[1:])
 
-            # Convert the coordinates from lists to tuples
-            coordinate_tuples = []
-            for coordinate in coordinates:
-                coordinate_tuples.append(tuple(coordinate))
+        return ComplexPolygonStrategy(sub_polygons, sub_polygon_holes)
 
-            return ComplexPolygonStrategy([coordinate_tuples])
-        elif geojson_polygon['type'] == "MultiPolygon":
-            sub_polygons = []
+    def from_binary(self, file_name):
+        '''
+        Loads the complex polygons saved in a polygon store. @see to_binary
 
-            for sub_polygon in coordinates:
-                sub_polygon = sub_polygon[0] # Drop any holes in the polygon
+        @param file_name Path of the polygon store
+        @paramType string
+        @returns Polygons in the order they were stored
+        @returnType list of ComplexPolygonStrategy
+        '''
+        store = numpy.memmap(file_name, dtype=numpy.uint8, mode='r')
 
-                # Convert the coordinates from lists to tuples
-                coordinate_tuples = []
-                for coordinate in sub_polygon:
-                    coordinate_tuples.append(tuple(coordinate))
+        magic, version, num_polygons, num_sub_polygons, num_rings, num_points, num_cells = \
+            BINARY_HEADER.unpack(store[:BINARY_HEADER.size].tobytes())
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise Exception("'%s' is not a version %s polygon store!" % (file_name, BINARY_VERSION))
 
-                sub_polygons.append(coordinate_tuples)
+        # Map each of the store's sections onto an array, in the order to_binary() wrote them
+        offset   = [BINARY_HEADER.size]
+        def section(dtype, count):
+            array = numpy.frombuffer(store, dtype=dtype, count=count, offset=offset[0])
+            offset[0] += (array.nbytes + 7) // 8 * 8
+            return array
+        bounding_boxes      = section(numpy.float64, num_polygons * 4).reshape(-1, 4)
+        sub_polygon_offsets = section(numpy.uint64, num_polygons + 1)
+        ring_offsets        = section(numpy.uint64, num_sub_polygons + 1)
+        resolutions         = section(numpy.uint64, num_sub_polygons)
+        cell_offsets        = section(numpy.uint64, num_sub_polygons + 1)
+        point_offsets       = section(numpy.uint64, num_rings + 1)
+        points              = section(numpy.float64, num_points * 2).reshape(-1, 2)
+        cells               = section(numpy.int8, num_cells)
 
-            return ComplexPolygonStrategy(sub_polygons)
-        else:
-            raise Exception("Unknown feature type '%s'!" % geojson_polygon['type'])
+        polygons = []
+        for polygon in range(num_polygons):
+            sub_polygons      = []
+            sub_polygon_holes = []
+            raster_cells      = []
+
+            for sub_polygon in range(sub_polygon_offsets[polygon], sub_polygon_offsets[polygon + 1]):
+                rings = []
+                for ring in range(ring_offsets[sub_polygon], ring_offsets[sub_polygon + 1]):
+                    rings.append(map(tuple, points[point_offsets[ring]:point_offsets[ring + 1]].tolist()))
+
+                sub_polygons.append(rings[0])
+                sub_polygon_holes.append(rings[1:])
+                raster_cells.append(cells[cell_offsets[sub_polygon]:cell_offsets[sub_polygon + 1]])
+
+            # Resolution is stored per sub-polygon but is shared by all of a polygon's sub-polygons
+            resolution = int(resolutions[sub_polygon_offsets[polygon]])
+            complex_polygon = ComplexPolygonStrategy(sub_polygons, sub_polygon_holes, resolution, raster_cells)
+            complex_polygon.bounding_box = {
+                'min_lon' : bounding_boxes[polygon][0],
+                'min_lat' : bounding_boxes[polygon][1],
+                'max_lon' : bounding_boxes[polygon][2],
+                'max_lat' : bounding_boxes[polygon][3]
+            }
+            polygons.append(complex_polygon)
+
+        return polygons
+
+    def to_binary(self, polygons, file_name):
+        '''
+        Saves the provided complex polygons to a compact, pickle-free polygon store made of flat
+        coordinate arrays, ring offsets, bounding boxes and precomputed raster cells.
+
+        @param polygons Polygons to be stored
+        @paramType list of ComplexPolygonStrategy
+        @param file_name Path of the polygon store to write
+        @paramType string
+        @returns n/a
+        '''
+        bounding_boxes      = []
+        sub_polygon_offsets = [0]
+        ring_offsets        = [0]
+        resolutions         = []
+        cell_offsets        = [0]
+        point_offsets       = [0]
+        points              = []
+        cells               = []
+
+        for polygon in polygons: # Flatten the polygons into the store's arrays
+            bounding_box = polygon.get_bounding_box()
+            bounding_boxes.append([
+                bounding_box['min_lon'], bounding_box['min_lat'], bounding_box['max_lon'], bounding_box['max_lat']
+            ])
+            sub_polygon_offsets.append(sub_polygon_offsets[-1] + len(polygon.sub_polygon_points))
+
+            for iter in range(len(polygon.sub_polygon_points)):
+                rings = [polygon.sub_polygon_points[iter]] + polygon.sub_polygon_holes[iter]
+                ring_offsets.append(ring_offsets[-1] + len(rings))
+
+                for ring in rings:
+                    points.append(numpy.asarray(ring, dtype=numpy.float64).reshape(-1, 2))
+                    point_offsets.append(point_offsets[-1] + len(ring))
+
+                resolutions.append(polygon.raster_resolution)
+                cells.append(polygon.sub_polygon_rasters[iter].cells)
+                cell_offsets.append(cell_offsets[-1] + len(cells[-1]))
+
+        sections = [
+            numpy.array(bounding_boxes, dtype=numpy.float64),
+            numpy.array(sub_polygon_offsets, dtype=numpy.uint64),
+            numpy.array(ring_offsets, dtype=numpy.uint64),
+            numpy.array(resolutions, dtype=numpy.uint64),
+            numpy.array(cell_offsets, dtype=numpy.uint64),
+            numpy.array(point_offsets, dtype=numpy.uint64),
+            numpy.concatenate(points) if len(points) > 0 else numpy.zeros(0, dtype=numpy.float64),
+            numpy.concatenate(cells) if len(cells) > 0 else numpy.zeros(0, dtype=numpy.int8)
+        ]
+
+        store = open(file_name, 'wb')
+        try:
+            store.write(BINARY_HEADER.pack(
+                BINARY_MAGIC, BINARY_VERSION, len(polygons), len(resolutions),
+                len(point_offsets) - 1, point_offsets[-1], cell_offsets[-1]
+            ))
+            for array in sections: # Write each section padded out to an 8 byte boundary
+                store.write(array.tobytes())
+                store.write('\0' * ((8 - array.nbytes % 8) % 8))
+        finally:
+            store.close()
@@ -0,0 +1,96 @@
+''' Geohash encoding of locations and covering of bounding boxes with geohash cells. '''
+
+import math
+
+# Base 32 alphabet used by geohashes
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+def get_cell_size(precision):
+    '''
+    @param precision # of characters in the geohashes
+    @paramType int
+    @returns Width and height in degrees of the cells of the provided precision
+    @returnType (float, float)
+    '''
+    num_bits = 5 * precision
+    num_lon_bits = (num_bits + 1) // 2 # Longitude takes the even bits, so gets the odd one out
+    num_lat_bits = num_bits // 2
+
+    return (360.0 / (1 << num_lon_bits), 180.0 / (1 << num_lat_bits))
+
+def encode(lon, lat, precision):
+    '''
+    Encodes the location as a geohash; Nearby locations share long geohash prefixes.
+
+    @param lon Longitude of the location
+    @paramType float
+    @param lat Latitude of the location
+    @paramType float
+    @param precision # of characters in the geohash
+    @paramType int
+    @returns Geohash of the cell containing the location
+    @returnType string
+    '''
+    min_lon, max_lon = -180.0, 180.0
+    min_lat, max_lat = -90.0, 90.0
+
+    geohash = []
+    bits = 0
+    for bit in range(5 * precision): # Alternately halve the longitude and latitude ranges
+        if bit % 2 == 0:
+            middle = (min_lon + max_lon) / 2
+            if lon >= middle:
+                bits = (bits << 1) | 1
+                min_lon = middle
+            else:
+                bits = bits << 1
+                max_lon = middle
+        else:
+            middle = (min_lat + max_lat) / 2
+            if lat >= middle:
+                bits = (bits << 1) | 1
+                min_lat = middle
+            else:
+                bits = bits << 1
+                max_lat = middle
+
+        if bit % 5 == 4: # Every 5 bits make up a character
+            geohash.append(BASE32[bits])
+            bits = 0
+
+    return ''.join(geohash)
+
+def cover(min_lat, max_lat, min_lon, max_lon, precision):
+    '''
+    Finds every geohash cell of the provided precision that overlaps the bounding box.
+
+    @param precision # of characters in the geohashes
+    @paramType int
+    @returns Geohashes of the overlapping cells
+    @returnType list of string
+    '''
+    cell_width, cell_height = get_cell_size(precision)
+
+    # Index the grid columns and rows the box spans, clipped to the globe
+    min_col = max(int(math.floor((min_lon + 180) / cell_width)), 0)
+    max_col = min(int(math.floor((max_lon + 180) / cell_width)), int(round(360 / cell_width)) - 1)
+    min_row = max(int(math.floor((min_lat + 90) / cell_height)), 0)
+    max_row = min(int(math.floor((max_lat + 90) / cell_height)), int(round(180 / cell_height)) - 1)
+
+    geohashes = []
+    for row in range(min_row, max_row + 1):
+        for col in range(min_col, max_col + 1): # Encode the center of each cell
+            geohashes.append(encode(-180 + (col + 0.5) * cell_width, -90 + (row + 0.5) * cell_height, precision))
+
+    return geohashes
+
+def count_cover(min_lat, max_lat, min_lon, max_lon, precision):
+    '''
+    @returns # of geohash cells cover() would return, without building them
+    @returnType int
+    '''
+    cell_width, cell_height = get_cell_size(precision)
+    num_cols = int(math.floor((max_lon + 180) / cell_width)) - int(math.floor((min_lon + 180) / cell_width)) + 1
+    num_rows = int(math.floor((max_lat + 90) / cell_height)) - int(math.floor((min_lat + 90) / cell_height)) + 1
+
+    return max(num_cols, 0) * max(num_rows, 0)
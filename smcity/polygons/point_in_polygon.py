@@ -0,0 +1,165 @@
+''' Floating point, NumPy backed point-in-polygon engine. '''
+
+import math
+import numpy
+
+# Upper bound on the number of (point, edge) pairs evaluated at once by contains_many()
+MAX_BROADCAST_SIZE = 1 << 20
+
+class EdgeTable:
+    '''
+    Precomputed edge arrays for a set of closed rings which are tested using the even-odd
+    (ray casting) rule. The edges are bucketed into horizontal bands so a point is only tested
+    against the edges spanning its latitude.
+    '''
+
+    def __init__(self, rings):
+        '''
+        Constructor.
+
+        @param rings Closed rings whose edges make up the table
+        @paramType List of lists of (x, y) tuples
+        @returns n/a
+        '''
+        assert len(rings) > 0, len(rings)
+
+        starts = []
+        ends   = []
+        for ring in rings: # For each ring, record each of its edges
+            ring = numpy.asarray(ring, dtype=numpy.float64).reshape(-1, 2)
+            starts.append(ring[:-1])
+            ends.append(ring[1:])
+
+        starts = numpy.concatenate(starts)
+        ends   = numpy.concatenate(ends)
+
+        self.x1 = starts[:, 0].copy()
+        self.y1 = starts[:, 1].copy()
+        self.x2 = ends[:, 0].copy()
+        self.y2 = ends[:, 1].copy()
+
+        # Precompute dx/dy so the crossing test is a multiply-add; horizontal edges never cross the ray
+        delta_y = self.y2 - self.y1
+        is_horizontal = delta_y == 0
+        delta_y[is_horizontal] = 1
+        self.inverse_slope = (self.x2 - self.x1) / delta_y
+        self.inverse_slope[is_horizontal] = 0
+
+        self._build_bands()
+
+    def _build_bands(self):
+        ''' Buckets the edges into horizontal bands by the latitudes they span. '''
+        edge_min_ys = numpy.minimum(self.y1, self.y2)
+        edge_max_ys = numpy.maximum(self.y1, self.y2)
+
+        self.min_y = edge_min_ys.min() if len(edge_min_ys) > 0 else 0.0
+        max_y      = edge_max_ys.max() if len(edge_max_ys) > 0 else 0.0
+        self.num_bands   = max(1, int(math.sqrt(len(self.x1))))
+        self.band_height = max(max_y - self.min_y, 1e-9) / self.num_bands
+
+        self.bands = []
+        for band in range(self.num_bands):
+            # Pad the band slightly so rounding in _band_of() can never leave out a spanning edge
+            band_min_y = self.min_y + (band - 1e-6) * self.band_height
+            band_max_y = self.min_y + (band + 1 + 1e-6) * self.band_height
+            edges = numpy.flatnonzero((edge_min_ys <= band_max_y) & (edge_max_ys >= band_min_y))
+
+            self.bands.append((self.x1[edges], self.y1[edges], self.y2[edges], self.inverse_slope[edges]))
+
+    def _band_of(self, ys):
+        ''' @returns Band index of each of the provided latitudes, clipped to the valid bands '''
+        bands = numpy.floor((ys - self.min_y) / self.band_height)
+
+        return numpy.clip(bands, 0, self.num_bands - 1).astype(numpy.int64)
+
+    def contains(self, x, y):
+        '''
+        Determines whether or not the provided point is inside the rings.
+
+        @param x X coordinate (longitude) of the point
+        @paramType float
+        @param y Y coordinate (latitude) of the point
+        @paramType float
+        @returns Whether or not the point is inside
+        @returnType boolean
+        '''
+        band = min(max(int(math.floor((y - self.min_y) / self.band_height)), 0), self.num_bands - 1)
+        x1, y1, y2, inverse_slope = self.bands[band]
+
+        straddles = (y1 > y) != (y2 > y)
+        crossings = straddles & (x < x1 + (y - y1) * inverse_slope)
+
+        return bool(numpy.count_nonzero(crossings) & 1)
+
+    def contains_many(self, xs, ys):
+        '''
+        Determines whether or not each of the provided points is inside the rings.
+
+        @param xs X coordinates (longitudes) of the points
+        @paramType numpy.ndarray of float
+        @param ys Y coordinates (latitudes) of the points
+        @paramType numpy.ndarray of float
+        @returns Whether or not each point is inside
+        @returnType numpy.ndarray of bool
+        '''
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        ys = numpy.asarray(ys, dtype=numpy.float64)
+        is_inside = numpy.zeros(len(xs), dtype=bool)
+
+        # Group the points by band so each group is only tested against its band's edges
+        point_bands = self._band_of(ys)
+        order       = numpy.argsort(point_bands, kind='mergesort')
+        boundaries  = numpy.searchsorted(point_bands[order], numpy.arange(self.num_bands + 1))
+
+        for band in range(self.num_bands):
+            points = order[boundaries[band]:boundaries[band + 1]]
+            x1, y1, y2, inverse_slope = self.bands[band]
+            if len(points) == 0 or len(x1) == 0:
+                continue
+
+            # Evaluate the points in chunks to bound the size of the (point, edge) matrices
+            chunk_size = max(1, MAX_BROADCAST_SIZE // len(x1))
+            for start in range(0, len(points), chunk_size):
+                chunk = points[start:start + chunk_size]
+                chunk_xs = xs[chunk, numpy.newaxis]
+                chunk_ys = ys[chunk, numpy.newaxis]
+
+                straddles = (y1 > chunk_ys) != (y2 > chunk_ys)
+                crossings = straddles & (chunk_xs < x1 + (chunk_ys - y1) * inverse_slope)
+
+                is_inside[chunk] = (numpy.count_nonzero(crossings, axis=1) & 1) == 1
+
+        return is_inside
+
+    def distance_many(self, xs, ys):
+        '''
+        Measures how far each of the provided points is from the nearest edge.
+
+        @param xs X coordinates (longitudes) of the points
+        @paramType numpy.ndarray of float
+        @param ys Y coordinates (latitudes) of the points
+        @paramType numpy.ndarray of float
+        @returns Distance of each point from the nearest edge
+        @returnType numpy.ndarray of float
+        '''
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        ys = numpy.asarray(ys, dtype=numpy.float64)
+        distances = numpy.zeros(len(xs), dtype=numpy.float64)
+
+        delta_xs = self.x2 - self.x1
+        delta_ys = self.y2 - self.y1
+        lengths_squared = delta_xs * delta_xs + delta_ys * delta_ys
+        lengths_squared[lengths_squared == 0] = 1 # Degenerate edges measure from their start point
+
+        chunk_size = max(1, MAX_BROADCAST_SIZE // len(self.x1))
+        for start in range(0, len(xs), chunk_size):
+            offset_xs = xs[start:start + chunk_size, numpy.newaxis] - self.x1
+            offset_ys = ys[start:start + chunk_size, numpy.newaxis] - self.y1
+
+            # Project each point onto each edge, clamped to the edge's end points
+            fractions = numpy.clip((offset_xs * delta_xs + offset_ys * delta_ys) / lengths_squared, 0, 1)
+            distances[start:start + chunk_size] = numpy.hypot(
+                offset_xs - fractions * delta_xs, offset_ys - fractions * delta_ys
+            ).min(axis=1)
+
+        return distances
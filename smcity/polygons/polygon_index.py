@@ -0,0 +1,163 @@
+''' Spatial index that assigns points to the complex polygons containing them in a single pass. '''
+
+import math
+import numpy
+
+from smcity.polygons.complex_polygon_strategy import ComplexPolygonStrategyFactory
+
+class PolygonIndex:
+    '''
+    Uniform grid over the bounding boxes of a collection of polygons. Each grid cell records which
+    polygons' bounding boxes overlap it so a point only pays the exact edge test for the polygons
+    that could possibly contain it.
+    '''
+
+    def __init__(self, polygons, keys=None, cells_per_polygon=16):
+        '''
+        Constructor.
+
+        @param polygons Polygons to be indexed
+        @paramType list of ComplexPolygonStrategy
+        @param keys Tracking keys of the polygons; If None, the polygons' list positions are used
+        @paramType list
+        @param cells_per_polygon Approximate number of grid cells to allocate per indexed polygon
+        @paramType int
+        @returns n/a
+        '''
+        assert len(polygons) > 0, len(polygons)
+        assert keys is None or len(keys) == len(polygons), keys
+
+        self.polygons = polygons
+        self.keys     = keys if keys is not None else range(len(polygons))
+
+        bounding_boxes = [polygon.get_bounding_box() for polygon in polygons]
+        self.bounding_box = {
+            'min_lat' : min(bounding_box['min_lat'] for bounding_box in bounding_boxes),
+            'min_lon' : min(bounding_box['min_lon'] for bounding_box in bounding_boxes),
+            'max_lat' : max(bounding_box['max_lat'] for bounding_box in bounding_boxes),
+            'max_lon' : max(bounding_box['max_lon'] for bounding_box in bounding_boxes)
+        }
+
+        # Size the grid so the cells are roughly square and there are about cells_per_polygon per polygon
+        width  = max(float(self.bounding_box['max_lon'] - self.bounding_box['min_lon']), 1e-9)
+        height = max(float(self.bounding_box['max_lat'] - self.bounding_box['min_lat']), 1e-9)
+        cell_size = math.sqrt(width * height / (len(polygons) * cells_per_polygon))
+        self.num_cols  = max(1, int(math.ceil(width / cell_size)))
+        self.num_rows  = max(1, int(math.ceil(height / cell_size)))
+        self.cell_width  = width / self.num_cols
+        self.cell_height = height / self.num_rows
+
+        # For each polygon, flag the grid cells its bounding box overlaps
+        self.cell_masks = numpy.zeros((len(polygons), self.num_rows * self.num_cols), dtype=bool)
+        for iter in range(len(polygons)):
+            min_col, min_row = self._cell_coordinates(bounding_boxes[iter]['min_lon'], bounding_boxes[iter]['min_lat'])
+            max_col, max_row = self._cell_coordinates(bounding_boxes[iter]['max_lon'], bounding_boxes[iter]['max_lat'])
+
+            cells = self.cell_masks[iter].reshape(self.num_rows, self.num_cols)
+            cells[min_row:max_row + 1, min_col:max_col + 1] = True
+
+    def _cell_coordinates(self, lon, lat):
+        ''' @returns The (column, row) of the grid cell containing the provided location '''
+        col = int((lon - self.bounding_box['min_lon']) / self.cell_width)
+        row = int((lat - self.bounding_box['min_lat']) / self.cell_height)
+
+        return (min(max(col, 0), self.num_cols - 1), min(max(row, 0), self.num_rows - 1))
+
+    def _cell_ids(self, lons, lats):
+        '''
+        @returns Grid cell id of each of the provided locations, -1 for those outside the grid
+        @returnType numpy.ndarray of int
+        '''
+        cols = numpy.floor((lons - self.bounding_box['min_lon']) / self.cell_width).astype(numpy.int64)
+        rows = numpy.floor((lats - self.bounding_box['min_lat']) / self.cell_height).astype(numpy.int64)
+
+        # Points sitting exactly on the max edge of the grid belong to the last row/column
+        cols[lons == self.bounding_box['max_lon']] = self.num_cols - 1
+        rows[lats == self.bounding_box['max_lat']] = self.num_rows - 1
+
+        is_outside = (cols < 0) | (cols >= self.num_cols) | (rows < 0) | (rows >= self.num_rows)
+        cell_ids = rows * self.num_cols + cols
+        cell_ids[is_outside] = -1
+
+        return cell_ids
+
+    def get_bounding_box(self):
+        '''
+        @returns Bounding box covering all of the indexed polygons
+        @returnType dictionary containing 'min_lat', 'min_lon', 'max_lat', 'max_lon'
+        '''
+        return self.bounding_box
+
+    def assign_points(self, lons, lats):
+        '''
+        Determines which of the indexed polygons contain each of the provided points.
+
+        @param lons Longitudes of the points
+        @paramType numpy.ndarray of float
+        @param lats Latitudes of the points
+        @paramType numpy.ndarray of float
+        @returns Keys of the polygons containing each point
+        @returnType list of lists
+        '''
+        lons = numpy.asarray(lons, dtype=numpy.float64)
+        lats = numpy.asarray(lats, dtype=numpy.float64)
+        assignments = [[] for iter in range(len(lons))]
+
+        cell_ids  = self._cell_ids(lons, lats)
+        in_grid   = numpy.flatnonzero(cell_ids >= 0)
+        cell_ids  = cell_ids[in_grid]
+
+        for iter in range(len(self.polygons)): # For each polygon, test only the points in its cells
+            candidates = in_grid[self.cell_masks[iter][cell_ids]]
+            if len(candidates) == 0:
+                continue
+
+            is_inside = self.polygons[iter].contains_points(lons[candidates], lats[candidates])
+            for point_index in candidates[is_inside]:
+                assignments[point_index].append(self.keys[iter])
+
+        return assignments
+
+    def assign(self, datas):
+        '''
+        Determines which of the indexed polygons contain each of the provided data points.
+
+        @param datas Data points to be assigned
+        @paramType list of Data
+        @returns Keys of the polygons containing each data point
+        @returnType list of lists
+        '''
+        if len(datas) == 0:
+            return []
+
+        locations = numpy.array([data.get_location() for data in datas], dtype=numpy.float64)
+
+        return self.assign_points(locations[:, 0], locations[:, 1])
+
+class PolygonIndexFactory:
+    ''' Factory class that handles constructing polygon indexes. '''
+
+    def from_geojson(self, geojson_feature_collection, key_property=None):
+        '''
+        Constructs a PolygonIndex from the provided GeoJSON feature collection.
+
+        @param geojson_feature_collection GeoJSON features whose geometries are to be indexed
+        @paramType geojson.FeatureCollection
+        @param key_property Feature property to use as each polygon's key; If None, the feature's
+        position in the collection is used
+        @paramType string
+        @returns Index of the features' polygons
+        @returnType PolygonIndex
+        '''
+        polygon_factory = ComplexPolygonStrategyFactory()
+        polygons = []
+        keys     = []
+
+        for feature in geojson_feature_collection['features']: # For each feature, build its polygon
+            if key_property is not None:
+                keys.append(feature['properties'][key_property])
+            else:
+                keys.append(len(polygons))
+            polygons.append(polygon_factory.from_geojson(feature['geometry']))
+
+        return PolygonIndex(polygons, keys)
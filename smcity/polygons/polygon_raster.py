@@ -0,0 +1,148 @@
+''' Coarse raster of a polygon that lets most points skip the exact edge test. '''
+
+import math
+import numpy
+
+# Raster cell classifications
+OUTSIDE  = 0
+INSIDE   = 1
+BOUNDARY = 2
+
+class PolygonRaster:
+    '''
+    Grid laid over a polygon's bounding box whose cells are classified as fully inside, fully
+    outside, or crossed by the polygon's boundary. Only points in boundary cells need an exact
+    edge test.
+    '''
+
+    def __init__(self, rings, edge_table, resolution=64, cells=None):
+        '''
+        Constructor.
+
+        @param rings Closed rings making up the polygon, exterior ring first followed by any holes
+        @paramType List of lists of (x, y) tuples
+        @param edge_table Exact edge test for the polygon
+        @paramType EdgeTable
+        @param resolution Number of cells along the longer side of the bounding box
+        @paramType int
+        @param cells Previously computed cell classifications; If None, they are computed from the rings
+        @paramType numpy.ndarray of int8
+        @returns n/a
+        '''
+        assert len(rings) > 0, len(rings)
+        assert resolution > 0, resolution
+
+        exterior = numpy.asarray(rings[0], dtype=numpy.float64).reshape(-1, 2)
+        self.min_x = exterior[:, 0].min()
+        self.min_y = exterior[:, 1].min()
+        self.max_x = exterior[:, 0].max()
+        self.max_y = exterior[:, 1].max()
+
+        # Size the grid so the cells are roughly square
+        width  = max(self.max_x - self.min_x, 1e-9)
+        height = max(self.max_y - self.min_y, 1e-9)
+        if width >= height:
+            self.num_cols = resolution
+            self.num_rows = max(1, int(math.ceil(resolution * height / width)))
+        else:
+            self.num_rows = resolution
+            self.num_cols = max(1, int(math.ceil(resolution * width / height)))
+        self.cell_width  = width / self.num_cols
+        self.cell_height = height / self.num_rows
+
+        if cells is not None: # If the classifications were precomputed, i.e. loaded from a polygon store
+            assert len(cells) == self.num_rows * self.num_cols, len(cells)
+            self.cells = numpy.asarray(cells, dtype=numpy.int8)
+            return
+
+        # Flag every cell any edge passes through as a boundary cell
+        is_boundary = numpy.zeros(self.num_rows * self.num_cols, dtype=bool)
+        for ring in rings:
+            is_boundary[self._sample_edge_cells(numpy.array(ring, dtype=numpy.float64))] = True
+        is_boundary = is_boundary.reshape(self.num_rows, self.num_cols)
+
+        # Samples are at most half a cell apart so any cell an edge clips lies next to a sampled cell
+        grown = is_boundary.copy()
+        grown[1:, :]  |= is_boundary[:-1, :]
+        grown[:-1, :] |= is_boundary[1:, :]
+        grown[:, 1:]  |= is_boundary[:, :-1]
+        grown[:, :-1] |= is_boundary[:, 1:]
+        is_boundary = grown
+
+        # No edge crosses the remaining cells so their centers speak for the whole cell
+        center_xs, center_ys = numpy.meshgrid(
+            self.min_x + (numpy.arange(self.num_cols) + 0.5) * self.cell_width,
+            self.min_y + (numpy.arange(self.num_rows) + 0.5) * self.cell_height
+        )
+        is_inside = edge_table.contains_many(center_xs.ravel(), center_ys.ravel()).reshape(is_boundary.shape)
+
+        self.cells = numpy.where(is_inside, INSIDE, OUTSIDE).astype(numpy.int8)
+        self.cells[is_boundary] = BOUNDARY
+        self.cells = self.cells.ravel()
+
+    def _sample_edge_cells(self, ring):
+        '''
+        Samples points along each edge of the ring no more than half a cell apart.
+
+        @param ring Closed ring of points
+        @paramType numpy.ndarray of shape (n, 2)
+        @returns Cell ids of the sampled points
+        @returnType numpy.ndarray of int
+        '''
+        starts = ring[:-1]
+        deltas = ring[1:] - ring[:-1]
+        num_steps = numpy.ceil(numpy.maximum(
+            numpy.abs(deltas[:, 0]) / self.cell_width, numpy.abs(deltas[:, 1]) / self.cell_height
+        ) * 2).astype(numpy.int64) + 1
+
+        # Lay out every edge's sample fractions 0, 1/n, ..., 1 in one flat array
+        edges     = numpy.repeat(numpy.arange(len(starts)), num_steps + 1)
+        offsets   = numpy.arange(len(edges)) - numpy.repeat(numpy.cumsum(num_steps + 1) - (num_steps + 1), num_steps + 1)
+        fractions = offsets / numpy.repeat(num_steps, num_steps + 1).astype(numpy.float64)
+
+        xs = starts[edges, 0] + fractions * deltas[edges, 0]
+        ys = starts[edges, 1] + fractions * deltas[edges, 1]
+        cols = numpy.clip(numpy.floor((xs - self.min_x) / self.cell_width), 0, self.num_cols - 1).astype(numpy.int64)
+        rows = numpy.clip(numpy.floor((ys - self.min_y) / self.cell_height), 0, self.num_rows - 1).astype(numpy.int64)
+
+        return rows * self.num_cols + cols
+
+    def classify(self, x, y):
+        '''
+        Classifies the provided point.
+
+        @param x X coordinate (longitude) of the point
+        @paramType float
+        @param y Y coordinate (latitude) of the point
+        @paramType float
+        @returns Classification of the cell containing the point
+        @returnType OUTSIDE, INSIDE or BOUNDARY
+        '''
+        if x < self.min_x or x > self.max_x or y < self.min_y or y > self.max_y: # If off the grid
+            return OUTSIDE
+
+        col = min(int((x - self.min_x) / self.cell_width), self.num_cols - 1)
+        row = min(int((y - self.min_y) / self.cell_height), self.num_rows - 1)
+
+        return self.cells[row * self.num_cols + col]
+
+    def classify_many(self, xs, ys):
+        '''
+        Classifies each of the provided points.
+
+        @param xs X coordinates (longitudes) of the points
+        @paramType numpy.ndarray of float
+        @param ys Y coordinates (latitudes) of the points
+        @paramType numpy.ndarray of float
+        @returns Classification of the cell containing each point
+        @returnType numpy.ndarray of OUTSIDE, INSIDE or BOUNDARY
+        '''
+        is_on_grid = (xs >= self.min_x) & (xs <= self.max_x) & (ys >= self.min_y) & (ys <= self.max_y)
+
+        cols = numpy.minimum(((xs[is_on_grid] - self.min_x) / self.cell_width).astype(numpy.int64), self.num_cols - 1)
+        rows = numpy.minimum(((ys[is_on_grid] - self.min_y) / self.cell_height).astype(numpy.int64), self.num_rows - 1)
+
+        classes = numpy.zeros(len(xs), dtype=numpy.int8)
+        classes[is_on_grid] = self.cells[rows * self.num_cols + cols]
+
+        return classes
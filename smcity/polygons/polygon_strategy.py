@@ -25,3 +25,12 @@ class PolygonStrategy(ComplexFilter):
         @returnType list of (lon/float, lat/float)
         '''
         raise NotImplementedError()
+
+    def get_simplified_outline(self, tolerance):
+        '''
+        @param tolerance How far the simplified outline may stray from the full outline
+        @paramType float
+        @returns A lower resolution version of get_outline() for display purposes
+        @returnType list of (lon/float, lat/float)
+        '''
+        raise NotImplementedError()
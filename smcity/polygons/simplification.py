@@ -0,0 +1,134 @@
+'''
+Ring simplification algorithms. Each simplifier takes a closed ring and a tolerance and returns the
+sorted positions of the ring points to keep, always including the first and last points.
+'''
+
+import heapq
+import numpy
+
+def _segment_distances(points, start, end):
+    '''
+    @returns Distance of each of the points from the segment running from start to end
+    @returnType numpy.ndarray of float
+    '''
+    delta = end - start
+    length_squared = numpy.dot(delta, delta)
+    if length_squared == 0:
+        return numpy.hypot(points[:, 0] - start[0], points[:, 1] - start[1])
+
+    fractions = numpy.clip(numpy.dot(points - start, delta) / length_squared, 0, 1)
+    closest = start + fractions[:, numpy.newaxis] * delta
+
+    return numpy.hypot(points[:, 0] - closest[:, 0], points[:, 1] - closest[:, 1])
+
+def douglas_peucker(ring, tolerance):
+    '''
+    Simplifies the ring with the Douglas-Peucker algorithm, every dropped point lies within
+    tolerance of the simplified ring.
+
+    @param ring Closed ring of points
+    @paramType list of (x, y) tuples
+    @param tolerance Maximum distance a dropped point may lie from the simplified ring
+    @paramType float
+    @returns Positions of the points to keep
+    @returnType list of int
+    '''
+    points = numpy.asarray(ring, dtype=numpy.float64).reshape(-1, 2)
+    if len(points) < 5: # If there is nothing to drop without collapsing the ring
+        return range(len(points))
+
+    # Split the closed ring at the point farthest from its start so each half is an open chain
+    farthest = int(numpy.argmax(numpy.hypot(points[:, 0] - points[0, 0], points[:, 1] - points[0, 1])))
+    is_kept = numpy.zeros(len(points), dtype=bool)
+    is_kept[[0, farthest, len(points) - 1]] = True
+
+    chains = [(0, farthest), (farthest, len(points) - 1)]
+    while len(chains) > 0:
+        first, last = chains.pop()
+        if last - first < 2:
+            continue
+
+        distances = _segment_distances(points[first + 1:last], points[first], points[last])
+        worst = int(numpy.argmax(distances))
+        if distances[worst] > tolerance: # If the chain strays too far from its chord, split it
+            worst += first + 1
+            is_kept[worst] = True
+            chains.append((first, worst))
+            chains.append((worst, last))
+
+    return numpy.flatnonzero(is_kept).tolist()
+
+def visvalingam(ring, tolerance):
+    '''
+    Simplifies the ring with the Visvalingam-Whyatt algorithm, repeatedly dropping the point
+    whose triangle with its neighbors has the smallest area until every remaining triangle is at
+    least tolerance squared in area.
+
+    @param ring Closed ring of points
+    @paramType list of (x, y) tuples
+    @param tolerance Square root of the smallest triangle area that is kept
+    @paramType float
+    @returns Positions of the points to keep
+    @returnType list of int
+    '''
+    points = numpy.asarray(ring, dtype=numpy.float64).reshape(-1, 2)
+    if len(points) < 5: # If there is nothing to drop without collapsing the ring
+        return range(len(points))
+
+    def area(previous_point, point, next_point):
+        (x1, y1), (x2, y2), (x3, y3) = points[previous_point], points[point], points[next_point]
+        return abs((x2 - x1) * (y3 - y1) - (x3 - x1) * (y2 - y1)) / 2.0
+
+    previous_points = range(-1, len(points) - 1)
+    next_points     = range(1, len(points) + 1)
+    areas           = [None] * len(points)
+    heap            = []
+    for iter in range(1, len(points) - 1): # The ring's start/end point is always kept
+        areas[iter] = area(previous_points[iter], iter, next_points[iter])
+        heap.append((areas[iter], iter))
+    heapq.heapify(heap)
+
+    num_remaining = len(points)
+    min_area = tolerance * tolerance
+    while len(heap) > 0 and num_remaining > 4:
+        point_area, iter = heapq.heappop(heap)
+        if areas[iter] is None or point_area != areas[iter]: # If this heap entry is stale
+            continue
+        if point_area >= min_area:
+            break
+
+        # Unlink the point and refresh its neighbors' triangles
+        areas[iter] = None
+        next_points[previous_points[iter]] = next_points[iter]
+        previous_points[next_points[iter]] = previous_points[iter]
+        num_remaining -= 1
+        for neighbor in (previous_points[iter], next_points[iter]):
+            if 0 < neighbor < len(points) - 1:
+                areas[neighbor] = area(previous_points[neighbor], neighbor, next_points[neighbor])
+                heapq.heappush(heap, (areas[neighbor], neighbor))
+
+    return [iter for iter in range(len(points)) if iter in (0, len(points) - 1) or areas[iter] is not None]
+
+def max_deviation(ring, kept):
+    '''
+    Measures how far the original ring strays from its simplification. A point farther than this
+    from the simplified ring is on the same side of both rings.
+
+    @param ring Closed ring of points
+    @paramType list of (x, y) tuples
+    @param kept Positions of the points kept by the simplification
+    @paramType list of int
+    @returns Largest distance of a dropped point from the simplified segment replacing it
+    @returnType float
+    '''
+    points = numpy.asarray(ring, dtype=numpy.float64).reshape(-1, 2)
+    deviation = 0.0
+
+    for (first, last) in zip(kept[:-1], kept[1:]):
+        if last - first < 2:
+            continue
+
+        distances = _segment_distances(points[first + 1:last], points[first], points[last])
+        deviation = max(deviation, float(distances.max()))
+
+    return deviation
@@ -1,7 +1,15 @@
 ''' Unit tests for the ComplexPolygonStrategy class. '''
 
+import math
+import os
+import shutil
+import tempfile
+
+from geojson import MultiPolygon, Polygon
+
 from smcity.models.test.mock_data import MockData
-from smcity.polygons.complex_polygon_strategy import ComplexPolygonStrategy
+from smcity.polygons.complex_polygon_strategy import ComplexPolygonStrategy, ComplexPolygonStrategyFactory
+from smcity.polygons.simplification import douglas_peucker, visvalingam
 
 class TestComplexPolygonStrategy:
     ''' Unit tests for the ComplexPolygonStrategy class. '''
@@ -40,3 +48,131 @@ class TestComplexPolygonStrategy:
 
         data = MockData({'location' : (1.5, 0.5)})
         assert polygon.is_filtered(data) == False
+
+    def test_filter_many(self):
+        ''' Tests the filter_many function. '''
+        points = [[(-2, -2), (-2, 2), (-1, 2), (-1, 0), (1, 0), (1, 2), (2, 2), (2, -2)]]
+        polygon = ComplexPolygonStrategy(points)
+
+        locations = [(-5, -1), (-5, 1), (0, 5), (-1.5, 0), (-1.5, 0.5), (1.5, 0.5), (0, 1), (0, -1)]
+        datas = [MockData({'location' : location}) for location in locations]
+
+        is_filtered = polygon.filter_many(datas)
+
+        assert is_filtered == [True, True, True, False, False, False, True, False], is_filtered
+        for data, filtered in zip(datas, is_filtered): # Batch results must match the single point test
+            assert polygon.is_filtered(data) == filtered, data.get_location()
+
+    def test_filter_many_multi_polygon(self):
+        ''' Tests the filter_many function on a polygon made up of multiple sub-polygons. '''
+        points = [[(0, 0), (0, 1), (1, 1), (1, 0)], [(5, 5), (5, 6), (6, 6), (6, 5)]]
+        polygon = ComplexPolygonStrategy(points)
+
+        locations = [(0.5, 0.5), (5.5, 5.5), (3, 3), (0.5, 5.5)]
+        datas = [MockData({'location' : location}) for location in locations]
+
+        assert polygon.filter_many(datas) == [False, False, True, True], polygon.filter_many(datas)
+        assert polygon.filter_many([]) == [], polygon.filter_many([])
+
+    def test_is_filtered_with_holes(self):
+        ''' Tests the is_filtered and filter_many functions on a polygon with a hole. '''
+        points = [[(0, 0), (0, 10), (10, 10), (10, 0)]]
+        holes  = [[[(4, 4), (4, 6), (6, 6), (6, 4)]]]
+        polygon = ComplexPolygonStrategy(points, holes)
+
+        locations = [(1, 1), (5, 5), (4.5, 5.5), (3.9, 5), (11, 5), (9.99, 9.99)]
+        datas = [MockData({'location' : location}) for location in locations]
+
+        expected = [False, True, True, False, True, False]
+        assert [polygon.is_filtered(data) for data in datas] == expected
+        assert polygon.filter_many(datas) == expected, polygon.filter_many(datas)
+
+    def test_raster_matches_exact_test(self):
+        ''' Tests the rasterized point test agrees with the exact edge test everywhere. '''
+        points = [[(0, 0), (3, 7), (1, 9), (6, 8), (10, 10), (9, 1), (5, 3)]]
+        holes  = [[[(5, 5), (6, 7), (7, 5)]]]
+        polygon = ComplexPolygonStrategy(points, holes, raster_resolution=8)
+
+        lons = []
+        lats = []
+        for x in range(-5, 106):
+            for y in range(-5, 106):
+                lons.append(x / 10.0)
+                lats.append(y / 10.0)
+
+        is_inside = polygon.contains_points(lons, lats)
+        expected  = polygon.sub_polygon_edges[0].contains_many(lons, lats)
+
+        assert (is_inside == expected).all()
+
+    def test_simplify(self):
+        ''' Tests the simplified hull pre-test never changes the exact answer. '''
+        exterior = []
+        for iter in range(400):
+            angle  = 2 * math.pi * iter / 400
+            radius = 10 + 0.3 * math.sin(angle * 53)
+            exterior.append((radius * math.cos(angle), radius * math.sin(angle)))
+        polygon = ComplexPolygonStrategy([exterior], [[[(-2, -2), (-2, 2), (2, 2), (2, -2)]]], raster_resolution=4)
+
+        lons = []
+        lats = []
+        for x in range(-120, 121, 2):
+            for y in range(-120, 121, 2):
+                lons.append(x / 10.0)
+                lats.append(y / 10.0)
+        expected = polygon.contains_points(lons, lats)
+
+        for simplifier in (douglas_peucker, visvalingam):
+            polygon.simplify(0.5, simplifier)
+            assert (polygon.contains_points(lons, lats) == expected).all()
+
+            outline = polygon.get_simplified_outline(0.5, simplifier)
+            assert len(outline) == 1, len(outline)
+            assert 4 <= len(outline[0]) < len(exterior), len(outline[0])
+
+class TestComplexPolygonStrategyFactory:
+    ''' Unit tests for the ComplexPolygonStrategyFactory class. '''
+
+    def test_from_geojson_keeps_holes(self):
+        ''' Tests the from_geojson function honors interior rings. '''
+        exterior = [(0, 0), (0, 10), (10, 10), (10, 0), (0, 0)]
+        hole     = [(4, 4), (4, 6), (6, 6), (6, 4), (4, 4)]
+        inside   = MockData({'location' : (1, 1)})
+        in_hole  = MockData({'location' : (5, 5)})
+
+        polygon = ComplexPolygonStrategyFactory().from_geojson(Polygon([exterior, hole]))
+        assert polygon.is_filtered(inside) == False
+        assert polygon.is_filtered(in_hole) == True
+
+        island  = [(20, 20), (20, 21), (21, 21), (21, 20), (20, 20)]
+        polygon = ComplexPolygonStrategyFactory().from_geojson(MultiPolygon([[exterior, hole], [island]]))
+        assert polygon.is_filtered(inside) == False
+        assert polygon.is_filtered(in_hole) == True
+        assert polygon.is_filtered(MockData({'location' : (20.5, 20.5)})) == False
+
+    def test_binary_round_trip(self):
+        ''' Tests saving polygons with to_binary and loading them with from_binary. '''
+        factory  = ComplexPolygonStrategyFactory()
+        polygons = [
+            ComplexPolygonStrategy(
+                [[(0, 0), (0, 10), (10, 10), (10, 0)], [(20, 20), (20, 21), (21, 21)]],
+                [[[(4, 4), (4, 6), (6, 6), (6, 4)]], []]
+            ),
+            ComplexPolygonStrategy([[(-2, -2), (-2, 2), (-1, 2), (-1, 0), (1, 0), (1, 2), (2, 2), (2, -2)]])
+        ]
+
+        file_name = os.path.join(tempfile.mkdtemp(), 'polygons.bin')
+        try:
+            factory.to_binary(polygons, file_name)
+            loaded = factory.from_binary(file_name)
+        finally:
+            shutil.rmtree(os.path.dirname(file_name))
+
+        assert len(loaded) == len(polygons), len(loaded)
+        locations = [(1, 1), (5, 5), (20.2, 20.5), (20.8, 20.5), (-1.5, 0.5), (0, 1), (0, -1), (30, 30)]
+        datas = [MockData({'location' : location}) for location in locations]
+        for (polygon, loaded_polygon) in zip(polygons, loaded):
+            assert loaded_polygon.get_outline() == polygon.get_outline(), loaded_polygon.get_outline()
+            assert loaded_polygon.sub_polygon_holes == polygon.sub_polygon_holes, loaded_polygon.sub_polygon_holes
+            assert loaded_polygon.get_bounding_box() == polygon.get_bounding_box(), loaded_polygon.get_bounding_box()
+            assert loaded_polygon.filter_many(datas) == polygon.filter_many(datas), loaded_polygon.filter_many(datas)
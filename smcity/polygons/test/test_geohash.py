@@ -0,0 +1,29 @@
+''' Unit tests for the geohash module. '''
+
+from smcity.polygons import geohash
+
+class TestGeohash:
+    ''' Tests the geohash functions. '''
+
+    def test_encode(self):
+        ''' Tests the encode() function against a well known geohash. '''
+        assert geohash.encode(-5.6, 42.6, 5) == 'ezs42', geohash.encode(-5.6, 42.6, 5)
+        assert geohash.encode(-5.6, 42.6, 3) == 'ezs', geohash.encode(-5.6, 42.6, 3)
+
+    def test_get_cell_size(self):
+        ''' Tests the get_cell_size() function. '''
+        assert geohash.get_cell_size(1) == (45.0, 45.0), geohash.get_cell_size(1)
+        assert geohash.get_cell_size(2) == (11.25, 5.625), geohash.get_cell_size(2)
+
+    def test_cover(self):
+        ''' Tests that the cover() function finds every cell overlapping the bounding box. '''
+        cells = geohash.cover(39.8, 40.2, -83.2, -82.8, 4)
+
+        assert len(cells) == len(set(cells)) == geohash.count_cover(39.8, 40.2, -83.2, -82.8, 4), cells
+        for lat in [39.8, 39.95, 40.2]: # Every location in the box lies in one of the cells
+            for lon in [-83.2, -83.0, -82.8]:
+                assert geohash.encode(lon, lat, 4) in cells, (lon, lat)
+
+    def test_cover_single_cell(self):
+        ''' Tests covering a bounding box inside a single cell. '''
+        assert geohash.cover(42.59, 42.61, -5.61, -5.59, 3) == ['ezs'], geohash.cover(42.59, 42.61, -5.61, -5.59, 3)
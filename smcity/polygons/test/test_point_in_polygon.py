@@ -0,0 +1,46 @@
+''' Unit tests for the point-in-polygon engine. '''
+
+import numpy
+
+from smcity.polygons.point_in_polygon import EdgeTable
+
+class TestEdgeTable:
+    ''' Unit tests for the EdgeTable class. '''
+
+    def setup(self):
+        ''' Set up before each test. '''
+        # U shaped polygon whose notch runs along the y=0 horizontal edge
+        self.edge_table = EdgeTable([[(-2, -2), (-2, 2), (-1, 2), (-1, 0), (1, 0), (1, 2), (2, 2), (2, -2), (-2, -2)]])
+
+    def test_contains(self):
+        ''' Tests the contains function. '''
+        assert self.edge_table.contains(-1.5, 0) == True
+        assert self.edge_table.contains(1.5, 1.5) == True
+        assert self.edge_table.contains(0, -1) == True
+        assert self.edge_table.contains(0, 1) == False
+        assert self.edge_table.contains(-5, 1) == False
+        assert self.edge_table.contains(0, 5) == False
+
+    def test_contains_many(self):
+        ''' Tests the contains_many function agrees with the contains function. '''
+        xs = numpy.linspace(-3, 3, 61)
+        ys = numpy.linspace(-3, 3, 61)
+        grid_xs, grid_ys = numpy.meshgrid(xs, ys)
+        grid_xs = grid_xs.ravel()
+        grid_ys = grid_ys.ravel()
+
+        is_inside = self.edge_table.contains_many(grid_xs, grid_ys)
+
+        assert len(is_inside) == len(grid_xs), len(is_inside)
+        for iter in range(len(grid_xs)):
+            assert is_inside[iter] == self.edge_table.contains(grid_xs[iter], grid_ys[iter]), \
+                (grid_xs[iter], grid_ys[iter])
+
+    def test_contains_many_chunked(self):
+        ''' Tests the contains_many function when the points must be evaluated in chunks. '''
+        xs = numpy.array([-1.5, 0, 1.5] * 200000)
+        ys = numpy.array([0.5, 1, 0.5] * 200000)
+
+        is_inside = self.edge_table.contains_many(xs, ys)
+
+        assert is_inside.tolist() == [True, False, True] * 200000
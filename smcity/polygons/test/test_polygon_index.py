@@ -0,0 +1,69 @@
+''' Unit tests for the PolygonIndex class. '''
+
+from geojson import Feature, FeatureCollection, MultiPolygon, Polygon
+
+from smcity.models.test.mock_data import MockData
+from smcity.polygons.complex_polygon_strategy import ComplexPolygonStrategy
+from smcity.polygons.polygon_index import PolygonIndex, PolygonIndexFactory
+
+class TestPolygonIndex:
+    ''' Unit tests for the PolygonIndex class. '''
+
+    def setup(self):
+        ''' Set up before each test. '''
+        # Two adjacent squares, an overlapping square and a far away triangle
+        self.polygons = [
+            ComplexPolygonStrategy([[(0, 0), (0, 1), (1, 1), (1, 0)]]),
+            ComplexPolygonStrategy([[(1, 0), (1, 1), (2, 1), (2, 0)]]),
+            ComplexPolygonStrategy([[(0.5, 0.5), (0.5, 1.5), (1.5, 1.5), (1.5, 0.5)]]),
+            ComplexPolygonStrategy([[(10, 10), (12, 10), (11, 12)]])
+        ]
+        self.index = PolygonIndex(self.polygons, keys=['a', 'b', 'c', 'd'])
+
+    def test_get_bounding_box(self):
+        ''' Tests the get_bounding_box function. '''
+        bounding_box = self.index.get_bounding_box()
+
+        assert bounding_box['min_lat'] == 0, bounding_box['min_lat']
+        assert bounding_box['min_lon'] == 0, bounding_box['min_lon']
+        assert bounding_box['max_lat'] == 12, bounding_box['max_lat']
+        assert bounding_box['max_lon'] == 12, bounding_box['max_lon']
+
+    def test_assign(self):
+        ''' Tests the assign function. '''
+        locations = [(0.25, 0.25), (1.75, 0.25), (0.75, 0.75), (11, 11), (5, 5), (-1, -1), (1.25, 1.25)]
+        datas = [MockData({'location' : location}) for location in locations]
+
+        assignments = self.index.assign(datas)
+
+        assert assignments == [['a'], ['b'], ['a', 'c'], ['d'], [], [], ['c']], assignments
+
+    def test_assign_matches_polygons(self):
+        ''' Tests the assign function agrees with testing each polygon individually. '''
+        datas = []
+        for x in range(-4, 52):
+            for y in range(-4, 52):
+                datas.append(MockData({'location' : (x / 4.0, y / 4.0)}))
+
+        assignments = self.index.assign(datas)
+
+        for (data, polygon_keys) in zip(datas, assignments):
+            expected = [key for (key, polygon) in zip('abcd', self.polygons) if not polygon.is_filtered(data)]
+            assert polygon_keys == expected, (data.get_location(), polygon_keys, expected)
+
+class TestPolygonIndexFactory:
+    ''' Unit tests for the PolygonIndexFactory class. '''
+
+    def test_from_geojson(self):
+        ''' Tests the from_geojson function. '''
+        feature_collection = FeatureCollection([
+            Feature(geometry=Polygon([[(0, 0), (0, 1), (1, 1), (1, 0), (0, 0)]]), properties={'beat' : 'B1'}),
+            Feature(geometry=MultiPolygon([[[(2, 2), (2, 3), (3, 3), (3, 2), (2, 2)]]]), properties={'beat' : 'B2'})
+        ])
+
+        index = PolygonIndexFactory().from_geojson(feature_collection, key_property='beat')
+        datas = [MockData({'location' : (0.5, 0.5)}), MockData({'location' : (2.5, 2.5)})]
+        assert index.assign(datas) == [['B1'], ['B2']], index.assign(datas)
+
+        index = PolygonIndexFactory().from_geojson(feature_collection)
+        assert index.assign(datas) == [[0], [1]], index.assign(datas)
@@ -0,0 +1,41 @@
+''' Unit tests for the PolygonRaster class. '''
+
+import numpy
+
+from smcity.polygons.point_in_polygon import EdgeTable
+from smcity.polygons.polygon_raster import BOUNDARY, INSIDE, OUTSIDE, PolygonRaster
+
+class TestPolygonRaster:
+    ''' Unit tests for the PolygonRaster class. '''
+
+    def setup(self):
+        ''' Set up before each test. '''
+        self.rings = [
+            [(0, 0), (0, 10), (10, 10), (10, 0), (0, 0)],
+            [(4, 4), (4, 6), (6, 6), (6, 4), (4, 4)]
+        ]
+        self.edge_table = EdgeTable(self.rings)
+        self.raster = PolygonRaster(self.rings, self.edge_table, resolution=20)
+
+    def test_classify(self):
+        ''' Tests the classify function. '''
+        assert self.raster.classify(2.25, 2.25) == INSIDE
+        assert self.raster.classify(5.25, 5.25) == OUTSIDE
+        assert self.raster.classify(0.1, 5.25) == BOUNDARY
+        assert self.raster.classify(4.1, 5.25) == BOUNDARY
+        assert self.raster.classify(-1, 5) == OUTSIDE
+        assert self.raster.classify(5, 11) == OUTSIDE
+
+    def test_classify_many(self):
+        ''' Tests the classify_many function agrees with classify and never contradicts the exact test. '''
+        xs, ys = numpy.meshgrid(numpy.linspace(-1, 11, 97), numpy.linspace(-1, 11, 97))
+        xs = xs.ravel()
+        ys = ys.ravel()
+
+        classes   = self.raster.classify_many(xs, ys)
+        is_inside = self.edge_table.contains_many(xs, ys)
+
+        for iter in range(len(xs)):
+            assert classes[iter] == self.raster.classify(xs[iter], ys[iter]), (xs[iter], ys[iter])
+        assert (is_inside[classes == INSIDE]).all()
+        assert not (is_inside[classes == OUTSIDE]).any()
@@ -0,0 +1,44 @@
+''' Unit tests for the ring simplification algorithms. '''
+
+import math
+
+from smcity.polygons.simplification import douglas_peucker, max_deviation, visvalingam
+
+class TestSimplification:
+    ''' Unit tests for the ring simplification algorithms. '''
+
+    def setup(self):
+        ''' Set up before each test. '''
+        # A wobbly circle of radius 10
+        self.ring = []
+        for iter in range(200):
+            angle  = 2 * math.pi * iter / 200
+            radius = 10 + 0.05 * math.sin(angle * 37)
+            self.ring.append((radius * math.cos(angle), radius * math.sin(angle)))
+        self.ring.append(self.ring[0])
+
+    def test_douglas_peucker(self):
+        ''' Tests the douglas_peucker function. '''
+        kept = douglas_peucker(self.ring, 0.5)
+
+        assert kept[0] == 0 and kept[-1] == len(self.ring) - 1, kept
+        assert 4 <= len(kept) < len(self.ring) / 4, len(kept)
+        assert kept == sorted(kept), kept
+        assert max_deviation(self.ring, kept) <= 0.5, max_deviation(self.ring, kept)
+
+        assert douglas_peucker(self.ring, 0) == range(len(self.ring))
+
+    def test_visvalingam(self):
+        ''' Tests the visvalingam function. '''
+        kept = visvalingam(self.ring, 0.5)
+
+        assert kept[0] == 0 and kept[-1] == len(self.ring) - 1, kept
+        assert 4 <= len(kept) < len(self.ring) / 4, len(kept)
+        assert kept == sorted(kept), kept
+
+    def test_small_rings_are_kept(self):
+        ''' Tests rings too small to simplify are left alone. '''
+        triangle = [(0, 0), (1, 0), (0, 1), (0, 0)]
+
+        assert douglas_peucker(triangle, 100) == [0, 1, 2, 3]
+        assert visvalingam(triangle, 100) == [0, 1, 2, 3]
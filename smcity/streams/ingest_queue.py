@@ -0,0 +1,159 @@
+''' Bounded hand-off between a stream's receiving thread and the workers persisting its payloads. '''
+
+import time
+
+from Queue import Full, Queue
+from threading import Lock, Thread
+
+from smcity.misc.logger import Logger
+
+logger = Logger(__name__)
+
+# What to do with a payload that arrives while the queue is full
+BLOCK = 'block' # Wait for room, pushing the backpressure onto the stream
+DROP  = 'drop'  # Discard the payload
+SPILL = 'spill' # Append the payload to the spill file to be replayed later
+
+class IngestQueue:
+    '''
+    Bounded queue of raw stream payloads drained by a pool of worker threads, so a slow database
+    never stalls the thread receiving the stream.
+    '''
+
+    def __init__(self, handler, queue_size=1000, num_workers=4, overflow_policy=BLOCK, spill_file_name=None):
+        '''
+        Constructor.
+
+        @param handler Parses and persists a single payload
+        @paramType function(payload)
+        @param queue_size Maximum # of payloads waiting to be handled
+        @paramType int
+        @param num_workers # of worker threads handling the payloads
+        @paramType int
+        @param overflow_policy What to do with payloads that arrive while the queue is full
+        @paramType BLOCK, DROP or SPILL
+        @param spill_file_name File overflowing payloads are appended to, one per line; Required by SPILL
+        @paramType string
+        @returns n/a
+        '''
+        assert handler is not None
+        assert queue_size > 0, queue_size
+        assert num_workers > 0, num_workers
+        assert overflow_policy in (BLOCK, DROP, SPILL), overflow_policy
+        assert overflow_policy != SPILL or spill_file_name is not None, "SPILL requires a spill file!"
+
+        self.handler         = handler
+        self.overflow_policy = overflow_policy
+        self.spill_file_name = spill_file_name
+        self.queue           = Queue(queue_size)
+        self.metrics_lock    = Lock()
+        self.metrics         = {'received' : 0, 'handled' : 0, 'failed' : 0, 'dropped' : 0, 'spilled' : 0, 'lag' : 0.0}
+
+        self.workers = []
+        for iter in range(num_workers): # Spin up the worker pool
+            worker = Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def put(self, payload):
+        '''
+        Queues the payload to be handled, applying the overflow policy if the queue is full.
+
+        @param payload Raw payload received from the stream
+        @paramType string
+        @returns n/a
+        '''
+        self._count('received')
+        item = (time.time(), payload)
+
+        if self.overflow_policy == BLOCK:
+            self.queue.put(item)
+            return
+
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            if self.overflow_policy == DROP:
+                self._count('dropped')
+            else:
+                self._spill(payload)
+
+    def _spill(self, payload):
+        ''' Appends the payload to the spill file. '''
+        with self.metrics_lock: # Also keeps the spilled lines whole
+            spill_file = open(self.spill_file_name, 'a')
+            try:
+                spill_file.write(payload.strip() + '\n')
+            finally:
+                spill_file.close()
+            self.metrics['spilled'] += 1
+
+    def _count(self, metric):
+        ''' Increments the provided metric. '''
+        with self.metrics_lock:
+            self.metrics[metric] += 1
+
+    def _work(self):
+        ''' Worker thread loop, handles queued payloads until it receives the None sentinel. '''
+        while True:
+            item = self.queue.get()
+            if item is None: # If the queue is shutting down
+                return
+
+            received_at, payload = item
+            with self.metrics_lock: # Track how far behind the stream the workers are running
+                self.metrics['lag'] = time.time() - received_at
+
+            try:
+                self.handler(payload)
+                self._count('handled')
+            except Exception:
+                logger.exception()
+                self._count('failed')
+
+    def get_metrics(self):
+        '''
+        @returns The queue's depth, how many seconds the most recently started payload waited in the
+        queue ('lag'), and how many payloads were received, handled, failed, dropped and spilled
+        @returnType dictionary
+        '''
+        with self.metrics_lock:
+            metrics = dict(self.metrics)
+        metrics['depth'] = self.queue.qsize()
+
+        return metrics
+
+    def shutdown(self):
+        '''
+        Lets the workers handle every queued payload, then stops them.
+
+        @returns n/a
+        '''
+        for worker in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+def replay_spill_file(spill_file_name, handler):
+    '''
+    Handles each of the payloads spilled to the provided file.
+
+    @param spill_file_name File the payloads were spilled to
+    @paramType string
+    @param handler Parses and persists a single payload
+    @paramType function(payload)
+    @returns # of payloads replayed
+    @returnType int
+    '''
+    num_payloads = 0
+    spill_file = open(spill_file_name, 'r')
+    try:
+        for line in spill_file:
+            if line.strip() != '':
+                handler(line)
+                num_payloads += 1
+    finally:
+        spill_file.close()
+
+    return num_payloads
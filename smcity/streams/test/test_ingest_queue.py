@@ -0,0 +1,71 @@
+''' Unit tests for the IngestQueue class. '''
+
+import os
+import shutil
+import tempfile
+
+from threading import Event
+
+from smcity.streams.ingest_queue import BLOCK, DROP, SPILL, IngestQueue, replay_spill_file
+
+class TestIngestQueue:
+    ''' Tests the IngestQueue class. '''
+
+    def setup(self):
+        ''' Set up before each test. '''
+        self.handled   = []
+        self.unblocked = Event()
+        self.temp_dir  = tempfile.mkdtemp()
+
+    def teardown(self):
+        ''' Clean up after each test. '''
+        self.unblocked.set()
+        shutil.rmtree(self.temp_dir)
+
+    def blocking_handler(self, payload):
+        ''' Handler that waits to be unblocked, so payloads pile up in the queue. '''
+        self.unblocked.wait()
+        self.handled.append(payload)
+
+    def test_block(self):
+        ''' Tests that every payload is handled before shutdown() returns. '''
+        ingest_queue = IngestQueue(self.handled.append, queue_size=2, num_workers=3, overflow_policy=BLOCK)
+        for iter in range(50):
+            ingest_queue.put(str(iter))
+        ingest_queue.shutdown()
+
+        assert sorted(self.handled, key=int) == [str(iter) for iter in range(50)], self.handled
+        metrics = ingest_queue.get_metrics()
+        assert metrics['received'] == metrics['handled'] == 50, metrics
+        assert metrics['depth'] == 0, metrics
+
+    def test_drop(self):
+        ''' Tests that payloads arriving while the queue is full are dropped. '''
+        ingest_queue = IngestQueue(self.blocking_handler, queue_size=2, num_workers=1, overflow_policy=DROP)
+        for iter in range(10):
+            ingest_queue.put(str(iter))
+
+        # One payload is stuck in the handler and two wait in the queue, at most
+        metrics = ingest_queue.get_metrics()
+        assert metrics['depth'] <= 2, metrics
+        assert metrics['dropped'] >= 7, metrics
+
+        self.unblocked.set()
+        ingest_queue.shutdown()
+        assert len(self.handled) == 10 - ingest_queue.get_metrics()['dropped'], self.handled
+
+    def test_spill(self):
+        ''' Tests that payloads arriving while the queue is full are spilled and can be replayed. '''
+        spill_file_name = os.path.join(self.temp_dir, 'spill.json')
+        ingest_queue = IngestQueue(self.blocking_handler, queue_size=1, num_workers=1,
+                                   overflow_policy=SPILL, spill_file_name=spill_file_name)
+        for iter in range(10):
+            ingest_queue.put('{"id": %s}\r\n' % iter)
+
+        self.unblocked.set()
+        ingest_queue.shutdown()
+
+        num_spilled = ingest_queue.get_metrics()['spilled']
+        assert num_spilled >= 8, ingest_queue.get_metrics()
+        assert replay_spill_file(spill_file_name, self.handled.append) == num_spilled
+        assert len(self.handled) == 10, self.handled
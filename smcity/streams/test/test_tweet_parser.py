@@ -0,0 +1,45 @@
+''' Unit tests for the tweet_parser module. '''
+
+import json
+
+from time import strptime
+
+from smcity.streams.tweet_parser import CREATED_AT_FORMAT, parse_created_at, parse_tweet
+
+class TestTweetParser:
+    ''' Tests the tweet_parser functions. '''
+
+    def test_parse_created_at(self):
+        ''' Tests that parse_created_at() matches strptime(). '''
+        for created_at in ['Mon Jan 01 01:01:01 +0000 2014', 'Sat Feb 29 23:59:59 +0000 2020',
+                           'Wed Dec 31 00:00:00 +0000 2014', 'Mon Jan 01 12:34:56 +0000 2014']:
+            assert parse_created_at(created_at) == strptime(created_at, CREATED_AT_FORMAT), created_at
+
+    def test_parse_geotagged_tweet(self):
+        ''' Tests extracting the fields of geotagged tweets. '''
+        tweet = {
+            'id_str' : 'id', 'text' : u'text', 'created_at' : 'Mon Jan 01 01:01:01 +0000 2014',
+            'coordinates' : {'type' : 'Point', 'coordinates' : [-83.0, 40.0]}, 'geo' : None,
+            'place' : {'bounding_box' : {'coordinates' : [[[-84, 39], [-82, 41]]]}}
+        }
+        parsed_tweet = parse_tweet(json.dumps(tweet))
+        assert parsed_tweet == ('id', (-83.0, 40.0), u'text', strptime(tweet['created_at'], CREATED_AT_FORMAT)), \
+            parsed_tweet
+
+        # Only geo is set, its first coordinate is used as the longitude just like for coordinates
+        tweet['coordinates'] = None
+        tweet['geo'] = {'coordinates' : [1, 2]}
+        assert parse_tweet(json.dumps(tweet))[1] == (1, 2), parse_tweet(json.dumps(tweet))
+
+    def test_reject_ungeotagged_tweet(self):
+        ''' Tests that tweets without geotagging are rejected. '''
+        tweet = {
+            'id_str' : 'id', 'text' : u'text', 'created_at' : 'Mon Jan 01 01:01:01 +0000 2014',
+            'coordinates' : None, 'geo' : None,
+            'place' : {'bounding_box' : {'coordinates' : [[[-84, 39], [-82, 41]]]}},
+            'retweeted_status' : {'geo' : {'coordinates' : [1, 2]}}
+        }
+        assert parse_tweet(json.dumps(tweet)) is None
+
+        del tweet['retweeted_status'] # Rejected without even being decoded
+        assert parse_tweet(json.dumps(tweet).replace('"id_str"', '"broken')) is None
@@ -1,5 +1,6 @@
 ''' Units tests for the Twitter stream consumer. '''
 
+import calendar
 import json
 import logging
 
@@ -7,6 +8,7 @@ from boto.dynamodb2.table import Table
 from ConfigParser import ConfigParser
 from time import strftime, strptime
 
+from smcity.analytics.trend_tracker import TrendTracker
 from smcity.models.test.mock_data import MockDataFactory
 from smcity.streams.twitter_stream import TwitterStreamListener
 
@@ -52,3 +54,19 @@ class TestTwitterStreamListener():
             self.data_factory.created_data['location'][1]
         assert strftime('%Y-%m-%d %H:%M:%S', self.data_factory.created_data['timestamp']) \
             == '2014-01-01 01:01:01', self.data_factory.created_data['timestamp']
+
+    def test_on_data_trend_tracker(self):
+        ''' Tests that the on_data function feeds the trend tracker. '''
+        self.stream_listener.trend_tracker = TrendTracker()
+        tweet = json.dumps({
+            'id_str' : 'id',
+            'geo' : {'coordinates' : [0, 1]},
+            'text' : '#Trending text',
+            'created_at' : 'Mon Jan 01 01:01:01 +0000 2014'
+        })
+
+        self.stream_listener.on_data(tweet)
+
+        now = calendar.timegm(strptime('Mon Jan 01 01:01:01 +0000 2014', '%a %b %d %X +0000 %Y'))
+        counts = self.stream_listener.trend_tracker.count_topics(0.5, 1.5, -0.5, 0.5, 60, now=now)
+        assert counts == {'#TRENDING' : 1}, counts
@@ -0,0 +1,88 @@
+''' Fast extraction of the fields we keep from raw Twitter stream payloads. '''
+
+import calendar
+import re
+import time
+
+try: # Prefer the fastest JSON decoder available
+    import ujson as json
+except ImportError:
+    try:
+        import simplejson as json
+    except ImportError:
+        import json
+
+# Matches a non-null geo or coordinates object, every geotagged tweet has one
+GEO_PATTERN = re.compile(r'"(?:geo|coordinates)"\s*:\s*\{')
+
+# Format of a tweet's created_at field, i.e. 'Mon Jan 01 01:01:01 +0000 2014'
+CREATED_AT_FORMAT = '%a %b %d %X +0000 %Y'
+
+MONTHS   = dict((month, iter + 1) for (iter, month) in enumerate(
+    ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+))
+WEEKDAYS = dict((weekday, iter) for (iter, weekday) in enumerate(['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']))
+
+# (year, month, day of month, weekday, day of year) of recently seen days, keyed by their created_at parts
+_days = {}
+
+def _parse_day(created_at):
+    ''' @returns The (year, month, day of month, weekday, day of year) of the created_at field '''
+    year, month, day = int(created_at[26:]), MONTHS[created_at[4:7]], int(created_at[8:10])
+
+    day_start = time.gmtime(calendar.timegm((year, month, day, 0, 0, 0)))
+    if (day_start.tm_mon, day_start.tm_mday) != (month, day): # If the date doesn't exist, i.e. Feb 30
+        raise ValueError("Invalid created_at date '%s'!" % created_at)
+
+    return (year, month, day, WEEKDAYS[created_at[:3]], day_start.tm_yday)
+
+def parse_created_at(created_at):
+    '''
+    Parses a tweet's created_at field. Equivalent to time.strptime(created_at, CREATED_AT_FORMAT),
+    but the date part is only parsed once per day.
+
+    @param created_at Creation time of the tweet, i.e. 'Mon Jan 01 01:01:01 +0000 2014'
+    @paramType string
+    @returns The creation time
+    @returnType time.struct_time
+    '''
+    if len(created_at) != 30 or created_at[19:26] != ' +0000 ': # If this isn't the usual format
+        return time.strptime(created_at, CREATED_AT_FORMAT)
+
+    key = created_at[:10] + created_at[26:]
+    day = _days.get(key)
+    if day is None:
+        if len(_days) > 1000: # Days don't come back, so don't let them pile up
+            _days.clear()
+        day = _days[key] = _parse_day(created_at)
+
+    year, month, day_of_month, weekday, day_of_year = day
+    return time.struct_time((
+        year, month, day_of_month, int(created_at[11:13]), int(created_at[14:16]), int(created_at[17:19]),
+        weekday, day_of_year, -1 # strptime leaves the DST flag unknown
+    ))
+
+def parse_tweet(tweet_str):
+    '''
+    Extracts the fields we keep from a raw tweet. Tweets that are not geotagged are rejected
+    before being decoded.
+
+    @param tweet_str Raw JSON tweet
+    @paramType string
+    @returns (id, (longitude, latitude), text, created_at struct_time), or None if the tweet is not geotagged
+    @returnType tuple
+    '''
+    if GEO_PATTERN.search(tweet_str) is None: # If there's no geotagging, don't bother decoding
+        return None
+
+    tweet = json.loads(tweet_str)
+
+    coordinates = tweet.get('coordinates')
+    if coordinates is None:
+        coordinates = tweet.get('geo')
+    if coordinates is None: # Only a nested tweet was geotagged
+        return None
+
+    location = (coordinates['coordinates'][0], coordinates['coordinates'][1])
+
+    return (tweet['id_str'], location, tweet['text'], parse_created_at(tweet['created_at']))
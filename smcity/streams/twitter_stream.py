@@ -1,9 +1,6 @@
 ''' Contains the Twitter stream consuming code. '''
 
-import json
-
 from ConfigParser import ConfigParser
-from time import strptime
 from threading import Thread
 
 from tweepy import OAuthHandler
@@ -11,13 +8,15 @@ from tweepy import Stream
 from tweepy.streaming import StreamListener
 
 from smcity.misc.logger import Logger
+from smcity.streams.ingest_queue import IngestQueue
+from smcity.streams.tweet_parser import parse_tweet
 
 logger = Logger(__name__)
 
 class TwitterStreamListener(StreamListener):
     ''' Consumes the twitter stream and uploads the messages into the database. '''
     
-    def __init__(self, config, data_factory):
+    def __init__(self, config, data_factory, trend_tracker=None):
         '''
         Constructor.
 
@@ -26,9 +25,32 @@ class TwitterStreamListener(StreamListener):
         Key:         auth_file
         Type:        string
         Description: File containing the authentication details for Twitter
+
+        Section:     twitter
+        Key:         num_writers
+        Type:        int
+        Description: # of worker threads parsing and persisting the tweets; If 0, each tweet is
+                     handled on the stream's thread as it arrives (Optional, default 0)
+
+        Section:     twitter
+        Key:         queue_size
+        Type:        int
+        Description: Maximum # of tweets waiting for the workers (Optional, default 1000)
+
+        Section:     twitter
+        Key:         overflow_policy
+        Type:        block, drop or spill
+        Description: What to do with tweets that arrive while the queue is full (Optional, default block)
+
+        Section:     twitter
+        Key:         spill_file
+        Type:        string
+        Description: File tweets are spilled to under the spill policy (Optional)
         @paramType ConfigParser
         @param data_factory Interface for creating new data entries
         @paramType DataFactory
+        @param trend_tracker Tracker the consumed tweets' topics are counted by (Optional)
+        @paramType TrendTracker
         @returns n/a
         '''
         assert data_factory is not None, "data_factory must not be None"
@@ -54,8 +76,21 @@ class TwitterStreamListener(StreamListener):
         listener = self
         self.stream = Stream(auth_handler, listener)
 
-        self.data_factory = data_factory       
+        self.data_factory  = data_factory       
         self.num_tweets    = 0
+        self.trend_tracker = trend_tracker
+
+        # Hand the tweets off to a pool of workers if the config asks for one
+        self.ingest_queue = None
+        if config.has_option('twitter', 'num_writers') and config.getint('twitter', 'num_writers') > 0:
+            kwargs = {'num_workers' : config.getint('twitter', 'num_writers')}
+            if config.has_option('twitter', 'queue_size'):
+                kwargs['queue_size'] = config.getint('twitter', 'queue_size')
+            if config.has_option('twitter', 'overflow_policy'):
+                kwargs['overflow_policy'] = config.get('twitter', 'overflow_policy')
+            if config.has_option('twitter', 'spill_file'):
+                kwargs['spill_file_name'] = config.get('twitter', 'spill_file')
+            self.ingest_queue = IngestQueue(self._handle_tweet, **kwargs)
 
     def _consume_stream(self, min_lon, min_lat, max_lon, max_lat):
         '''
@@ -108,26 +143,29 @@ class TwitterStreamListener(StreamListener):
         self.num_tweets += 1
         logger.debug("Tweet #%s", self.num_tweets)
 
+        if self.ingest_queue is not None: # Let the workers handle it, keeping the stream flowing
+            self.ingest_queue.put(tweet_str)
+        else:
+            self._handle_tweet(tweet_str)
+
+    def _handle_tweet(self, tweet_str):
+        '''
+        Parses the tweet and persists it.
+
+        @param tweet_str The tweet to be handled
+        @paramType string
+        @returns n/a
+        '''
         try:
-            tweet = json.loads(tweet_str)
-
-            # Extract the interesting parts of the tweet
-            id        = tweet['id_str']
-            lat       = 0
-            lon       = 0
-            if 'coordinates' in tweet.keys() and tweet['coordinates'] is not None:
-                lon = tweet['coordinates']['coordinates'][0]
-                lat = tweet['coordinates']['coordinates'][1]
-            elif 'geo' in tweet.keys() and tweet['geo'] is not None:
-                lon = tweet['geo']['coordinates'][0]
-                lat = tweet['geo']['coordinates'][1]
-            else:
+            parsed_tweet = parse_tweet(tweet_str)
+            if parsed_tweet is None:
                 logger.debug("Bad Tweet. Skipping...")
                 return # No geotagging, so ignore the tweet
-            message   = tweet['text']
-            timestamp = strptime(tweet['created_at'], '%a %b %d %X +0000 %Y')
+            id, (lon, lat), message, timestamp = parsed_tweet
 
             self.data_factory.create_data(message, id, (lon, lat), 'global', timestamp, 'twitter')
+            if self.trend_tracker is not None: # Keep the live trending topics up to date
+                self.trend_tracker.add_data(message, (lon, lat), timestamp)
         except:
             logger.warn("Bad Tweet: %s", tweet_str)
             logger.exception()
@@ -144,8 +182,22 @@ class TwitterStreamListener(StreamListener):
 
     def shutdown(self):
         '''
-        Stops all active streams.
+        Stops all active streams and writes out any queued or buffered tweets.
 
         @returns n/a
         '''
         self.stream.disconnect()
+        if self.ingest_queue is not None:
+            self.ingest_queue.shutdown()
+        self.data_factory.shutdown()
+
+    def get_metrics(self):
+        '''
+        @returns Ingest metrics, including the queue's depth and lag if the tweets are queued
+        @returnType dictionary
+        '''
+        metrics = {'received' : self.num_tweets}
+        if self.ingest_queue is not None:
+            metrics.update(self.ingest_queue.get_metrics())
+
+        return metrics
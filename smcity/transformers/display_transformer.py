@@ -16,7 +16,7 @@ class DisplayTransformer:
         '''
         raise NotImplementError()
 
-    def plot_polygon(self, polygon_strategy, encoded_display=None, properties=None):
+    def plot_polygon(self, polygon_strategy, encoded_display=None, properties=None, tolerance=None):
         '''
         Generates a display for the provided polygon.
  
@@ -24,6 +24,8 @@ class DisplayTransformer:
         @paramType smcity.polygons.PolygonStrategy
         @param encoded_display Display to add the points to; If None, a new display is constructed
         @paramType string
+        @param tolerance Simplification tolerance of the plotted outline; If None, the full outline is plotted
+        @paramType float
         @returns encoded display content
         @returnType string
         '''
@@ -41,9 +41,13 @@ class GeoJsonTransformer(DisplayTransformer):
             
         return geojson.dumps(feature_collection)
 
-    def plot_polygon(self, polygon_strategy, encoded_display=None, properties=None):
+    def plot_polygon(self, polygon_strategy, encoded_display=None, properties=None, tolerance=None):
         ''' {@inheritDocs} '''
-        outline = polygon_strategy.get_outline()
+        outline = None
+        if tolerance is not None: # If a lower resolution outline will do
+            outline = polygon_strategy.get_simplified_outline(tolerance)
+        else:
+            outline = polygon_strategy.get_outline()
         polygon = MultiPolygon([outline])
 
         feature_collection = None